@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 10:12:04 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/FFTHandler.py
+
+"""
+Functionality:
+    - Implements FFTHandler for phase-amplitude coupling (PAC) calculations
+    - Filters all phase and amplitude bands with one shared FFT per signal
+    - Provides a streaming mode for continuous recordings (see stream())
+    - With error_budget, switches to the fastest configuration meeting it
+      during initialisation, on a demo PAC signal (see _ErrorBudget.py)
+    - With band_pairs, computes only the selected (phase, amplitude) pairs;
+      to_dense() scatters them back to the comodulogram
+    - With multirate, filters the phase bands at a decimated rate and only
+      the amplitude bands at the full rate
+Input:
+    - EEG/iEEG time series data
+    - Configuration parameters for PAC calculation
+Output:
+    - Phase-amplitude coupling matrices
+Prerequisites:
+    - PyTorch
+    - MNGS package
+"""
+
+from typing import Union
+
+import mngs
+import numpy as np
+import torch
+from scripts.PackageHandlers import BaseHandler
+from scripts.PackageHandlers._BandPairs import pairs_to_dense
+from scripts.PackageHandlers._DtypePolicy import DtypePolicy
+from scripts.PackageHandlers._ErrorBudget import get_or_calibrate
+from scripts.PackageHandlers._FFTPAC import FFTPAC
+from scripts.PackageHandlers._StreamingPAC import StreamingPAC
+
+# Segments of the demo PAC signal calibrating error_budget
+N_CALIB_SEGMENTS = 4
+
+
+class FFTHandler(BaseHandler):
+    def __init__(
+        self,
+        seq_len: int,
+        fs: float,
+        pha_n_bands: int,
+        pha_min_hz: float,
+        pha_max_hz: float,
+        amp_n_bands: int,
+        amp_min_hz: float,
+        amp_max_hz: float,
+        n_perm: int,
+        chunk_size: int,
+        fp16: bool,
+        in_place: bool,
+        trainable: bool,
+        device: str,
+        use_threads: bool,
+        ts: mngs.gen.TimeStamper,
+        mem_budget_gib: float = None,
+        use_processes: bool = False,
+        n_workers: int = None,
+        profile_stages: bool = False,
+        dtype_policy: str = None,
+        error_budget: dict = None,
+        fused_mi: bool = False,
+        band_pairs=None,
+        pha_grid=None,
+        amp_grid=None,
+        multirate: bool = False,
+    ):
+        super().__init__(
+            seq_len,
+            fs,
+            pha_n_bands,
+            pha_min_hz,
+            pha_max_hz,
+            amp_n_bands,
+            amp_min_hz,
+            amp_max_hz,
+            n_perm,
+            chunk_size,
+            fp16,
+            in_place,
+            trainable,
+            device,
+            use_threads,
+            ts,
+            mem_budget_gib=mem_budget_gib,
+            use_processes=use_processes,
+            n_workers=n_workers,
+            profile_stages=profile_stages,
+            dtype_policy=dtype_policy,
+            error_budget=error_budget,
+            fused_mi=fused_mi,
+            band_pairs=band_pairs,
+            pha_grid=pha_grid,
+            amp_grid=amp_grid,
+            multirate=multirate,
+        )
+
+        del self.in_place, self.trainable, self.use_threads
+        del self.use_processes, self.n_workers, self.fused_mi
+        self.ts(self.init_start_str)
+        self.model = self.init_model()
+        # Calibrated here, so that it counts as initialisation rather than as
+        # (warmup) calc_pac calls and their memory peaks
+        if self.error_budget:
+            self.calibrate()
+        self.ts(self.init_end_str)
+
+    def init_model(self, **overrides) -> FFTPAC:
+        model = self._build_model(**overrides).to(self.device)
+        model.stage_timer = self.stage_timer
+        self.init_cache_hit = model.cache_hit
+        return model
+
+    def _build_model(self, **overrides) -> FFTPAC:
+        """FFTPAC of this handler; overrides are, e.g., dtype_policy or n_bins."""
+        kwargs = dict(
+            bands_pha=self.grid_pha.edges,
+            bands_amp=self.grid_amp.edges,
+            n_perm=self.n_perm,
+            dtype_policy=self.dtype_policy,
+            band_pairs=self.band_pairs,
+            pha_decimation="auto" if self.multirate else 1,
+        )
+        kwargs.update(overrides)
+        kwargs["dtype_policy"] = DtypePolicy.from_name(kwargs["dtype_policy"])
+        return FFTPAC(self.seq_len, self.fs, **kwargs)
+
+    def calibrate(self, xx: Union[torch.Tensor, np.ndarray] = None) -> dict:
+        """
+        Switches to the fastest configuration meeting self.error_budget.
+
+        The first sample of xx is the calibration batch; by default, a demo
+        PAC signal of N_CALIB_SEGMENTS segments. The choice is cached per
+        (fs, seq_len, bands, device, n_perm, error_budget), so that later
+        handlers with the same settings skip the validation.
+
+        Returns
+        -------
+        dict
+            The calib_* columns written to stats.csv
+        """
+        if xx is None:
+            xx = self._demo_signal()
+        chunk = self._read_chunk(xx, 0, 1)
+        if isinstance(chunk, np.ndarray):
+            chunk = torch.from_numpy(np.asarray(chunk)).to(self.device)
+        xx_calib = chunk.reshape(-1, *chunk.shape[-2:]).float()
+
+        config, is_hit = get_or_calibrate(
+            self._build_model,
+            xx_calib,
+            (
+                self.fs,
+                self.seq_len,
+                self.model.BANDS_PHA,
+                self.model.BANDS_AMP,
+                self.model.pair_indices,
+                self.model.pha_decimation,
+                str(self.device),
+            ),
+            self.n_perm,
+            self.error_budget,
+        )
+        # Copied not to modify the cached entry
+        config = dict(config)
+        time_ratio = config.pop("time_ratio")
+        self.model = self.init_model(**config)
+        # The working set per sample depends on the chosen configuration
+        self._auto_chunk_sizes.clear()
+        self.calibration = {
+            "calib_cache_hit": is_hit,
+            **{f"calib_{name}": value for name, value in config.items()},
+            "calib_time_ratio": time_ratio,
+        }
+        return self.calibration
+
+    def _demo_signal(self) -> np.ndarray:
+        """Demo PAC signal with shape (1, 1, N_CALIB_SEGMENTS, seq_len)."""
+        # One extra sample, as t_sec * fs may round down below seq_len
+        xx, _, _ = mngs.dsp.demo_sig(
+            "pac",
+            batch_size=1,
+            n_chs=1,
+            n_segments=N_CALIB_SEGMENTS,
+            t_sec=(self.seq_len + 1) / self.fs,
+            fs=self.fs,
+        )
+        return np.asarray(xx)[..., : self.seq_len]
+
+    def calc_pac(
+        self, xx: Union[torch.Tensor, np.ndarray], out: torch.Tensor = None
+    ) -> torch.Tensor:
+        """
+        Calculate phase-amplitude coupling.
+
+        Parameters
+        ----------
+        xx : torch.Tensor or np.ndarray
+            Input with shape (batch_size, n_chs, n_segments, seq_len). NumPy
+            arrays, including memory maps, are converted chunk by chunk.
+        out : torch.Tensor, optional
+            Preallocated output with the shape of the result.
+
+        Returns
+        -------
+        torch.Tensor
+            PAC values with shape
+            (batch_size, n_chs, n_segments, pha_n_bands, amp_n_bands), as the
+            other handlers return them, or (batch_size, n_chs, n_segments,
+            n_pairs) with band_pairs (see to_dense).
+        """
+        assert xx.ndim == 4
+        if torch.is_tensor(xx):
+            assert xx.dtype == (torch.float16 if self.fp16 else torch.float32)
+
+        return self._calc_pac_chunked(xx, 2, self.model, out=out)
+
+    def _bytes_per_sample(self, n_elems_per_sample: int) -> int:
+        # Complex spectra and analytic signals of all bands (on the padded FFT
+        # length) and phase-bin indices of the phase bands; then either int64
+        # scatter rows of the phase bands and amplitude rows in the accumulate
+        # dtype (of all surrogate shifts side by side with surrogates), or
+        # one-hot masks of the phase bands and the time-shifted amplitudes of
+        # all surrogates (only the bands referenced by band_pairs are
+        # filtered; with multirate, the phase bands are filtered at
+        # 1 / pha_decimation of the samples)
+        policy = self.model.dtype_policy
+        n_pha = len(self.model.i_pha_filtered)
+        n_amp = len(self.model.i_amp_filtered)
+        pad_ratio = self.model.n_fft / self.seq_len
+        n_pha_filtered = n_pha / self.model.pha_decimation
+        n_perm = self.model.n_perm or 0
+        if self.model.binning == "scatter":
+            n_bytes_binning = (
+                n_pha * (1 + 8)
+                + (
+                    policy.storage.itemsize
+                    + policy.accumulate.itemsize * (1 + n_perm)
+                )
+                * n_amp
+            )
+        else:
+            n_bytes_binning = n_pha * (
+                1 + policy.multiply.itemsize * self.model.n_bins
+            ) + policy.storage.itemsize * n_amp * (1 + n_perm)
+        return int(
+            n_elems_per_sample
+            * (
+                2 * 2 * policy.filter.itemsize * (n_pha_filtered + n_amp) * pad_ratio
+                + n_bytes_binning
+            )
+        )
+
+    def _read_chunk(self, xx, i_start: int, i_end: int) -> torch.Tensor:
+        chunk = super()._read_chunk(xx, i_start, i_end)
+        if isinstance(chunk, np.ndarray):
+            chunk = torch.from_numpy(chunk).to(self.device)
+        return chunk
+
+    def to_dense(self, xpac: torch.Tensor, fill_value: float = float("nan")):
+        """
+        Scatters per-pair PAC values (..., n_pairs) back to the comodulogram
+        (..., pha_n_bands, amp_n_bands), e.g., for plotting; unselected pairs
+        are fill_value. Dense results are returned as they are.
+        """
+        if self.model.pair_indices is None:
+            return xpac
+        return pairs_to_dense(
+            xpac,
+            self.model.pair_indices,
+            len(self.model.BANDS_PHA),
+            len(self.model.BANDS_AMP),
+            fill_value=fill_value,
+        )
+
+    def stream(self, window_len: int, hop_len: int, **kwargs) -> StreamingPAC:
+        """
+        Creates a StreamingPAC sharing this handler's fs, bands and device.
+
+        Parameters
+        ----------
+        window_len : int
+            Number of samples per PAC window
+        hop_len : int
+            Number of samples between consecutive PAC outputs
+
+        Returns
+        -------
+        StreamingPAC
+            Push/iterator API for continuous recordings
+        """
+        return StreamingPAC(
+            self.fs,
+            window_len,
+            hop_len,
+            self.model.BANDS_PHA,
+            self.model.BANDS_AMP,
+            n_bins=self.model.n_bins,
+            device=self.device,
+            **kwargs,
+        )
+
+    def __str__(self) -> str:
+        return "torchPAC.fft"
+
+    @property
+    def freqs_amp(self) -> torch.Tensor:
+        return torch.from_numpy(self.model.AMP_MIDS_HZ)
+
+    @property
+    def freqs_pha(self) -> torch.Tensor:
+        return torch.from_numpy(self.model.PHA_MIDS_HZ)
+
+
+# EOF
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: "2024-11-05 00:57:10 (ywatanabe)"
+# Time-stamp: "2026-10-18 11:02:37 (ywatanabe)"
 # File: ./torchPAC/scripts/PackageHandlers/MNGSHandler.py
 
 # #!/usr/bin/env python3
@@ -200,13 +200,17 @@ This script defines MNGSHandler for phase-amplitude coupling calculations.
 """
 
 # Imports
-import math
+from contextlib import contextmanager
+from typing import Union
 
 import mngs
+import numpy as np
 import torch
 
 # from mngs.decorators import timeout
 from scripts.PackageHandlers import BaseHandler
+from scripts.PackageHandlers._FilterBankCache import filter_bank_cache, make_key
+from scripts.PackageHandlers._FusedModulationIndex import FusedModulationIndex
 
 # TIMEOUT_SEC = int(10 * 60)
 
@@ -250,6 +254,17 @@ class MNGSHandler(BaseHandler):
         device: str,
         use_threads: bool,
         ts: mngs.gen.TimeStamper,
+        mem_budget_gib: float = None,
+        use_processes: bool = False,
+        n_workers: int = None,
+        profile_stages: bool = False,
+        dtype_policy: str = None,
+        error_budget: dict = None,
+        fused_mi: bool = False,
+        band_pairs=None,
+        pha_grid=None,
+        amp_grid=None,
+        multirate: bool = False,
     ):
         # Maintains parameters as attributes by following the BaseHandler's requirements
         super().__init__(
@@ -269,11 +284,23 @@ class MNGSHandler(BaseHandler):
             device,
             use_threads,
             ts,
+            mem_budget_gib=mem_budget_gib,
+            use_processes=use_processes,
+            n_workers=n_workers,
+            profile_stages=profile_stages,
+            dtype_policy=dtype_policy,
+            error_budget=error_budget,
+            fused_mi=fused_mi,
+            band_pairs=band_pairs,
+            pha_grid=pha_grid,
+            amp_grid=amp_grid,
+            multirate=multirate,
         )
 
         # Explicitly disables unneccessary variables for this class.
         # Since parameters are passed using the grid search method, the above parameters should be accepted.
-        del self.use_threads
+        del self.use_threads, self.use_processes, self.n_workers
+        del self.dtype_policy, self.error_budget, self.band_pairs, self.multirate
         self.ts(self.init_start_str)
         self.model = self.init_model()
         self.ts(self.init_end_str)
@@ -312,20 +339,100 @@ class MNGSHandler(BaseHandler):
     #     )
     #     return model
     def init_model(self) -> mngs.nn.PAC:
-        return mngs.nn.PAC(
-            self.seq_len,
-            self.fs,
-            pha_start_hz=self.pha_min_hz,
-            pha_end_hz=self.pha_max_hz,
-            pha_n_bands=self.pha_n_bands,
-            amp_n_bands=self.amp_n_bands,
-            amp_start_hz=self.amp_min_hz,
-            amp_end_hz=self.amp_max_hz,
-            n_perm=self.n_perm,
-            fp16=self.fp16,
-            in_place=self.in_place,
-            trainable=self.trainable,
+        uses_mngs_bands = self._uses_mngs_bands()
+        if self.trainable and not uses_mngs_bands:
+            raise ValueError(
+                "Trainable mngs filters are initialised from the band ranges; "
+                "pha_grid and amp_grid other than the default are not supported"
+            )
+
+        def _build():
+            model = mngs.nn.PAC(
+                self.seq_len,
+                self.fs,
+                pha_start_hz=self.pha_min_hz,
+                pha_end_hz=self.pha_max_hz,
+                pha_n_bands=self.pha_n_bands,
+                amp_n_bands=self.amp_n_bands,
+                amp_start_hz=self.amp_min_hz,
+                amp_end_hz=self.amp_max_hz,
+                n_perm=self.n_perm,
+                fp16=self.fp16,
+                in_place=self.in_place,
+                trainable=self.trainable,
+            )
+            # Bands of the shared frequency grids, where they differ
+            if not uses_mngs_bands:
+                bands_pha = torch.tensor(self.grid_pha.edges, dtype=torch.float32)
+                bands_amp = torch.tensor(self.grid_amp.edges, dtype=torch.float32)
+                model.bandpass = mngs.nn.BandPassFilter(
+                    torch.vstack([bands_pha, bands_amp]),
+                    self.fs,
+                    self.seq_len,
+                    fp16=self.fp16,
+                )
+                model.BANDS_PHA, model.BANDS_AMP = bands_pha, bands_amp
+                model.PHA_MIDS_HZ = bands_pha.mean(-1)
+                model.AMP_MIDS_HZ = bands_amp.mean(-1)
+            # Also used by generate_surrogates
+            if self.fused_mi:
+                model.modulation_index = FusedModulationIndex(
+                    n_bins=model.modulation_index.n_bins,
+                    fp16=self.fp16,
+                    amp_prob=model.modulation_index.amp_prob,
+                )
+            return model
+
+        # Trainable filters have their own parameters and are never shared
+        if self.trainable:
+            self.init_cache_hit = False
+            return _build()
+
+        model, self.init_cache_hit = filter_bank_cache.get_or_build(
+            make_key(
+                "mngs",
+                self.fs,
+                self.seq_len,
+                self.pha_min_hz,
+                self.pha_max_hz,
+                self.pha_n_bands,
+                self.amp_min_hz,
+                self.amp_max_hz,
+                self.amp_n_bands,
+                self.n_perm,
+                self.fp16,
+                self.in_place,
+                self.fused_mi,
+                self.grid_pha.edges,
+                self.grid_amp.edges,
+            ),
+            _build,
         )
+        return model
+
+    def _uses_mngs_bands(self) -> bool:
+        """Whether the shared grids equal the bands mngs.nn.PAC builds itself."""
+        amp_end_hz = int(min(self.fs / 2 / (1 + 0.8) - 1, self.amp_max_hz))
+        for grid, bands in [
+            (
+                self.grid_pha,
+                mngs.nn.PAC.calc_bands_pha(
+                    self.pha_min_hz, self.pha_max_hz, self.pha_n_bands
+                ),
+            ),
+            (
+                self.grid_amp,
+                mngs.nn.PAC.calc_bands_amp(
+                    self.amp_min_hz, amp_end_hz, self.amp_n_bands
+                ),
+            ),
+        ]:
+            bands = np.asarray(bands, dtype=np.float64)
+            if bands.shape != grid.edges.shape or not np.allclose(
+                bands, grid.edges, rtol=1e-5
+            ):
+                return False
+        return True
 
     # @timeout(
     #     seconds=TIMEOUT_SEC,
@@ -374,14 +481,20 @@ class MNGSHandler(BaseHandler):
 
     #     return xpac
 
-    def calc_pac(self, xx: torch.Tensor) -> torch.Tensor:
+    def calc_pac(
+        self, xx: Union[torch.Tensor, np.ndarray], out: torch.Tensor = None
+    ) -> torch.Tensor:
         """
         Calculate phase-amplitude coupling.
 
         Parameters
         ----------
-        xx : torch.Tensor
-            Input tensor with shape (batch_size, n_chs, n_segments, seq_len).
+        xx : torch.Tensor or np.ndarray
+            Input with shape (batch_size, n_chs, n_segments, seq_len). NumPy
+            arrays, including memory maps, are converted chunk by chunk.
+        out : torch.Tensor, optional
+            Preallocated output with shape
+            (batch_size, n_chs, n_segments, pha_n_bands, amp_n_bands).
 
         Returns
         -------
@@ -389,39 +502,62 @@ class MNGSHandler(BaseHandler):
             Calculated PAC values.
         """
         assert xx.ndim == 4
-        assert xx.dtype == torch.float16 if self.fp16 else torch.float32
-
-        xx = self.dim_handler.fit(xx, keepdims=[-2, -1])
-
-        n_chunks = math.ceil(len(xx) / self.chunk_size)
-        if self.chunk_size == 1:
-            xpac = torch.vstack(
-                [
-                    self.model(
-                        xx[
-                            i_batch
-                            * self.chunk_size : (i_batch + 1)
-                            * self.chunk_size
-                        ].unsqueeze(0)
-                    ).unsqueeze(0)
-                    for i_batch in range(n_chunks)
-                ]
-            )
-        else:
-            xpac = torch.vstack(
-                [
-                    self.model(
-                        xx[
-                            i_batch
-                            * self.chunk_size : (i_batch + 1)
-                            * self.chunk_size
-                        ]
-                    )
-                    for i_batch in range(n_chunks)
-                ]
-            )
+        # NumPy arrays and memory maps are cast chunk by chunk in _read_chunk
+        if torch.is_tensor(xx):
+            assert xx.dtype == (torch.float16 if self.fp16 else torch.float32)
 
-        return self.dim_handler.unfit(xpac)
+        # Each chunk writes into its own slice of a single output buffer
+        with self._stage_hooks():
+            return self._calc_pac_chunked(xx, 2, self._calc_pac, out=out)
+
+    @contextmanager
+    def _stage_hooks(self):
+        """
+        Times the submodules of mngs.nn.PAC while profile_stages is enabled.
+
+        Hooks are attached for the duration of calc_pac only, as the model may
+        be shared through filter_bank_cache. MI calls made while generating
+        surrogates are recorded as "surrogates.modulation_index".
+        """
+        if not self.stage_timer.enabled:
+            yield
+            return
+
+        timer = self.stage_timer
+        handles = []
+        for name in ["bandpass", "hilbert", "modulation_index"]:
+            module = getattr(self.model, name)
+            handles.append(
+                module.register_forward_pre_hook(
+                    lambda *_, name=name: timer.start(name)
+                )
+            )
+            handles.append(module.register_forward_hook(lambda *_: timer.stop()))
+
+        generate_surrogates = self.model.generate_surrogates
+
+        def _generate_surrogates(*args, **kwargs):
+            with timer.stage("surrogates"):
+                return generate_surrogates(*args, **kwargs)
+
+        self.model.generate_surrogates = _generate_surrogates
+        try:
+            yield
+        finally:
+            del self.model.generate_surrogates
+            for handle in handles:
+                handle.remove()
+
+    def _calc_pac(self, xs: torch.Tensor) -> torch.Tensor:
+        xpac = self.model(xs)
+        # Restores the dimensions squeezed for single-sample chunks
+        return xpac.reshape(*xs.shape[:-1], *xpac.shape[-2:])
+
+    def _read_chunk(self, xx, i_start: int, i_end: int) -> torch.Tensor:
+        chunk = super()._read_chunk(xx, i_start, i_end)
+        if isinstance(chunk, np.ndarray):
+            chunk = torch.from_numpy(chunk).to(self.device)
+        return chunk
 
     def __str__(self) -> str:
         return "mngs.dsp"
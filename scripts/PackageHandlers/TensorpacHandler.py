@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: "2024-11-05 00:02:38 (ywatanabe)"
+# Time-stamp: "2026-10-18 11:02:37 (ywatanabe)"
 # File: ./torchPAC/scripts/PackageHandlers/TensorpacHandler.py
 
 """
 Functionality:
     - Implements TensorpacHandler for phase-amplitude coupling calculations
-    - Provides both thread-based and chunk-based processing options
+    - Provides thread-based, process-based and chunk-based processing options
 Input:
     - Neural time series data (EEG/iEEG)
     - Configuration parameters for PAC calculation
@@ -18,18 +18,29 @@ Prerequisites:
     - mngs package
 """
 
-import math
-from concurrent.futures import ThreadPoolExecutor
+import atexit
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
 
 import mngs
 import numpy as np
 import tensorpac
+from threadpoolctl import threadpool_limits
 from scripts.PackageHandlers import BaseHandler
+from scripts.PackageHandlers._FilterBankCache import filter_bank_cache, make_key
 
 TIMEOUT_SEC = int(10 * 60)
+# Worker pools kept per (fs, bands, n_workers) in this process (see _get_pool)
+MAX_POOLS = 2
 
 
 class TensorpacHandler(BaseHandler):
+    # Worker pool of use_processes, taken from _POOLS by init_model
+    _pool = None
+
     def __init__(
         self,
         seq_len: int,
@@ -48,6 +59,17 @@ class TensorpacHandler(BaseHandler):
         device: str,
         use_threads: bool,
         ts: mngs.gen.TimeStamper,
+        mem_budget_gib: float = None,
+        use_processes: bool = False,
+        n_workers: int = None,
+        profile_stages: bool = False,
+        dtype_policy: str = None,
+        error_budget: dict = None,
+        fused_mi: bool = False,
+        band_pairs=None,
+        pha_grid=None,
+        amp_grid=None,
+        multirate: bool = False,
     ):
         super().__init__(
             seq_len,
@@ -66,63 +88,127 @@ class TensorpacHandler(BaseHandler):
             device,
             use_threads,
             ts,
+            mem_budget_gib=mem_budget_gib,
+            use_processes=use_processes,
+            n_workers=n_workers,
+            profile_stages=profile_stages,
+            dtype_policy=dtype_policy,
+            error_budget=error_budget,
+            fused_mi=fused_mi,
+            band_pairs=band_pairs,
+            pha_grid=pha_grid,
+            amp_grid=amp_grid,
+            multirate=multirate,
         )
 
-        del self.in_place, self.trainable
+        del self.in_place, self.trainable, self.dtype_policy, self.error_budget
+        del self.fused_mi, self.band_pairs, self.multirate
+        # Cores this process may run on (e.g., pinned by the sweep scheduler)
+        self.n_workers = self.n_workers or len(os.sched_getaffinity(0))
         self.ts(self.init_start_str)
         self.model = self.init_model()
         self.ts(self.init_end_str)
 
     def init_model(self) -> tensorpac.Pac:
-        resolution_dict = {
-            10: "lres",
-            30: "mres",
-            50: "hres",
-            70: "demon",
-            100: "hulk",
-        }
-        model = tensorpac.Pac(
-            f_pha=resolution_dict[self.pha_n_bands],
-            f_amp=resolution_dict[self.pha_n_bands],
-            dcomplex="wavelet",
+        # Band edges of the shared frequency grids (formerly the "lres" to
+        # "hulk" presets chosen by pha_n_bands, also for the amplitude)
+        f_pha = self.grid_pha.edges
+        f_amp = self.grid_amp.edges
+
+        def _build():
+            model = tensorpac.Pac(
+                f_pha=f_pha,
+                f_amp=f_amp,
+                dcomplex="wavelet",
+            )
+            model.idpac = (2, 0, 0)
+            return model
+
+        model, self.init_cache_hit = filter_bank_cache.get_or_build(
+            make_key("tensorpac", f_pha, f_amp), _build
         )
-        model.idpac = (2, 0, 0)
+        if self.use_processes and self._pool is None:
+            # Worker startup and their tensorpac.Pac count as init time,
+            # unless a pool of the same settings is reused
+            self._pool = self._get_pool(model)
         return model
 
-    def calc_pac(self, xx: np.ndarray) -> np.ndarray:
+    def close(self) -> None:
+        """
+        Releases the worker pool of this handler. The pool stays in _POOLS
+        for later handlers with the same settings; shutdown_pools() stops it.
+        """
+        self._pool = None
+
+    def calc_pac(self, xx: np.ndarray, out: np.ndarray = None) -> np.ndarray:
         """
         Calculate phase-amplitude coupling using either threads or chunks.
 
         Parameters
         ----------
         xx : np.ndarray
-            Input array of shape (batch_size, n_chs, n_segments, seq_len)
+            Input array of shape (batch_size, n_chs, n_segments, seq_len);
+            memory maps are read chunk by chunk
+        out : np.ndarray, optional
+            Preallocated output of shape
+            (batch_size, n_chs, n_segments, pha_n_bands, amp_n_bands)
 
         Returns
         -------
         np.ndarray
             Calculated PAC values
         """
+        if self.use_processes:
+            return self._calc_pac_using_processes(xx, out=out)
         return (
-            self._calc_pac_unfair_using_threads(xx)
+            self._calc_pac_unfair_using_threads(xx, out=out)
             if self.use_threads
-            else self._calc_pac_fair_chunk(xx)
+            else self._calc_pac_fair_chunk(xx, out=out)
         )
 
     def _calc_pac(self, xs: np.ndarray) -> np.ndarray:
-        pha = self.model.filter(self.fs, xs, ftype="phase", n_jobs=-1)
-        amp = self.model.filter(self.fs, xs, ftype="amplitude", n_jobs=-1)
-        xpac = self.model.fit(pha, amp, n_jobs=-1, verbose=False)
+        with self.stage_timer.stage("filter_phase"):
+            pha = self.model.filter(self.fs, xs, ftype="phase", n_jobs=-1)
+        with self.stage_timer.stage("filter_amplitude"):
+            amp = self.model.filter(self.fs, xs, ftype="amplitude", n_jobs=-1)
+        with self.stage_timer.stage("fit"):
+            xpac = self.model.fit(pha, amp, n_jobs=-1, verbose=False)
         return xpac.transpose(2, 1, 0)
 
-    def _calc_pac_fair_chunk(self, xx: np.ndarray) -> np.ndarray:
+    def _bytes_per_sample(self, n_elems_per_sample: int) -> int:
+        # The input chunk (fp16/fp32) and its float64 copy; tensorpac filters
+        # in float64 and returns complex wavelet outputs of all bands, then
+        # float64 phase and amplitude; surrogates (n_perm) copy the amplitude
+        # once each, and the amplitude is binned per phase bin
+        itemsize = 2 if self.fp16 else 4
+        n_bands = self.pha_n_bands + self.amp_n_bands
+        n_perm = self.n_perm or 0
+        return n_elems_per_sample * (
+            itemsize
+            + 8
+            + (16 + 8) * n_bands
+            + 8 * self.amp_n_bands * n_perm
+            + 8 * self.n_bins
+        )
+
+    def _calc_pac_at(self, xx: np.ndarray, i_batch: int) -> np.ndarray:
+        # Reads the sample inside the worker so that memory maps are not
+        # materialised all at once
+        return self._calc_pac(self._read_chunk(xx, i_batch, i_batch + 1)[0])
+
+    def _calc_pac_fair_chunk(
+        self, xx: np.ndarray, out: np.ndarray = None
+    ) -> np.ndarray:
         """
         Calculate PAC using chunk-based processing.
 
         Parameters
         ----------
         xx : np.ndarray
-            Input array of shape (batch_size, n_chs, n_segments, seq_len)
+            Input array of shape (batch_size, n_chs, n_segments, seq_len);
+            memory maps are read chunk by chunk
+        out : np.ndarray, optional
+            Preallocated output, see calc_pac
 
         Returns
         -------
@@ -132,26 +218,11 @@ class TensorpacHandler(BaseHandler):
         assert xx.ndim == 4
         assert xx.dtype == np.float16 if self.fp16 else np.float32
 
-        xx = self.dim_handler.fit(xx, keepdims=[-1])
-        n_chunks = math.ceil(len(xx) / self.chunk_size)
-
-        xpac = np.vstack(
-            [
-                self._calc_pac(
-                    xx[
-                        i_batch
-                        * self.chunk_size : (i_batch + 1)
-                        * self.chunk_size
-                    ]
-                )
-                for i_batch in range(n_chunks)
-            ]
-        )
-
-        return self.dim_handler.unfit(xpac)
+        # Each chunk writes into its own slice of a single output buffer
+        return self._calc_pac_chunked(xx, 1, self._calc_pac, out=out)
 
     def _calc_pac_unfair_using_threads(
-        self, xx: np.ndarray, n_jobs: int = -1
+        self, xx: np.ndarray, n_jobs: int = -1, out: np.ndarray = None
     ) -> np.ndarray:
         """
         Calculate PAC using thread-based processing.
@@ -159,9 +230,12 @@ class TensorpacHandler(BaseHandler):
         Parameters
         ----------
         xx : np.ndarray
-            Input array of shape (batch_size, n_chs, n_segments, seq_len)
+            Input array of shape (batch_size, n_chs, n_segments, seq_len);
+            memory maps are read chunk by chunk
         n_jobs : int, optional
             Number of parallel jobs, by default -1 (all cores)
+        out : np.ndarray, optional
+            Preallocated output, see calc_pac
 
         Returns
         -------
@@ -171,18 +245,141 @@ class TensorpacHandler(BaseHandler):
         assert xx.ndim == 4
         assert xx.dtype == np.float16 if self.fp16 else np.float32
 
-        xx = self.dim_handler.fit(xx, keepdims=np.array([-2, -1]))
+        lead_shape = xx.shape[:2]
+        xx = xx.reshape(-1, *xx.shape[2:])
         batch_size_by_n_chs = len(xx)
 
+        out_flat = None
+        if out is not None:
+            out_flat = out.reshape(batch_size_by_n_chs, *out.shape[2:])
+
         with ThreadPoolExecutor() as executor:
             futures = [
-                executor.submit(self._calc_pac, xx[i_batch])
+                executor.submit(self._calc_pac_at, xx, i_batch)
                 for i_batch in range(batch_size_by_n_chs)
             ]
-            xpac = [future.result() for future in futures]
+            for i_batch, future in enumerate(futures):
+                xpac = future.result()
+                if out_flat is None:
+                    out_flat = self._alloc_out(
+                        (batch_size_by_n_chs, *xpac.shape), xpac
+                    )
+                out_flat[i_batch] = xpac
+
+        return out_flat.reshape(*lead_shape, *out_flat.shape[1:])
+
+    def _calc_pac_using_processes(
+        self, xx: np.ndarray, out: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Calculate PAC using a pool of single-threaded worker processes.
 
-        xpac = np.array(xpac)
-        return self.dim_handler.unfit(xpac)
+        The input and the output are exchanged through shared memory; workers
+        receive only index ranges, so no large array is pickled.
+
+        Parameters
+        ----------
+        xx : np.ndarray
+            Input array of shape (batch_size, n_chs, n_segments, seq_len)
+        out : np.ndarray, optional
+            Preallocated output, see calc_pac
+
+        Returns
+        -------
+        np.ndarray
+            Calculated PAC values
+        """
+        assert xx.ndim == 4
+
+        lead_shape = xx.shape[:-1]
+        n_samples = int(np.prod(lead_shape))
+        dtype = np.float16 if self.fp16 else np.float32
+        out_shape = (n_samples, len(self.model.f_pha), len(self.model.f_amp))
+
+        shm_in = shared_memory.SharedMemory(
+            create=True, size=n_samples * self.seq_len * np.dtype(dtype).itemsize
+        )
+        shm_out = shared_memory.SharedMemory(
+            create=True, size=int(np.prod(out_shape)) * 8
+        )
+        try:
+            xx_shared = np.ndarray(
+                (n_samples, self.seq_len), dtype=dtype, buffer=shm_in.buf
+            )
+            # Copies the input once, chunk by chunk for memory maps
+            xx_flat = xx.reshape(n_samples, self.seq_len)
+            chunk_size = self._resolve_chunk_size(self.seq_len, n_samples)
+            for i_start in range(0, n_samples, chunk_size):
+                i_end = min(i_start + chunk_size, n_samples)
+                xx_shared[i_start:i_end] = self._read_chunk(xx_flat, i_start, i_end)
+
+            n_tasks = min(n_samples, 4 * self.n_workers)
+            bounds = np.linspace(0, n_samples, n_tasks + 1).astype(int)
+            futures = [
+                self._pool.submit(
+                    _calc_pac_shared,
+                    (shm_in.name, (n_samples, self.seq_len), np.dtype(dtype).str),
+                    (shm_out.name, out_shape),
+                    int(i_start),
+                    int(i_end),
+                )
+                for i_start, i_end in zip(bounds[:-1], bounds[1:])
+            ]
+            for future in futures:
+                future.result()
+
+            xpac_shared = np.ndarray(out_shape, dtype=np.float64, buffer=shm_out.buf)
+            if out is None:
+                out = np.empty((*lead_shape, *out_shape[1:]), dtype=np.float64)
+            out.reshape(out_shape)[...] = xpac_shared
+            del xx_shared, xpac_shared
+        finally:
+            for shm in (shm_in, shm_out):
+                shm.close()
+                shm.unlink()
+
+        return out
+
+    def _get_pool(self, model: tensorpac.Pac) -> ProcessPoolExecutor:
+        """
+        Worker pool for (fs, bands, n_workers), reused across handlers (i.e.,
+        conditions) like the models in filter_bank_cache. Up to MAX_POOLS
+        pools are kept; the least recently used one is shut down beyond.
+        """
+        key = make_key(
+            "tensorpac_pool",
+            self.fs,
+            model.f_pha,
+            model.f_amp,
+            model.idpac,
+            self.n_workers,
+        )
+        pool = _POOLS.pop(key, None)
+        if pool is None:
+            pool = self._start_pool(model)
+        _POOLS[key] = pool
+        while len(_POOLS) > MAX_POOLS:
+            _POOLS.popitem(last=False)[1].shutdown(wait=True, cancel_futures=True)
+        return pool
+
+    def _start_pool(self, model: tensorpac.Pac) -> ProcessPoolExecutor:
+        """
+        Starts a worker pool of self.n_workers processes.
+
+        Workers are spawned rather than forked, as forking a process with
+        torch (and its thread pools) loaded is unsafe. Executors start
+        spawned workers on demand, so one no-op task per worker is waited
+        for; the workers take far longer to start than the submissions.
+        """
+        pool = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.fs, model.f_pha, model.f_amp, model.idpac),
+        )
+        for future in [pool.submit(os.getpid) for _ in range(self.n_workers)]:
+            future.result(timeout=TIMEOUT_SEC)
+        return pool
 
     @property
     def freqs_amp(self) -> np.ndarray:
@@ -196,6 +393,59 @@ class TensorpacHandler(BaseHandler):
         return "Tensorpac"
 
 
+# Process pools of _get_pool, most recently used last
+_POOLS = OrderedDict()
+
+
+@atexit.register
+def shutdown_pools() -> None:
+    """Stops all worker pools of TensorpacHandler in this process."""
+    while _POOLS:
+        _POOLS.popitem()[1].shutdown(wait=True, cancel_futures=True)
+
+
+# Process-pool workers
+_WORKER = {}
+
+
+def _init_worker(fs, f_pha, f_amp, idpac):
+    """Pins the worker to a single BLAS/OpenMP thread and builds its model."""
+    for key in [
+        "OMP_NUM_THREADS",
+        "OPENBLAS_NUM_THREADS",
+        "MKL_NUM_THREADS",
+        "NUMEXPR_NUM_THREADS",
+    ]:
+        os.environ[key] = "1"
+    _WORKER["limits"] = threadpool_limits(limits=1)
+    model = tensorpac.Pac(f_pha=f_pha, f_amp=f_amp, dcomplex="wavelet", verbose=False)
+    model.idpac = idpac
+    _WORKER.update(fs=fs, model=model)
+
+
+def _calc_pac_shared(spec_in, spec_out, i_start, i_end):
+    """Reads xx[i_start:i_end] from and writes its PAC into shared memory."""
+    name_in, shape_in, dtype_in = spec_in
+    name_out, shape_out = spec_out
+    shm_in = shared_memory.SharedMemory(name=name_in)
+    shm_out = shared_memory.SharedMemory(name=name_out)
+    try:
+        xx = np.ndarray(shape_in, dtype=dtype_in, buffer=shm_in.buf)
+        xpac = np.ndarray(shape_out, dtype=np.float64, buffer=shm_out.buf)
+
+        model, fs = _WORKER["model"], _WORKER["fs"]
+        xs = xx[i_start:i_end]
+        pha = model.filter(fs, xs, ftype="phase", n_jobs=1)
+        amp = model.filter(fs, xs, ftype="amplitude", n_jobs=1)
+        xpac[i_start:i_end] = model.fit(pha, amp, n_jobs=1, verbose=False).transpose(
+            2, 1, 0
+        )
+        del xx, xpac
+    finally:
+        shm_in.close()
+        shm_out.close()
+
+
 # #!/usr/bin/env python3
 # # -*- coding: utf-8 -*-
 # # Time-stamp: "2024-11-04 15:05:23 (ywatanabe)"
@@ -215,6 +465,8 @@ class TensorpacHandler(BaseHandler):
 # from scripts.PackageHandlers import BaseHandler
 
 # TIMEOUT_SEC = int(10 * 60)
+# Worker pools kept per (fs, bands, n_workers) in this process (see _get_pool)
+MAX_POOLS = 2
 
 
 # # Functions
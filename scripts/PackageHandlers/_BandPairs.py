@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 20:14:52 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/_BandPairs.py
+
+"""
+Functionality:
+    - Normalises a selection of (phase band, amplitude band) pairs, given as a
+      list of index pairs or as a boolean (pha_n_bands, amp_n_bands) mask
+    - Scatters compact pair-indexed PAC values back to the dense comodulogram
+      (e.g., for plotting) and gathers pairs from a dense one
+Input:
+    - Band pairs and the numbers of phase and amplitude bands
+    - PAC values with shape (..., n_pairs) or (..., pha_n_bands, amp_n_bands)
+Output:
+    - Pair indices with shape (n_pairs, 2), dense or compact PAC values
+Prerequisites:
+    - NumPy
+    - PyTorch
+"""
+
+from typing import Sequence, Union
+
+import numpy as np
+import torch
+
+BandPairs = Union[Sequence[Sequence[int]], np.ndarray, torch.Tensor]
+
+
+def as_pair_indices(
+    band_pairs: BandPairs, pha_n_bands: int, amp_n_bands: int
+) -> np.ndarray:
+    """
+    (i_pha, i_amp) indices with shape (n_pairs, 2) from pairs or a mask.
+
+    A boolean mask with shape (pha_n_bands, amp_n_bands) selects its True
+    entries in row-major order; index pairs keep their given order.
+    """
+    if torch.is_tensor(band_pairs):
+        band_pairs = band_pairs.detach().cpu().numpy()
+    band_pairs = np.asarray(band_pairs)
+
+    if band_pairs.dtype == bool:
+        if band_pairs.shape != (pha_n_bands, amp_n_bands):
+            raise ValueError(
+                f"Band-pair mask has shape {band_pairs.shape}, "
+                f"expected {(pha_n_bands, amp_n_bands)}"
+            )
+        return np.argwhere(band_pairs)
+
+    pair_indices = band_pairs.astype(np.int64).reshape(-1, 2)
+    if len(pair_indices) == 0:
+        raise ValueError("No band pairs selected")
+    if (
+        (pair_indices < 0).any()
+        or (pair_indices[:, 0] >= pha_n_bands).any()
+        or (pair_indices[:, 1] >= amp_n_bands).any()
+    ):
+        raise ValueError(
+            f"Band pairs out of range for {pha_n_bands} phase and "
+            f"{amp_n_bands} amplitude bands"
+        )
+    return pair_indices
+
+
+def pairs_to_dense(
+    pac: Union[np.ndarray, torch.Tensor],
+    pair_indices: np.ndarray,
+    pha_n_bands: int,
+    amp_n_bands: int,
+    fill_value: float = np.nan,
+) -> Union[np.ndarray, torch.Tensor]:
+    """
+    Scatters PAC values with shape (..., n_pairs) into
+    (..., pha_n_bands, amp_n_bands), with fill_value for unselected pairs.
+    """
+    shape = (*pac.shape[:-1], pha_n_bands, amp_n_bands)
+    if torch.is_tensor(pac):
+        dense = pac.new_full(shape, fill_value)
+    else:
+        dense = np.full(shape, fill_value, dtype=np.result_type(pac, fill_value))
+    dense[..., pair_indices[:, 0], pair_indices[:, 1]] = pac
+    return dense
+
+
+def dense_to_pairs(
+    pac: Union[np.ndarray, torch.Tensor], pair_indices: np.ndarray
+) -> Union[np.ndarray, torch.Tensor]:
+    """Gathers (..., n_pairs) from PAC values with shape (..., pha_n_bands, amp_n_bands)."""
+    return pac[..., pair_indices[:, 0], pair_indices[:, 1]]
+
+
+# EOF
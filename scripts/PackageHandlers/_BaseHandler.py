@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: "2024-11-05 03:24:48 (ywatanabe)"
+# Time-stamp: "2026-10-18 11:02:37 (ywatanabe)"
 # File: ./torchPAC/scripts/PackageHandlers/_BaseHandler.py
 
 # #!/usr/bin/env python3
@@ -227,6 +227,7 @@ This script defines BaseHandler for phase-amplitude coupling calculations.
 """
 
 # Imports
+import mmap
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import datetime
@@ -235,6 +236,10 @@ from typing import Type, Union
 import mngs
 import numpy as np
 import pandas as pd
+import psutil
+import torch
+from scripts.PackageHandlers._FrequencyGrid import make_grids
+from scripts.PackageHandlers._StageTimer import StageTimer
 
 
 # Functions & Classes
@@ -262,16 +267,34 @@ class BaseHandler(ABC):
     n_perm: int
 
     # Calculation options
-    chunk_size: int
+    chunk_size: Union[int, str]
     fp16: bool
     in_place: bool
     trainable: bool
     use_threads: bool
+    use_processes: bool
 
     # Delete me
     dim_handler = mngs.gen.DimHandler()
     ts = None
 
+    # Whether the filter bank was taken from filter_bank_cache
+    init_cache_hit = None
+
+    # Chunk size actually used (resolved at calculation time for "auto")
+    chunk_size_used = None
+    mem_budget_gib = None
+    n_bins = 18
+
+    # Timing summary set by perform_pac_calculation (see utils/benchmark.py)
+    benchmark_result = None
+
+    # Peak memory set by perform_pac_calculation (see utils/measure_memory.py)
+    memory_stats = None
+
+    # Configuration chosen for error_budget (calib_* columns in stats)
+    calibration = None
+
     # Optional
     init_start_str = "Model Initialization Starts"
     init_end_str = "Model Initialization Ends"
@@ -290,13 +313,24 @@ class BaseHandler(ABC):
         amp_min_hz: Union[int, float],
         amp_max_hz: Union[int, float],
         n_perm: int,
-        chunk_size: int,
+        chunk_size: Union[int, str],
         fp16: bool,
         in_place: bool,
         trainable: bool,
         device: str,
         use_threads: bool,
         ts: mngs.gen.TimeStamper,
+        mem_budget_gib: float = None,
+        use_processes: bool = False,
+        n_workers: int = None,
+        profile_stages: bool = False,
+        dtype_policy: str = None,
+        error_budget: dict = None,
+        fused_mi: bool = False,
+        band_pairs=None,
+        pha_grid=None,
+        amp_grid=None,
+        multirate: bool = False,
     ):
 
         # Signal properties
@@ -313,16 +347,62 @@ class BaseHandler(ABC):
         self.amp_min_hz = amp_min_hz
         self.amp_max_hz = amp_max_hz
 
+        # Band edges shared by every handler (see _FrequencyGrid.py); by
+        # default, those of mngs.nn.PAC, including its cap of the amplitude
+        # range below the Nyquist frequency. pha_grid and amp_grid may be a
+        # spacing ("linear", "log", "constant_q"), a dict such as
+        # {"spacing": "log", "q": 3} or {"edges": [[low_hz, high_hz], ...]}.
+        self.grid_pha, self.grid_amp = make_grids(
+            fs,
+            pha_min_hz,
+            pha_max_hz,
+            pha_n_bands,
+            amp_min_hz,
+            amp_max_hz,
+            amp_n_bands,
+            pha_grid=pha_grid,
+            amp_grid=amp_grid,
+        )
+        self.pha_n_bands = self.grid_pha.n_bands
+        self.amp_n_bands = self.grid_amp.n_bands
+
         # Surrogate
         self.n_perm = n_perm
 
         # Calculation options
+        # chunk_size="auto" picks the largest chunk fitting mem_budget_gib
+        # (by default, half of the available RAM or VRAM)
         self.chunk_size = chunk_size
+        self.mem_budget_gib = mem_budget_gib
+        # "auto" chunk sizes per (n_elems_per_sample, n_samples), so that the
+        # budget is resolved once per input shape rather than per calc_pac
+        self._auto_chunk_sizes = {}
         self.fp16 = fp16
         self.in_place = in_place
         self.trainable = trainable
         self.device = device
         self.use_threads = use_threads
+        self.use_processes = use_processes
+        self.n_workers = n_workers
+        # Per-stage dtypes of the FFT pipeline (see _DtypePolicy.py); by
+        # default, all-half with fp16 and float32 otherwise
+        self.dtype_policy = dtype_policy or ("fp16" if fp16 else "fp32")
+        # Tolerance against float64, e.g., {"pearson_r": 0.999} (see _ErrorBudget.py)
+        self.error_budget = error_budget
+        # Fused scatter-add comodulogram in place of mngs.nn.ModulationIndex
+        # (see _FusedModulationIndex.py); FFTPAC always bins this way
+        self.fused_mi = fused_mi
+        # Selected (i_pha, i_amp) pairs or a boolean (pha_n_bands, amp_n_bands)
+        # mask; PAC is then returned per pair (see _BandPairs.py)
+        self.band_pairs = band_pairs
+        # Phase bands filtered at a decimated rate (see FFTPAC.pha_decimation)
+        self.multirate = multirate
+
+        # Per-stage timers inside calc_pac (opt-in; no-op when disabled)
+        self.stage_timer = StageTimer(
+            enabled=profile_stages,
+            sync=torch.cuda.synchronize if "cuda" in str(device) else None,
+        )
 
         # Time Stamper
         self.ts = ts
@@ -338,9 +418,12 @@ class BaseHandler(ABC):
         pass
 
     @abstractmethod
-    def calc_pac(self, xx):
+    def calc_pac(self, xx, out=None):
         pass
 
+    def close(self) -> None:
+        """Releases resources held across calc_pac calls (e.g., worker pools)."""
+
     @property
     @abstractmethod
     def freqs_amp(self):
@@ -351,6 +434,132 @@ class BaseHandler(ABC):
     def freqs_pha(self):
         pass
 
+    def _calc_pac_chunked(self, xx, n_keepdims: int, calc_fn, out=None):
+        """
+        Applies calc_fn to chunk_size slices of xx, writing into one output buffer.
+
+        Parameters
+        ----------
+        xx : torch.Tensor or np.ndarray
+            Input whose last n_keepdims dimensions are passed to calc_fn; the
+            leading dimensions are flattened into the sample dimension
+        n_keepdims : int
+            Number of trailing dimensions kept per sample
+        calc_fn : Callable
+            Maps a chunk of shape (n, *kept_dims) to results of shape (n, ...)
+        out : torch.Tensor or np.ndarray, optional
+            Contiguous buffer with shape (*leading_dims, ...) to write into;
+            allocated once from the first chunk result when None
+
+        Returns
+        -------
+        torch.Tensor or np.ndarray
+            out, with shape (*leading_dims, ...)
+        """
+        lead_shape = tuple(xx.shape[: xx.ndim - n_keepdims])
+        xx = xx.reshape(-1, *xx.shape[xx.ndim - n_keepdims :])
+        n_samples = len(xx)
+        chunk_size = self._resolve_chunk_size(
+            int(np.prod(xx.shape[1:])), n_samples
+        )
+
+        out_flat = None
+        if out is not None:
+            out_flat = out.reshape(n_samples, *out.shape[len(lead_shape) :])
+
+        for i_start in range(0, n_samples, chunk_size):
+            i_end = min(i_start + chunk_size, n_samples)
+            xpac = calc_fn(self._read_chunk(xx, i_start, i_end))
+            if out_flat is None:
+                out_flat = self._alloc_out((n_samples, *xpac.shape[1:]), xpac)
+            out_flat[i_start:i_end] = xpac
+
+        return out_flat.reshape(*lead_shape, *out_flat.shape[1:])
+
+    def _resolve_chunk_size(self, n_elems_per_sample: int, n_samples: int) -> int:
+        """Returns chunk_size, estimating it from the memory budget when "auto"."""
+        if self.chunk_size != "auto":
+            self.chunk_size_used = self.chunk_size
+            return self.chunk_size
+
+        key = (n_elems_per_sample, n_samples)
+        if key not in self._auto_chunk_sizes:
+            n_bytes = self._bytes_per_sample(n_elems_per_sample)
+            chunk_size = int(self._mem_budget_bytes() // n_bytes)
+            self._auto_chunk_sizes[key] = max(1, min(chunk_size, n_samples))
+        self.chunk_size_used = self._auto_chunk_sizes[key]
+        return self.chunk_size_used
+
+    def _bytes_per_sample(self, n_elems_per_sample: int) -> int:
+        """
+        Estimates the working-set bytes of one sample (e.g., n_segments x seq_len).
+
+        Follows mngs.nn.PAC: analytic signals of all bands, phase-bin masks
+        broadcast against every amplitude band, and n_perm surrogates of the
+        latter.
+        """
+        itemsize = 2 if self.fp16 else 4
+        n_bands = self.pha_n_bands + self.amp_n_bands
+        n_pairs_bins = self.pha_n_bands * self.amp_n_bands * self.n_bins
+        n_perm = self.n_perm or 0
+        return (
+            n_elems_per_sample
+            * itemsize
+            * (2 * n_bands + n_pairs_bins * (1 + n_perm))
+        )
+
+    def _mem_budget_bytes(self) -> float:
+        if self.mem_budget_gib is not None:
+            return self.mem_budget_gib * 1024**3
+        if str(self.device).startswith("cuda"):
+            return 0.5 * torch.cuda.mem_get_info(self.device)[0]
+        return 0.5 * psutil.virtual_memory().available
+
+    @staticmethod
+    def _alloc_out(shape, like):
+        if isinstance(like, np.ndarray):
+            return np.empty(shape, dtype=like.dtype)
+        return like.new_empty(shape)
+
+    def _read_chunk(self, xx, i_start: int, i_end: int):
+        """
+        Returns xx[i_start:i_end] ready for the PAC calculation.
+
+        Memory-mapped inputs (np.memmap or np.load(..., mmap_mode="r")) are
+        read only for this slice and cast to the working dtype; the pages are
+        released right after the copy (_release_chunk), so that the peak RSS is
+        bounded by chunk_size rather than by the recording size.
+        """
+        chunk = xx[i_start:i_end]
+        if isinstance(chunk, np.memmap):
+            data = np.array(chunk, dtype=np.float16 if self.fp16 else np.float32)
+            self._release_chunk(chunk)
+            chunk = data
+        return chunk
+
+    @staticmethod
+    def _release_chunk(chunk) -> None:
+        """
+        Drops the pages of a copied slice of a read-only memory map (best
+        effort). Only the whole pages inside the slice are released, so that
+        readahead for the next chunk and slices read by other threads stay
+        mapped.
+        """
+        mm = getattr(chunk, "_mmap", None)
+        if (
+            mm is None
+            or getattr(chunk, "mode", None) != "r"
+            or not hasattr(mmap, "MADV_DONTNEED")
+            or not chunk.flags.c_contiguous
+        ):
+            return
+        # Byte range of the slice within the mapping, shrunk to whole pages
+        start = chunk.ctypes.data - np.frombuffer(mm, dtype=np.uint8).ctypes.data
+        end = (start + chunk.nbytes) // mmap.PAGESIZE * mmap.PAGESIZE
+        start = -(-start // mmap.PAGESIZE) * mmap.PAGESIZE
+        if end > start:
+            mm.madvise(mmap.MADV_DONTNEED, start, end - start)
+
     @property
     def stats(self):
         indi_init_start = np.where(self.ts.record["comment"] == self.init_start_str)[0]
@@ -362,28 +571,60 @@ class BaseHandler(ABC):
         init_delta_times_ss = init_delta_times.std()
         init_delta_times_nn = len(init_delta_times)
 
-        indi_calc_start = np.where(self.ts.record["comment"] == self.calc_start_str)[0]
-        indi_calc_end = np.where(self.ts.record["comment"] == self.calc_end_str)[0]
-        calc_start_times = np.array(self.ts.record.loc[indi_calc_start].timestamp)
-        calc_end_times = np.array(self.ts.record.loc[indi_calc_end].timestamp)
-        calc_delta_times = calc_end_times - calc_start_times
-        calc_delta_times_mm = calc_delta_times.mean()
-        calc_delta_times_ss = calc_delta_times.std()
-        calc_delta_times_nn = len(calc_delta_times)
-
+        calc_stats = self._calc_stats()
         dic = {
-            "time": _get_middle_time(calc_start_times[0], calc_end_times[-1]),
+            "time": calc_stats.pop("time"),
             "init_time_mean_sec": init_delta_times_mm,
             "init_time_std_sec": init_delta_times_ss,
             "init_time_nn": init_delta_times_nn,
-            "calc_time_mean_sec": calc_delta_times_mm,
-            "calc_time_std_sec": calc_delta_times_ss,
-            "calc_time_nn": calc_delta_times_nn,
+            **calc_stats,
+            "init_cache_hit": self.init_cache_hit,
+            "chunk_size_used": self.chunk_size_used,
+            **self.stage_timer.to_dict(calc_stats["calc_time_nn"]),
+            **(self.memory_stats.to_dict() if self.memory_stats is not None else {}),
+            **(self.calibration or {}),
         }
 
-        df = pd.DataFrame(data=dic, index=[str(self)]).round(3)
+        # Microsecond resolution for the perf_counter_ns timings
+        df = pd.DataFrame(data=dic, index=[str(self)]).round(6)
         return df
 
+    def _calc_stats(self) -> dict:
+        if self.benchmark_result is not None:
+            # Warmup-excluded perf_counter_ns timings
+            result = self.benchmark_result
+            return {
+                "time": result.middle_time,
+                "calc_start_time": result.start_time,
+                "calc_end_time": result.end_time,
+                "calc_time_mean_sec": result.mean_sec,
+                "calc_time_std_sec": result.std_sec,
+                "calc_time_nn": result.n_calc,
+                "calc_time_median_sec": result.median_sec,
+                "calc_time_iqr_sec": result.iqr_sec,
+                "calc_time_p95_sec": result.p95_sec,
+                "calc_time_p99_sec": result.p99_sec,
+                "calc_time_median_ci_low_sec": result.median_ci_low_sec,
+                "calc_time_median_ci_high_sec": result.median_ci_high_sec,
+                "calc_time_rel_precision": result.rel_precision,
+                "calc_time_converged": result.converged,
+                "calc_n_warmup": result.n_warmup,
+            }
+
+        indi_calc_start = np.where(self.ts.record["comment"] == self.calc_start_str)[0]
+        indi_calc_end = np.where(self.ts.record["comment"] == self.calc_end_str)[0]
+        calc_start_times = np.array(self.ts.record.loc[indi_calc_start].timestamp)
+        calc_end_times = np.array(self.ts.record.loc[indi_calc_end].timestamp)
+        calc_delta_times = calc_end_times - calc_start_times
+        return {
+            "time": _get_middle_time(calc_start_times[0], calc_end_times[-1]),
+            "calc_start_time": datetime.fromtimestamp(calc_start_times[0]),
+            "calc_end_time": datetime.fromtimestamp(calc_end_times[-1]),
+            "calc_time_mean_sec": calc_delta_times.mean(),
+            "calc_time_std_sec": calc_delta_times.std(),
+            "calc_time_nn": len(calc_delta_times),
+        }
+
 def _get_middle_time(dt1, dt2):
     """
     Returns the middle time between two datetime objects.
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 18:41:09 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/_DtypePolicy.py
+
+"""
+Functionality:
+    - Implements DtypePolicy, the dtypes of each stage of the FFT PAC pipeline
+        - filter: rFFT, kernel multiplication, inverse FFT, angle / abs and
+          phase binning
+        - storage: phase-bin indices aside, the amplitudes kept between stages
+          (and their time-shifted surrogates)
+        - multiply: the bulk mask x amplitude products of the histograms
+          (binning="matmul"; scatter-adds take the accumulate dtype)
+        - accumulate: the histogram sums and the modulation index
+    - Presets: fp64 (reference), fp32, fp16 (the former all-half pipeline),
+      mixed_bf16 and mixed_fp16
+Input:
+    - Preset name
+Output:
+    - DtypePolicy
+Prerequisites:
+    - PyTorch
+"""
+
+from dataclasses import dataclass
+
+import torch
+
+
+@dataclass(frozen=True)
+class DtypePolicy:
+    name: str
+    filter: torch.dtype = torch.float32
+    storage: torch.dtype = torch.float32
+    multiply: torch.dtype = torch.float32
+    accumulate: torch.dtype = torch.float32
+    # Samples per low-precision product, summed up in the accumulate dtype
+    block_len: int = 1024
+
+    @classmethod
+    def from_name(cls, name: str) -> "DtypePolicy":
+        if name not in PRESETS:
+            raise ValueError(
+                f"Unknown dtype policy: {name!r} (choose from {list(PRESETS)})"
+            )
+        return PRESETS[name]
+
+    @property
+    def is_blocked(self) -> bool:
+        """Whether products are summed block by block in a wider dtype."""
+        return self.multiply != self.accumulate
+
+    @property
+    def scales_amplitude(self) -> bool:
+        """
+        Whether amplitudes are scaled to [0, 1] per band before storage.
+
+        float16 overflows at 65504; the MI is invariant to the scale of each
+        amplitude band, so the scale is not undone.
+        """
+        return self.storage == torch.float16
+
+    def store_amplitude(self, amp: torch.Tensor) -> torch.Tensor:
+        if self.scales_amplitude:
+            amp = amp / amp.amax(dim=-1, keepdim=True).clamp_min(
+                torch.finfo(amp.dtype).tiny
+            )
+        return amp.to(self.storage)
+
+
+PRESETS = {
+    "fp64": DtypePolicy(
+        "fp64",
+        filter=torch.float64,
+        storage=torch.float64,
+        multiply=torch.float64,
+        accumulate=torch.float64,
+    ),
+    "fp32": DtypePolicy("fp32"),
+    "fp16": DtypePolicy(
+        "fp16",
+        storage=torch.float16,
+        multiply=torch.float16,
+        accumulate=torch.float16,
+    ),
+    "mixed_bf16": DtypePolicy(
+        "mixed_bf16",
+        storage=torch.bfloat16,
+        multiply=torch.bfloat16,
+    ),
+    "mixed_fp16": DtypePolicy(
+        "mixed_fp16",
+        storage=torch.float16,
+        multiply=torch.float16,
+    ),
+}
+
+
+# EOF
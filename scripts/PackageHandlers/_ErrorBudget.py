@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 19:26:03 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/_ErrorBudget.py
+
+"""
+Functionality:
+    - Picks the fastest FFT PAC configuration meeting an error budget
+      (e.g., {"abs_diff_rms": 1e-3} or {"pearson_r": 0.999}) against the
+      float64 reference
+    - Candidates: dtype policy, filter length (zero padding in kernel standard
+      deviations), number of phase bins and number of surrogates
+    - Every candidate is validated on a calibration batch; the choice is
+      cached per (fs, seq_len, bands, device, n_perm, budget) in
+      filter_bank_cache
+Input:
+    - Calibration batch with shape (n_samples, n_segments, seq_len)
+    - FFTPAC keyword arguments, error budget and candidate values
+Output:
+    - Chosen configuration (dict) and, on a cache miss, the calibration report
+Prerequisites:
+    - PyTorch
+    - pandas
+"""
+
+import itertools
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+import torch
+from scripts.PackageHandlers._FilterBankCache import filter_bank_cache, make_key
+from scripts.PackageHandlers._PACAccuracy import (
+    check_tolerance,
+    meets_tolerance,
+    pac_correlations,
+    pac_differences,
+)
+
+REFERENCE = {"dtype_policy": "fp64", "pad_sigmas": 4, "n_bins": 18}
+DEFAULT_CANDIDATES = {
+    "dtype_policy": ["fp32", "mixed_fp16", "mixed_bf16", "fp16"],
+    "pad_sigmas": [4, 3, 2],
+    "n_bins": [18, 12],
+}
+
+
+def candidate_configs(
+    n_perm: Optional[int], candidates: Optional[Dict[str, List]] = None
+) -> List[Dict[str, Any]]:
+    """
+    All combinations of the candidate values.
+
+    Surrogates are tried at n_perm, n_perm / 2 and n_perm / 4 unless given.
+    """
+    candidates = {**DEFAULT_CANDIDATES, **(candidates or {})}
+    if "n_perm" not in candidates:
+        candidates["n_perm"] = (
+            [None]
+            if n_perm is None
+            else sorted({max(1, n_perm // div) for div in (1, 2, 4)}, reverse=True)
+        )
+    names = list(candidates)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(candidates[name] for name in names))
+    ]
+
+
+def calibrate(
+    build_model: Callable[..., torch.nn.Module],
+    xx: torch.Tensor,
+    n_perm: Optional[int],
+    error_budget: Dict[str, float],
+    candidates: Optional[Dict[str, List]] = None,
+    seed: int = 42,
+    n_timed: int = 3,
+) -> Tuple[Dict[str, Any], pd.DataFrame]:
+    """
+    Validates every candidate against the reference on xx and picks the fastest.
+
+    Parameters
+    ----------
+    build_model : Callable[..., torch.nn.Module]
+        Builds an FFTPAC from dtype_policy, pad_sigmas, n_bins and n_perm
+    xx : torch.Tensor
+        Calibration batch with shape (n_samples, n_segments, seq_len)
+    n_perm : int, optional
+        Number of surrogates of the reference
+    error_budget : Dict[str, float]
+        Upper bounds of differences and lower bounds of correlations
+        (see _PACAccuracy.py)
+    candidates : Dict[str, List], optional
+        Candidate values overriding DEFAULT_CANDIDATES
+    seed : int, optional
+        Seed of the surrogate shifts, shared by all candidates
+    n_timed : int, optional
+        Timed calls per candidate (the fastest is kept), by default 3
+
+    Returns
+    -------
+    Tuple[Dict[str, Any], pd.DataFrame]
+        The chosen configuration (the reference when no candidate meets the
+        budget) and one report row per candidate
+    """
+    check_tolerance(error_budget)
+
+    def run(config):
+        model = build_model(**config).to(xx.device)
+        _xx = xx.half() if config["dtype_policy"] == "fp16" else xx
+        # The same shifts for every candidate, without touching the global RNG
+        with torch.random.fork_rng(devices=[]), torch.no_grad():
+            torch.manual_seed(seed)
+            pac = model(_xx)
+            # Best of a few calls, as the calibration batch is small
+            times_sec = []
+            for _ in range(n_timed):
+                start = time.perf_counter()
+                model(_xx)
+                if xx.is_cuda:
+                    torch.cuda.synchronize(xx.device)
+                times_sec.append(time.perf_counter() - start)
+            return pac, min(times_sec)
+
+    reference = {**REFERENCE, "n_perm": n_perm}
+    pac_ref, ref_time_sec = run(reference)
+
+    rows = []
+    for config in candidate_configs(n_perm, candidates):
+        pac, calc_time_sec = run(config)
+        metrics = {**pac_differences(pac, pac_ref), **pac_correlations(pac, pac_ref)}
+        rows.append(
+            {
+                **config,
+                **metrics,
+                "calc_time_sec": calc_time_sec,
+                "meets_budget": meets_tolerance(metrics, error_budget),
+            }
+        )
+    report = pd.DataFrame(rows)
+
+    passed = report[report["meets_budget"]]
+    if len(passed):
+        chosen = passed.loc[passed["calc_time_sec"].idxmin()]
+        config = {name: _to_builtin(chosen[name]) for name in reference}
+        config["time_ratio"] = float(chosen["calc_time_sec"] / ref_time_sec)
+    else:
+        config = {**reference, "time_ratio": 1.0}
+    return config, report
+
+
+def get_or_calibrate(
+    build_model: Callable[..., torch.nn.Module],
+    xx: torch.Tensor,
+    key_parts: tuple,
+    n_perm: Optional[int],
+    error_budget: Dict[str, float],
+    candidates: Optional[Dict[str, List]] = None,
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Cached calibrate(); key_parts are e.g. (fs, seq_len, bands_pha, bands_amp, device).
+
+    Returns
+    -------
+    Tuple[Dict[str, Any], bool]
+        The chosen configuration and whether it was taken from the cache
+    """
+    key = make_key(
+        "error_budget",
+        *key_parts,
+        n_perm,
+        tuple(sorted(error_budget.items())),
+        repr(sorted((candidates or {}).items())),
+    )
+    return filter_bank_cache.get_or_build(
+        key,
+        lambda: calibrate(build_model, xx, n_perm, error_budget, candidates)[0],
+    )
+
+
+def _to_builtin(value):
+    """NumPy scalars (and NaN for None) from the report as JSON-friendly values."""
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+# EOF
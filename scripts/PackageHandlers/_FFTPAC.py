@@ -0,0 +1,741 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 10:12:04 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/_FFTPAC.py
+
+"""
+Functionality:
+    - Implements FFTPAC, a PAC nn.Module working entirely in the frequency domain
+    - One rFFT per signal, one multiplication with a bank of analytic band-pass
+      kernels for all phase and amplitude bands, and one batched inverse FFT
+    - Modulation index (Tort et al., 2010) for all band pairs at once, by one
+      scatter-add per phase band over all amplitude bands (binning="scatter",
+      see _FusedModulationIndex.py) or one-hot masks and a batched matmul
+      (binning="matmul")
+    - Time-shift surrogates sharing the phase bins of the observed signal
+    - Per-stage dtypes (see _DtypePolicy.py): phase binning at the filter
+      precision, low-precision amplitudes and products, wide accumulation
+    - With band_pairs, filters only the bands of the selected (phase,
+      amplitude) pairs and computes the MI of those pairs only
+    - Multirate phase path (pha_decimation): phase bands are filtered on a
+      truncated spectrum, i.e., at fs / pha_decimation after an ideal
+      anti-alias low-pass, as baseband signals (complex demodulation), and
+      their phase is interpolated back to the full-rate time grid of the
+      amplitudes before binning
+Input:
+    - Time series with shape (batch_size, n_segments, seq_len)
+Output:
+    - PAC values with shape (batch_size, pha_n_bands, amp_n_bands), or
+      (batch_size, n_pairs) with band_pairs
+Prerequisites:
+    - PyTorch
+    - NumPy
+    - SciPy
+Note:
+    - Kernels are taken from the process-wide filter_bank_cache
+"""
+
+import math
+from typing import Union
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from scipy.fft import next_fast_len
+from scripts.PackageHandlers._BandPairs import as_pair_indices
+from scripts.PackageHandlers._DtypePolicy import DtypePolicy
+from scripts.PackageHandlers._FilterBankCache import filter_bank_cache, make_key
+from scripts.PackageHandlers._FusedModulationIndex import (
+    comodulogram_sums,
+    paired_comodulogram_sums,
+    surrogate_comodulogram_sums,
+)
+from scripts.PackageHandlers._StageTimer import StageTimer
+
+
+# Functions
+def calc_bands_pha(start_hz=2, end_hz=20, n_bands=100) -> np.ndarray:
+    """Phase bands with the same edges as mngs.nn.PAC (mid +/- mid / 4)."""
+    mid_hz = np.linspace(start_hz, end_hz, n_bands)
+    return np.c_[mid_hz - mid_hz / 4.0, mid_hz + mid_hz / 4.0]
+
+
+def calc_bands_amp(start_hz=30, end_hz=160, n_bands=100) -> np.ndarray:
+    """Amplitude bands with the same edges as mngs.nn.PAC (mid +/- mid / 8)."""
+    mid_hz = np.linspace(start_hz, end_hz, n_bands)
+    return np.c_[mid_hz - mid_hz / 8.0, mid_hz + mid_hz / 8.0]
+
+
+def calc_sigma_t(bands: np.ndarray) -> np.ndarray:
+    """
+    Temporal standard deviation [s] of the Gaussian kernels for the given bands.
+
+    The band edges are interpreted as the full width at half maximum of the
+    Gaussian frequency response.
+    """
+    sigma_f = (bands[:, 1] - bands[:, 0]) / (2 * math.sqrt(2 * math.log(2)))
+    return 1 / (2 * np.pi * sigma_f)
+
+
+def calc_n_fft(
+    seq_len: int,
+    fs: float,
+    bands: np.ndarray,
+    pad_sigmas: float = 4,
+    multiple_of: int = 1,
+) -> int:
+    """
+    FFT length large enough to avoid circular wrap-around of the kernels.
+
+    The signal is zero-padded by pad_sigmas (by default, four) temporal
+    standard deviations of the widest (i.e., the lowest-frequency) kernel,
+    capped at seq_len. With multiple_of, the length is a multiple of it
+    (the decimation factor of the phase path), with at least one decimated
+    sample beyond the padded signal for the interpolation.
+    """
+    pad = int(math.ceil(pad_sigmas * calc_sigma_t(bands).max() * fs))
+    n_fft = seq_len + min(pad, seq_len)
+    if multiple_of > 1:
+        n_low = -(-n_fft // multiple_of) + 1
+        return multiple_of * next_fast_len(n_low, real=True)
+    return next_fast_len(n_fft, real=True)
+
+
+def calc_decimation(
+    bands: np.ndarray, fs: float, seq_len: int, n_sigmas: float = 4
+) -> int:
+    """
+    Largest decimation factor keeping the given bands below the Nyquist frequency.
+
+    Each Gaussian kernel is taken to extend n_sigmas frequency standard
+    deviations above its centre; at least 16 samples are kept.
+    """
+    sigma_f = (bands[:, 1] - bands[:, 0]) / (2 * math.sqrt(2 * math.log(2)))
+    f_max_hz = (bands.mean(axis=-1) + n_sigmas * sigma_f).max()
+    return max(1, min(int(fs / 2 // f_max_hz), seq_len // 16))
+
+
+def upsample_phase(
+    z_base: torch.Tensor,
+    factor: int,
+    seq_len: int,
+    carrier_bins: torch.Tensor,
+    n_fft: int,
+    n_bins: int = None,
+) -> torch.Tensor:
+    """
+    Full-rate phase from baseband analytic signals sampled at every factor-th sample.
+
+    The baseband signals (each band shifted down by its carrier bin) vary
+    slowly, so their unwrapped phase is linearly interpolated; the carrier
+    phase, 2 * pi * carrier_bin * t / n_fft, is added back. Both are linear
+    within each decimated step, so the full-rate work is one multiply-add,
+    the wrap and, with n_bins, the conversion to phase-bin indices (the
+    phase is then computed in units of bins).
+
+    Parameters
+    ----------
+    z_base : torch.Tensor
+        Complex baseband signals with shape (..., n_bands, n_low), where
+        sample i is at time i * factor and (n_low - 1) * factor >= seq_len
+    factor : int
+        Decimation factor
+    seq_len : int
+        Number of full-rate samples
+    carrier_bins : torch.Tensor
+        Integer carrier bins of the bands (on n_fft) with shape (n_bands,)
+    n_fft : int
+        Full-rate FFT length
+    n_bins : int, optional
+        Number of phase bins; if given, phase_bin_indices are returned
+
+    Returns
+    -------
+    torch.Tensor
+        Phase in [-pi, pi), or uint8 phase-bin indices, with shape
+        (..., n_bands, seq_len)
+    """
+    dtype = z_base.real.dtype
+    scale = 1.0 if n_bins is None else n_bins / (2 * np.pi)
+    pha_base = z_base.angle().double()
+    steps = _wrap(pha_base.diff(dim=-1))
+
+    # Integer remainder, so that the carrier phase stays exact for long inputs;
+    # starts are shifted by pi, i.e., in [0, 2 * pi) as phase_bin_indices expects
+    tt_low = torch.arange(pha_base.shape[-1] - 1, device=z_base.device) * factor
+    carrier = torch.remainder(carrier_bins[:, None] * tt_low, n_fft)
+    starts = torch.remainder(
+        pha_base[..., :-1] + np.pi + (2 * np.pi / n_fft) * carrier, 2 * np.pi
+    )
+    slopes = steps / factor + (2 * np.pi / n_fft) * carrier_bins[:, None]
+
+    offsets = torch.arange(factor, device=z_base.device, dtype=dtype)
+    pha = torch.addcmul(
+        (starts * scale).to(dtype).unsqueeze(-1),
+        (slopes * scale).to(dtype).unsqueeze(-1),
+        offsets,
+    )
+    pha = torch.remainder(pha.flatten(-2)[..., :seq_len], 2 * np.pi * scale)
+    if n_bins is None:
+        return pha - np.pi
+    return pha.to(torch.uint8).clamp_(0, n_bins - 1)
+
+
+def _wrap(pha: torch.Tensor) -> torch.Tensor:
+    return torch.remainder(pha + np.pi, 2 * np.pi) - np.pi
+
+
+def design_kernel_bank(
+    bands: np.ndarray, fs: float, n_fft: int, dtype=np.float32
+) -> np.ndarray:
+    """
+    Designs analytic band-pass kernels in the frequency domain.
+
+    Each kernel is a zero-phase Gaussian centred on the band and defined on the
+    non-negative rFFT bins only. Multiplying an rFFT by a kernel and taking a
+    full-length inverse FFT therefore yields the analytic signal of the
+    band-passed input (equivalent to a Morlet wavelet convolution).
+
+    Parameters
+    ----------
+    bands : np.ndarray
+        Band edges in Hz with shape (n_bands, 2)
+    fs : float
+        Sampling frequency in Hz
+    n_fft : int
+        FFT length
+    dtype : np.dtype, optional
+        Output dtype, by default np.float32
+
+    Returns
+    -------
+    np.ndarray
+        Kernels with shape (n_bands, n_fft // 2 + 1)
+    """
+    freqs = np.fft.rfftfreq(n_fft, d=1 / fs)
+    centers = bands.mean(axis=-1, keepdims=True)
+    sigma_f = (bands[:, 1:] - bands[:, :1]) / (2 * math.sqrt(2 * math.log(2)))
+    kernels = np.exp(-0.5 * ((freqs[None] - centers) / sigma_f) ** 2)
+    # Doubles the positive frequencies to keep the analytic amplitude
+    kernels[:, 1:] *= 2.0
+    return kernels.astype(dtype)
+
+
+def design_fir_kernel_bank(
+    bands: np.ndarray, fs: float, n_taps: int = None
+) -> np.ndarray:
+    """
+    Designs analytic band-pass FIR kernels (complex Morlet wavelets).
+
+    These are the time-domain counterparts of design_kernel_bank, truncated to
+    n_taps samples, for block-wise (overlap-save) filtering.
+
+    Parameters
+    ----------
+    bands : np.ndarray
+        Band edges in Hz with shape (n_bands, 2)
+    fs : float
+        Sampling frequency in Hz
+    n_taps : int, optional
+        Odd kernel length; by default, +/- 4 temporal standard deviations of
+        the widest kernel
+
+    Returns
+    -------
+    np.ndarray
+        Complex kernels with shape (n_bands, n_taps), delayed by (n_taps - 1) / 2
+    """
+    if n_taps is None:
+        n_taps = 2 * int(math.ceil(4 * calc_sigma_t(bands).max() * fs)) + 1
+    tt = (np.arange(n_taps) - (n_taps - 1) / 2) / fs
+    sigma_t = calc_sigma_t(bands)[:, None]
+    windows = np.exp(-0.5 * (tt[None] / sigma_t) ** 2)
+    # Unit analytic amplitude at the centre frequency (cf. design_kernel_bank)
+    windows *= 2.0 / windows.sum(axis=-1, keepdims=True)
+    carriers = np.exp(2j * np.pi * bands.mean(axis=-1, keepdims=True) * tt[None])
+    return (windows * carriers).astype(np.complex64)
+
+
+def modulation_index(
+    pha: torch.Tensor, amp: torch.Tensor, n_bins: int = 18, epsilon=1e-9
+) -> torch.Tensor:
+    """
+    Computes the modulation index for every (phase, amplitude) band pair.
+
+    Phase is digitised once per phase band; the phase-binned amplitude sums of
+    all amplitude bands are then accumulated at once (see
+    phase_binned_amplitude).
+
+    Parameters
+    ----------
+    pha : torch.Tensor
+        Phase with shape (batch_size, n_segments, pha_n_bands, seq_len)
+    amp : torch.Tensor
+        Amplitude with shape (batch_size, n_segments, amp_n_bands, seq_len)
+    n_bins : int, optional
+        Number of phase bins, by default 18
+
+    Returns
+    -------
+    torch.Tensor
+        MI with shape (batch_size, n_segments, pha_n_bands, amp_n_bands), per
+        segment as mngs.nn.PAC and tensorpac return it
+    """
+    amp_sums, counts = phase_binned_amplitude(pha, amp, n_bins=n_bins)
+    return modulation_index_from_hist(amp_sums, counts, epsilon=epsilon)
+
+
+def phase_binned_amplitude(
+    pha: torch.Tensor,
+    amp: torch.Tensor,
+    n_bins: int = 18,
+    policy: DtypePolicy = None,
+    binning: str = "scatter",
+    pair_indices: np.ndarray = None,
+):
+    """
+    Accumulates amplitude per phase bin for every (phase, amplitude) band pair.
+
+    With binning="scatter", amplitudes are scatter-added into (sample, bin)
+    rows, one phase band at a time (see comodulogram_sums); with "matmul",
+    one-hot phase masks are contracted with the amplitudes by an einsum in
+    the product dtype of the policy, which may suit tensor cores better.
+
+    Parameters
+    ----------
+    pha : torch.Tensor
+        Phase, or phase-bin indices (integer dtype; see phase_bin_indices)
+    amp : torch.Tensor
+        Amplitude with shape (..., amp_n_bands, seq_len)
+    policy : DtypePolicy, optional
+        Product and accumulation dtypes; by default, those of amp
+    binning : str, optional
+        "scatter" (default) or "matmul"
+    pair_indices : np.ndarray, optional
+        (i_pha, i_amp) indices of the band pairs to accumulate, with shape
+        (n_pairs, 2); scatter binning only
+
+    Returns
+    -------
+    Tuple[torch.Tensor, torch.Tensor]
+        amp_sums with shape (..., pha_n_bands, n_bins, amp_n_bands) and
+        counts with shape (..., pha_n_bands, n_bins); with pair_indices,
+        (..., n_pairs, n_bins, 1) and (..., n_pairs, n_bins)
+    """
+    _check_binning(binning, pair_indices)
+    if pha.is_floating_point():
+        pha = phase_bin_indices(pha, n_bins)
+    multiply_dtype = amp.dtype if policy is None else policy.multiply
+    accumulate_dtype = amp.dtype if policy is None else policy.accumulate
+    if pair_indices is not None:
+        amp_sums, counts = paired_comodulogram_sums(
+            pha, amp, pair_indices, n_bins, accumulate_dtype=accumulate_dtype
+        )
+        return amp_sums.unsqueeze(-1), counts
+    if binning == "scatter":
+        return comodulogram_sums(pha, amp, n_bins, accumulate_dtype=accumulate_dtype)
+
+    masks = phase_bin_masks(pha, n_bins, dtype=multiply_dtype)
+
+    # (..., pha, time, bins) x (..., amp, time) -> (..., pha, bins, amp)
+    amp_sums = _blocked_einsum(
+        "...ptb,...at->...pba", masks, amp.to(multiply_dtype), accumulate_dtype, policy
+    )
+    counts = masks.sum(dim=-2, dtype=accumulate_dtype)
+    return amp_sums, counts
+
+
+def _check_binning(binning: str, pair_indices: np.ndarray = None) -> None:
+    if binning not in ("scatter", "matmul"):
+        raise ValueError(
+            f"Unknown binning: {binning!r} (choose from ['scatter', 'matmul'])"
+        )
+    if binning == "matmul" and pair_indices is not None:
+        raise ValueError("Band pairs need binning='scatter'")
+
+
+def phase_bin_indices(pha: torch.Tensor, n_bins: int = 18) -> torch.Tensor:
+    """Phase-bin indices (uint8) with the shape of pha."""
+    bin_indices = ((pha + np.pi) * (n_bins / (2 * np.pi))).to(torch.uint8)
+    return bin_indices.clamp_(0, n_bins - 1)
+
+
+def phase_bin_masks(
+    pha: torch.Tensor, n_bins: int = 18, dtype: torch.dtype = torch.int64
+) -> torch.Tensor:
+    """One-hot phase bins with shape (..., pha_n_bands, seq_len, n_bins)."""
+    if pha.is_floating_point():
+        pha = phase_bin_indices(pha, n_bins)
+    if dtype == torch.int64:
+        return F.one_hot(pha.long(), n_bins)
+    # Scattered directly in the product dtype (no int64 one-hot intermediate)
+    masks = torch.zeros(*pha.shape, n_bins, dtype=dtype, device=pha.device)
+    return masks.scatter_(-1, pha.long().unsqueeze(-1), 1)
+
+
+def _blocked_einsum(
+    equation: str,
+    masks: torch.Tensor,
+    amp: torch.Tensor,
+    accumulate_dtype: torch.dtype,
+    policy: DtypePolicy = None,
+) -> torch.Tensor:
+    """
+    einsum contracting the time axis (masks: -2, amp: -1).
+
+    With a blocked policy, each block of policy.block_len samples is multiplied
+    in the (low-precision) product dtype and summed up in accumulate_dtype, so
+    that the rounding of the partial sums does not grow with seq_len.
+    """
+    if policy is None or not policy.is_blocked:
+        return torch.einsum(equation, masks, amp).to(accumulate_dtype)
+
+    seq_len = amp.shape[-1]
+    out = None
+    for i_start in range(0, seq_len, policy.block_len):
+        i_end = min(i_start + policy.block_len, seq_len)
+        partial = torch.einsum(
+            equation, masks[..., i_start:i_end, :], amp[..., i_start:i_end]
+        ).to(accumulate_dtype)
+        out = partial if out is None else out.add_(partial)
+    return out
+
+
+def surrogate_modulation_index(
+    pha: torch.Tensor,
+    amp: torch.Tensor,
+    n_perm: int,
+    n_bins: int = 18,
+    epsilon=1e-9,
+    generator: torch.Generator = None,
+    policy: DtypePolicy = None,
+    binning: str = "scatter",
+    pair_indices: np.ndarray = None,
+) -> torch.Tensor:
+    """
+    Computes the MI of n_perm circularly time-shifted amplitude surrogates.
+
+    The phase is digitised once and shared by all surrogates. The shifted
+    amplitudes are built by a single gather with a (n_perm, seq_len) index
+    tensor; with "scatter", they are accumulated by one scatter-add per
+    phase band for all shifts (see surrogate_comodulogram_sums), and with
+    "matmul", all surrogate histograms by one einsum.
+
+    Parameters
+    ----------
+    pha : torch.Tensor
+        Phase (or phase-bin indices) with shape
+        (batch_size, n_segments, pha_n_bands, seq_len)
+    amp : torch.Tensor
+        Amplitude with shape (batch_size, n_segments, amp_n_bands, seq_len)
+    n_perm : int
+        Number of surrogates
+    n_bins : int, optional
+        Number of phase bins, by default 18
+    generator : torch.Generator, optional
+        CPU random generator for the shifts
+    policy : DtypePolicy, optional
+        Product and accumulation dtypes; by default, those of amp
+    binning : str, optional
+        "scatter" (default) or "matmul"
+    pair_indices : np.ndarray, optional
+        (i_pha, i_amp) indices of the band pairs, with shape (n_pairs, 2)
+
+    Returns
+    -------
+    torch.Tensor
+        MI with shape (batch_size, n_segments, n_perm, pha_n_bands,
+        amp_n_bands), or (batch_size, n_segments, n_perm, n_pairs) with
+        pair_indices
+    """
+    _check_binning(binning, pair_indices)
+    seq_len = amp.shape[-1]
+    shifts = torch.randint(1, seq_len, (n_perm,), generator=generator)
+    multiply_dtype = amp.dtype if policy is None else policy.multiply
+    accumulate_dtype = amp.dtype if policy is None else policy.accumulate
+
+    if binning == "scatter":
+        if pha.is_floating_point():
+            pha = phase_bin_indices(pha, n_bins)
+        amp_sums, counts = surrogate_comodulogram_sums(
+            pha,
+            amp,
+            shifts,
+            n_bins,
+            accumulate_dtype=accumulate_dtype,
+            pair_indices=pair_indices,
+        )
+        if pair_indices is not None:
+            # Pairs as phase bands of a single amplitude band
+            MI = modulation_index_from_hist(
+                amp_sums.unsqueeze(-1), counts, epsilon=epsilon
+            ).squeeze(-1)
+        else:
+            MI = modulation_index_from_hist(amp_sums, counts, epsilon=epsilon)
+        return MI
+
+    shifts = shifts.to(amp.device)
+    # Same as amp.roll(shift, dims=-1) for every shift
+    indices = (torch.arange(seq_len, device=amp.device) - shifts[:, None]) % seq_len
+    amp_shifted = amp[..., indices]  # (..., amp, perm, time)
+
+    masks = phase_bin_masks(pha, n_bins, dtype=multiply_dtype)
+    amp_sums = _blocked_einsum(
+        "...ptb,...akt->...kpba",
+        masks,
+        amp_shifted.to(multiply_dtype),
+        accumulate_dtype,
+        policy,
+    )
+    counts = masks.sum(dim=-2, dtype=accumulate_dtype).unsqueeze(-3)
+
+    return modulation_index_from_hist(amp_sums, counts, epsilon=epsilon)
+
+
+def modulation_index_from_hist(
+    amp_sums: torch.Tensor, counts: torch.Tensor, epsilon=1e-9
+) -> torch.Tensor:
+    """MI with shape (..., pha_n_bands, amp_n_bands) from phase_binned_amplitude outputs."""
+    n_bins = counts.shape[-1]
+    amp_means = amp_sums / (counts.unsqueeze(-1) + epsilon)
+    amp_probs = amp_means / (amp_means.sum(dim=-2, keepdim=True) + epsilon)
+    return (
+        math.log(n_bins)
+        + (amp_probs * (amp_probs + epsilon).log()).sum(dim=-2)
+    ) / math.log(n_bins)
+
+
+# Classes
+class FFTPAC(nn.Module):
+    # Replaced by the handler's timer to profile the stages of forward()
+    stage_timer = StageTimer()
+    _filtered_pair_indices = None
+
+    def __init__(
+        self,
+        seq_len,
+        fs,
+        pha_start_hz=2,
+        pha_end_hz=20,
+        pha_n_bands=50,
+        amp_start_hz=60,
+        amp_end_hz=160,
+        amp_n_bands=30,
+        n_perm=None,
+        n_bins=18,
+        dtype_policy: DtypePolicy = None,
+        pad_sigmas: float = 4,
+        binning: str = "scatter",
+        band_pairs=None,
+        bands_pha: np.ndarray = None,
+        bands_amp: np.ndarray = None,
+        pha_decimation: Union[int, str] = 1,
+    ):
+        """
+        Bands are those of mngs.nn.PAC for the given start, end and number
+        of bands, unless explicit (n_bands, 2) edges are given as bands_pha
+        and bands_amp (e.g., FrequencyGrid.edges).
+
+        pha_decimation is the decimation factor of the phase path (1: off),
+        or "auto" for the largest factor the phase bands allow
+        (see calc_decimation).
+        """
+        super().__init__()
+
+        if n_perm is not None:
+            if not isinstance(n_perm, int):
+                raise ValueError("n_perm should be None or an integer.")
+
+        self.seq_len = seq_len
+        self.fs = fs
+        self.n_perm = n_perm
+        self.n_bins = n_bins
+        _check_binning(binning)
+        self.binning = binning
+        self.dtype_policy = dtype_policy or DtypePolicy.from_name("fp32")
+
+        # Keeps amplitude bands below the Nyquist frequency as mngs.nn.PAC does
+        factor = 0.8
+        amp_end_hz = int(min(fs / 2 / (1 + factor) - 1, amp_end_hz))
+
+        if bands_pha is None:
+            bands_pha = calc_bands_pha(pha_start_hz, pha_end_hz, pha_n_bands)
+        if bands_amp is None:
+            bands_amp = calc_bands_amp(amp_start_hz, amp_end_hz, amp_n_bands)
+        self.BANDS_PHA = np.asarray(bands_pha, dtype=np.float64)
+        self.BANDS_AMP = np.asarray(bands_amp, dtype=np.float64)
+        self.PHA_MIDS_HZ = self.BANDS_PHA.mean(-1)
+        self.AMP_MIDS_HZ = self.BANDS_AMP.mean(-1)
+
+        # Only the bands referenced by band_pairs are filtered; pair indices
+        # into the dense grid (pair_indices) and into the filtered bands
+        if band_pairs is None:
+            self.pair_indices = None
+            self.i_pha_filtered = np.arange(len(self.BANDS_PHA))
+            self.i_amp_filtered = np.arange(len(self.BANDS_AMP))
+        else:
+            _check_binning(binning, band_pairs)
+            self.pair_indices = as_pair_indices(
+                band_pairs, len(self.BANDS_PHA), len(self.BANDS_AMP)
+            )
+            self.i_pha_filtered, i_pha = np.unique(
+                self.pair_indices[:, 0], return_inverse=True
+            )
+            self.i_amp_filtered, i_amp = np.unique(
+                self.pair_indices[:, 1], return_inverse=True
+            )
+            self._filtered_pair_indices = np.c_[i_pha, i_amp]
+
+        bands_pha = self.BANDS_PHA[self.i_pha_filtered]
+        bands_amp = self.BANDS_AMP[self.i_amp_filtered]
+        if pha_decimation == "auto":
+            pha_decimation = calc_decimation(bands_pha, fs, seq_len)
+        self.pha_decimation = int(pha_decimation)
+
+        bands_all = np.vstack([bands_pha, bands_amp])
+        self.n_fft = calc_n_fft(
+            seq_len,
+            fs,
+            bands_all,
+            pad_sigmas=pad_sigmas,
+            multiple_of=self.pha_decimation,
+        )
+        kernel_dtype = str(self.dtype_policy.filter).replace("torch.", "")
+
+        def get_kernels(bands, fs, n_fft):
+            return filter_bank_cache.get_or_build(
+                make_key("fft", fs, n_fft, bands, kernel_dtype),
+                lambda: design_kernel_bank(bands, fs, n_fft, dtype=kernel_dtype),
+            )
+
+        if self.pha_decimation == 1:
+            kernels, self.cache_hit = get_kernels(bands_all, fs, self.n_fft)
+        else:
+            # Phase kernels on the first n_fft / D bins of the full-rate
+            # spectrum, which is the spectrum of the decimated signal
+            kernels_pha, is_hit_pha = get_kernels(
+                bands_pha, fs / self.pha_decimation, self.n_fft // self.pha_decimation
+            )
+            self.register_buffer("kernels_pha", torch.from_numpy(kernels_pha))
+            self.register_buffer(
+                "pha_carrier_bins",
+                torch.from_numpy(np.abs(kernels_pha).argmax(axis=-1)),
+            )
+            kernels, is_hit_amp = get_kernels(bands_amp, fs, self.n_fft)
+            self.cache_hit = is_hit_pha and is_hit_amp
+        self.register_buffer("kernels", torch.from_numpy(kernels))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """x.shape: (batch_size, n_segments, seq_len)"""
+        # Phase is binned at the filter precision; only indices are kept
+        pha, amp = self.filter(x, binned=True)
+
+        # Trims edges as mngs.nn.PAC does
+        edge_len = int(pha.shape[-1] // 8)
+        if edge_len:
+            pha = pha[..., edge_len:-edge_len]
+            amp = amp[..., edge_len:-edge_len]
+
+        with self.stage_timer.stage("binning"):
+            amp_sums, counts = phase_binned_amplitude(
+                pha,
+                amp,
+                n_bins=self.n_bins,
+                policy=self.dtype_policy,
+                binning=self.binning,
+                pair_indices=self._filtered_pair_indices,
+            )
+        with self.stage_timer.stage("modulation_index"):
+            # Per segment, (batch_size, n_segments, ...), as the other handlers
+            pac = modulation_index_from_hist(amp_sums, counts)
+            if self.pair_indices is not None:
+                pac = pac.squeeze(-1)
+
+        if self.n_perm is None:
+            return pac
+        with self.stage_timer.stage("surrogates"):
+            return self.to_z_using_surrogate(pha, amp, pac)
+
+    def filter(self, x: torch.Tensor, binned: bool = False):
+        """
+        Returns phase and amplitude with shape (..., n_bands, seq_len) of the
+        filtered bands (all bands, or those referenced by band_pairs).
+
+        Both are computed at the filter precision of the dtype policy; the
+        phase is returned as phase-bin indices when binned, and the amplitude
+        in the storage dtype.
+        """
+        seq_len = x.shape[-1]
+        policy = self.dtype_policy
+
+        # Complex half is not available on CPU
+        x = x.to(policy.filter)
+
+        n_pha = len(self.i_pha_filtered)
+        factor = self.pha_decimation
+
+        with self.stage_timer.stage("filter"):
+            X = torch.fft.rfft(x, n=self.n_fft)
+            if factor == 1:
+                Z = X.unsqueeze(-2) * self.kernels
+                z = torch.fft.ifft(Z, n=self.n_fft)[..., :seq_len]
+                z_pha, z_amp = z[..., :n_pha, :], z[..., n_pha:, :]
+            else:
+                # Truncating the spectrum decimates with an ideal anti-alias
+                # low-pass; each band is then shifted down by its carrier bin
+                # (complex demodulation), so that upsample_phase interpolates
+                # a slowly varying signal. One more sample is kept for the
+                # interpolation.
+                n_fft_pha = self.n_fft // factor
+                Z_pha = X[..., : n_fft_pha // 2 + 1].unsqueeze(-2) * self.kernels_pha
+                Z_pha = F.pad(Z_pha, (0, n_fft_pha - Z_pha.shape[-1]))
+                shifted = torch.remainder(
+                    torch.arange(n_fft_pha, device=x.device)
+                    + self.pha_carrier_bins[:, None],
+                    n_fft_pha,
+                )
+                Z_pha = Z_pha.gather(-1, shifted.expand(*Z_pha.shape[:-1], -1))
+                z_pha = torch.fft.ifft(Z_pha, n=n_fft_pha)
+                z_pha = z_pha[..., : -(-seq_len // factor) + 1]
+                Z_amp = X.unsqueeze(-2) * self.kernels
+                z_amp = torch.fft.ifft(Z_amp, n=self.n_fft)[..., :seq_len]
+
+        with self.stage_timer.stage("analytic"):
+            if factor == 1:
+                pha = z_pha.angle()
+                pha = (
+                    phase_bin_indices(pha, self.n_bins)
+                    if binned
+                    else pha.to(policy.storage)
+                )
+            else:
+                pha = upsample_phase(
+                    z_pha,
+                    factor,
+                    seq_len,
+                    self.pha_carrier_bins,
+                    self.n_fft,
+                    n_bins=self.n_bins if binned else None,
+                )
+                pha = pha if binned else pha.to(policy.storage)
+            amp = policy.store_amplitude(z_amp.abs())
+        return pha, amp
+
+    def to_z_using_surrogate(self, pha, amp, observed):
+        surrogates = surrogate_modulation_index(
+            pha,
+            amp,
+            self.n_perm,
+            n_bins=self.n_bins,
+            policy=self.dtype_policy,
+            binning=self.binning,
+            pair_indices=self._filtered_pair_indices,
+        )
+        # (batch_size, n_segments, n_perm, ...)
+        mm = surrogates.mean(dim=2)
+        ss = surrogates.std(dim=2) if self.n_perm > 1 else 0
+        return (observed - mm) / (ss + 1e-5)
+
+
+# EOF
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 11:02:37 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/_FilterBankCache.py
+
+"""
+Functionality:
+    - Provides a process-wide cache for filter banks (and models built on them)
+    - LRU eviction in memory; NumPy kernels are optionally stored on disk as
+      .npy, and dicts (e.g., precision calibrations) as .json
+Input:
+    - Hashable keys, e.g., (package, fs, seq_len, band edges, dtype)
+    - A function building the value on a cache miss
+Output:
+    - Cached value and whether the lookup was a hit
+Prerequisites:
+    - NumPy
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+import numpy as np
+
+
+class FilterBankCache:
+    def __init__(self, maxsize: int = 32, cache_dir: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        maxsize : int, optional
+            Maximum number of entries kept in memory, by default 32
+        cache_dir : str, optional
+            Directory for the on-disk store (NumPy arrays as .npy and
+            JSON-serialisable dicts as .json), by default None
+        """
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.n_hits = 0
+        self.n_misses = 0
+        self._store = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(
+        self, maxsize: Optional[int] = None, cache_dir: Optional[str] = None
+    ) -> None:
+        if maxsize is not None:
+            self.maxsize = maxsize
+            with self._lock:
+                self._evict()
+        if cache_dir is not None:
+            self.cache_dir = cache_dir
+
+    def get_or_build(
+        self, key: Hashable, build_fn: Callable[[], Any]
+    ) -> Tuple[Any, bool]:
+        """
+        Returns the cached value for key, building it on a miss.
+
+        Returns
+        -------
+        Tuple[Any, bool]
+            The value and whether it was found in memory or on disk
+        """
+        with self._lock:
+            if key in self._store:
+                self._store.move_to_end(key)
+                self.n_hits += 1
+                return self._store[key], True
+
+        value = self._load(key)
+        is_hit = value is not None
+        if not is_hit:
+            value = build_fn()
+            self._save(key, value)
+
+        with self._lock:
+            self._store[key] = value
+            self._evict()
+            if is_hit:
+                self.n_hits += 1
+            else:
+                self.n_misses += 1
+
+        return value, is_hit
+
+    def clear(self) -> None:
+        with self._lock:
+            self._store.clear()
+            self.n_hits = 0
+            self.n_misses = 0
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._store
+
+    def _evict(self) -> None:
+        while len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+
+    def _path(self, key: Hashable, ext: str = ".npy") -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}{ext}")
+
+    def _load(self, key: Hashable) -> Optional[Any]:
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        if os.path.exists(path):
+            return np.load(path)
+        path = self._path(key, ".json")
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return None
+
+    def _save(self, key: Hashable, value: Any) -> None:
+        if self.cache_dir is None:
+            return
+        if isinstance(value, np.ndarray):
+            ext, save_fn = ".npy", np.save
+        elif isinstance(value, dict):
+            ext, save_fn = ".json", _save_json
+        else:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Writes to a temporary file first not to leave partial files behind
+        path = self._path(key, ext)
+        tmp_path = f"{path}.{os.getpid()}.tmp{ext}"
+        save_fn(tmp_path, value)
+        os.replace(tmp_path, path)
+
+
+def _save_json(path: str, value: dict) -> None:
+    with open(path, "w") as f:
+        json.dump(value, f)
+
+
+def make_key(*parts) -> Tuple:
+    """Converts arrays and tensors in parts into hashable tuples."""
+    key = []
+    for part in parts:
+        if hasattr(part, "detach"):
+            part = part.detach().cpu().numpy()
+        if isinstance(part, np.ndarray):
+            part = tuple(np.round(part.astype(float), 6).ravel().tolist())
+        key.append(part)
+    return tuple(key)
+
+
+# Process-wide cache shared by all handlers
+filter_bank_cache = FilterBankCache()
+
+
+# EOF
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 20:41:33 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/_FrequencyGrid.py
+
+"""
+Functionality:
+    - Implements FrequencyGrid, the band edges of phase or amplitude bands
+      shared by every handler, so that packages are compared on identical
+      bands
+    - Spacings of the band centres
+        - linear: evenly spaced centres
+        - log: geometrically spaced centres
+        - constant_q: geometrically spaced centres whose bands tile the range
+          (edges at the geometric midpoints), unless q is given
+    - Band widths: width_hz (constant) or centre / q (constant relative
+      width); explicit edges are taken as they are
+    - The default grids (linear, q=2 for phase and q=4 for amplitude) are
+      the bands of mngs.nn.PAC (mid +/- mid / 4 and mid +/- mid / 8)
+Input:
+    - Grid specification: None, a spacing name, a dict of keyword arguments,
+      an (n_bands, 2) array of edges or a FrequencyGrid
+Output:
+    - FrequencyGrid (make_grids: the phase and amplitude grids of a handler)
+Prerequisites:
+    - NumPy
+"""
+
+from dataclasses import dataclass
+from typing import Union
+
+import numpy as np
+
+SPACINGS = ("linear", "log", "constant_q")
+
+# Relative widths of the mngs.nn.PAC bands (bandwidth = centre / q)
+DEFAULT_Q_PHA = 2.0
+DEFAULT_Q_AMP = 4.0
+
+
+@dataclass(frozen=True, eq=False)
+class FrequencyGrid:
+    edges: np.ndarray
+    spacing: str = "explicit"
+
+    def __post_init__(self):
+        edges = np.asarray(self.edges, dtype=np.float64).reshape(-1, 2)
+        if len(edges) == 0:
+            raise ValueError("A frequency grid needs at least one band")
+        if not ((0 < edges[:, 0]) & (edges[:, 0] < edges[:, 1])).all():
+            raise ValueError(
+                "Band edges should satisfy 0 < low_hz < high_hz for every band"
+            )
+        edges.setflags(write=False)
+        object.__setattr__(self, "edges", edges)
+
+    @classmethod
+    def create(
+        cls,
+        start_hz: float,
+        end_hz: float,
+        n_bands: int,
+        spacing: str = "linear",
+        q: float = None,
+        width_hz: float = None,
+    ) -> "FrequencyGrid":
+        """
+        Grid of n_bands centres from start_hz to end_hz.
+
+        Parameters
+        ----------
+        start_hz, end_hz : float
+            Centre frequencies of the first and the last bands
+        n_bands : int
+            Number of bands
+        spacing : str, optional
+            "linear", "log" or "constant_q", by default "linear"
+        q : float, optional
+            Centre / bandwidth; for linear and log, either q or width_hz is
+            required, and constant_q tiles the range without it
+        width_hz : float, optional
+            Constant bandwidth in Hz (linear and log only)
+        """
+        if spacing not in SPACINGS:
+            raise ValueError(
+                f"Unknown spacing: {spacing!r} (choose from {list(SPACINGS)})"
+            )
+        if (q is None) == (width_hz is None) and spacing != "constant_q":
+            raise ValueError(f"{spacing} spacing needs either q or width_hz")
+        if width_hz is not None and spacing == "constant_q":
+            raise ValueError("constant_q spacing takes q, not width_hz")
+
+        if spacing == "linear":
+            mids = np.linspace(start_hz, end_hz, n_bands)
+        else:
+            mids = np.geomspace(start_hz, end_hz, n_bands)
+
+        if spacing == "constant_q" and q is None:
+            if n_bands < 2:
+                raise ValueError("constant_q spacing without q needs n_bands >= 2")
+            # Edges at the geometric midpoints between neighbouring centres
+            span = max(start_hz, end_hz) / min(start_hz, end_hz)
+            ratio = np.sqrt(span ** (1 / (n_bands - 1)))
+            edges = np.c_[mids / ratio, mids * ratio]
+        elif width_hz is not None:
+            edges = np.c_[mids - width_hz / 2, mids + width_hz / 2]
+        else:
+            edges = np.c_[mids - mids / (2 * q), mids + mids / (2 * q)]
+        return cls(edges, spacing=spacing)
+
+    @classmethod
+    def from_spec(
+        cls,
+        spec: Union[None, str, dict, np.ndarray, list, "FrequencyGrid"],
+        start_hz: float,
+        end_hz: float,
+        n_bands: int,
+        q: float,
+    ) -> "FrequencyGrid":
+        """
+        FrequencyGrid from a handler parameter.
+
+        None and spacing names use start_hz, end_hz, n_bands and q; a dict
+        overrides them (e.g., {"spacing": "log", "q": 3}) or gives
+        {"edges": [[low_hz, high_hz], ...]}; arrays are explicit edges.
+        """
+        if isinstance(spec, cls):
+            return spec
+        if spec is None or isinstance(spec, str):
+            spec = {"spacing": spec or "linear"}
+        if not isinstance(spec, dict):
+            return cls(spec)
+        if "edges" in spec:
+            return cls(spec["edges"])
+
+        kwargs = dict(start_hz=start_hz, end_hz=end_hz, n_bands=n_bands)
+        if spec.get("spacing", "linear") != "constant_q" and "width_hz" not in spec:
+            kwargs["q"] = q
+        kwargs.update(spec)
+        return cls.create(**kwargs)
+
+    @property
+    def n_bands(self) -> int:
+        return len(self.edges)
+
+    @property
+    def mids_hz(self) -> np.ndarray:
+        return self.edges.mean(axis=-1)
+
+    def __len__(self) -> int:
+        return self.n_bands
+
+    def check_nyquist(self, fs: float) -> None:
+        if self.edges[:, 1].max() >= fs / 2:
+            raise ValueError(
+                f"Band edges up to {self.edges[:, 1].max():.1f} Hz exceed the "
+                f"Nyquist frequency ({fs / 2:.1f} Hz)"
+            )
+
+    def __repr__(self) -> str:
+        return (
+            f"FrequencyGrid({self.spacing}, n_bands={self.n_bands}, "
+            f"{self.edges[0, 0]:.2f}-{self.edges[-1, 1]:.2f} Hz)"
+        )
+
+
+def make_grids(
+    fs: float,
+    pha_min_hz: float,
+    pha_max_hz: float,
+    pha_n_bands: int,
+    amp_min_hz: float,
+    amp_max_hz: float,
+    amp_n_bands: int,
+    pha_grid=None,
+    amp_grid=None,
+):
+    """
+    Phase and amplitude grids of the handlers (see FrequencyGrid.from_spec).
+
+    As in mngs.nn.PAC, amp_max_hz is capped at fs / 3.6 - 1, so that the
+    amplitude bands stay below the Nyquist frequency.
+
+    Returns
+    -------
+    Tuple[FrequencyGrid, FrequencyGrid]
+        Phase and amplitude grids
+    """
+    amp_max_hz = int(min(fs / 2 / (1 + 0.8) - 1, amp_max_hz))
+    grid_pha = FrequencyGrid.from_spec(
+        pha_grid, pha_min_hz, pha_max_hz, pha_n_bands, q=DEFAULT_Q_PHA
+    )
+    grid_amp = FrequencyGrid.from_spec(
+        amp_grid, amp_min_hz, amp_max_hz, amp_n_bands, q=DEFAULT_Q_AMP
+    )
+    for grid in (grid_pha, grid_amp):
+        grid.check_nyquist(fs)
+    return grid_pha, grid_amp
+
+
+# EOF
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 19:48:27 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/_FusedModulationIndex.py
+
+"""
+Functionality:
+    - Fused comodulogram: phase is digitised once per phase band, and one
+      scatter-add over a flattened (sample, phase bin) index accumulates the
+      amplitudes of all amplitude bands at once
+    - Work grows as (pha_n_bands + amp_n_bands) x seq_len reads plus
+      pha_n_bands x amp_n_bands x seq_len additions; no (pha, amp, time, bin)
+      product or (pha, time, bin) one-hot masks are materialised
+    - Time-shift surrogates gather the amplitude rows of all shifts once and
+      scatter-add them together, one call per phase band for all shifts;
+      scatter rows and counts are built once
+    - Selected band pairs only: each phase band is scatter-added with the
+      amplitude bands it is paired with
+    - Implements FusedModulationIndex, a drop-in replacement for
+      mngs.nn.ModulationIndex
+Input:
+    - Phase-bin indices and amplitudes
+Output:
+    - Phase-binned amplitude sums and counts, or modulation indices
+Prerequisites:
+    - PyTorch
+    - NumPy
+"""
+
+import math
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+# Functions
+def comodulogram_sums(
+    bin_indices: torch.Tensor,
+    amp: torch.Tensor,
+    n_bins: int = 18,
+    accumulate_dtype: torch.dtype = None,
+):
+    """
+    Phase-binned amplitude sums of every (phase, amplitude) band pair.
+
+    Parameters
+    ----------
+    bin_indices : torch.Tensor
+        Integer phase-bin indices with shape (..., pha_n_bands, seq_len)
+    amp : torch.Tensor
+        Amplitude with shape (..., amp_n_bands, seq_len)
+    n_bins : int, optional
+        Number of phase bins, by default 18
+    accumulate_dtype : torch.dtype, optional
+        dtype of the sums; by default, that of amp
+
+    Returns
+    -------
+    Tuple[torch.Tensor, torch.Tensor]
+        amp_sums with shape (..., pha_n_bands, n_bins, amp_n_bands) and
+        counts with shape (..., pha_n_bands, n_bins)
+    """
+    *lead_shape, n_pha, seq_len = bin_indices.shape
+    accumulate_dtype = accumulate_dtype or amp.dtype
+    rows, amp_rows = _scatter_rows(bin_indices, amp, n_bins, accumulate_dtype)
+    amp_sums = _dense_sums(rows, amp_rows, amp_rows.shape[0] // seq_len, n_bins)
+    amp_sums = amp_sums.reshape(*lead_shape, n_pha, n_bins, amp_sums.shape[-1])
+    counts = phase_bin_counts(bin_indices, n_bins, dtype=accumulate_dtype)
+    return amp_sums, counts
+
+
+def paired_comodulogram_sums(
+    bin_indices: torch.Tensor,
+    amp: torch.Tensor,
+    pair_indices: np.ndarray,
+    n_bins: int = 18,
+    accumulate_dtype: torch.dtype = None,
+):
+    """
+    comodulogram_sums of the selected (phase, amplitude) band pairs only.
+
+    Each phase band is scatter-added once, together with the amplitude bands
+    it is paired with, so the work grows with the number of pairs.
+
+    Parameters
+    ----------
+    bin_indices : torch.Tensor
+        Integer phase-bin indices with shape (..., pha_n_bands, seq_len)
+    amp : torch.Tensor
+        Amplitude with shape (..., amp_n_bands, seq_len)
+    pair_indices : np.ndarray
+        (i_pha, i_amp) indices into the bands of bin_indices and amp with
+        shape (n_pairs, 2)
+
+    Returns
+    -------
+    Tuple[torch.Tensor, torch.Tensor]
+        amp_sums and counts, both with shape (..., n_pairs, n_bins)
+    """
+    *lead_shape, _, seq_len = bin_indices.shape
+    accumulate_dtype = accumulate_dtype or amp.dtype
+    rows, amp_rows = _scatter_rows(bin_indices, amp, n_bins, accumulate_dtype)
+    pair_indices = np.asarray(pair_indices)
+    amp_sums = _paired_sums(
+        rows, amp_rows, pair_indices, amp_rows.shape[0] // seq_len, n_bins
+    )
+    amp_sums = amp_sums.reshape(*lead_shape, len(pair_indices), n_bins)
+    counts = phase_bin_counts(bin_indices, n_bins, dtype=accumulate_dtype)
+    return amp_sums, counts[..., pair_indices[:, 0], :]
+
+
+def _scatter_rows(bin_indices, amp, n_bins, accumulate_dtype):
+    """
+    Scatter rows of (sample, bin) per phase band with shape
+    (pha_n_bands, n_samples * seq_len) and amplitudes as
+    (n_samples * seq_len, amp_n_bands) rows.
+    """
+    n_pha, seq_len = bin_indices.shape[-2:]
+    n_amp = amp.shape[-2]
+    bin_indices = bin_indices.reshape(-1, n_pha, seq_len)
+    n_samples = len(bin_indices)
+
+    offsets = torch.arange(n_samples, device=amp.device).view(-1, 1, 1) * n_bins
+    rows = (bin_indices.long() + offsets).transpose(0, 1).reshape(n_pha, -1)
+    amp_rows = (
+        amp.reshape(n_samples, n_amp, seq_len)
+        .transpose(-1, -2)
+        .to(accumulate_dtype)
+        .contiguous()
+        .view(-1, n_amp)
+    )
+    return rows, amp_rows
+
+
+def _dense_sums(rows, amp_rows, n_samples, n_bins):
+    """Sums of _scatter_rows with shape (n_samples, pha_n_bands, n_bins, amp_n_bands)."""
+    n_pha = len(rows)
+    n_amp = amp_rows.shape[-1]
+    # One scatter-add per phase band, each accumulating all amplitude bands
+    amp_sums = amp_rows.new_zeros(n_pha, n_samples * n_bins, n_amp)
+    for i_pha in range(n_pha):
+        amp_sums[i_pha].index_add_(0, rows[i_pha], amp_rows)
+    return amp_sums.view(n_pha, n_samples, n_bins, n_amp).transpose(0, 1)
+
+
+def _paired_sums(rows, amp_rows, pair_indices, n_samples, n_bins):
+    """Sums of _scatter_rows for pair_indices with shape (n_samples, n_pairs, n_bins)."""
+    amp_sums = amp_rows.new_empty(n_samples * n_bins, len(pair_indices))
+    for i_pha in np.unique(pair_indices[:, 0]):
+        i_pairs = np.flatnonzero(pair_indices[:, 0] == i_pha)
+        sums = amp_sums.new_zeros(n_samples * n_bins, len(i_pairs))
+        sums.index_add_(0, rows[i_pha], amp_rows[:, pair_indices[i_pairs, 1]])
+        amp_sums[:, i_pairs] = sums
+    return amp_sums.view(n_samples, n_bins, -1).transpose(-1, -2)
+
+
+def phase_bin_counts(
+    bin_indices: torch.Tensor, n_bins: int = 18, dtype: torch.dtype = torch.int64
+) -> torch.Tensor:
+    """Samples per phase bin with shape (..., pha_n_bands, n_bins), by one bincount."""
+    *lead_shape, seq_len = bin_indices.shape
+    bin_indices = bin_indices.reshape(-1, seq_len)
+    offsets = torch.arange(len(bin_indices), device=bin_indices.device)[:, None]
+    counts = torch.bincount(
+        (bin_indices.long() + offsets * n_bins).ravel(),
+        minlength=len(bin_indices) * n_bins,
+    )
+    return counts.view(*lead_shape, n_bins).to(dtype)
+
+
+def surrogate_comodulogram_sums(
+    bin_indices: torch.Tensor,
+    amp: torch.Tensor,
+    shifts: torch.Tensor,
+    n_bins: int = 18,
+    accumulate_dtype: torch.dtype = None,
+    pair_indices: np.ndarray = None,
+):
+    """
+    comodulogram_sums (or paired_comodulogram_sums with pair_indices) of amp
+    circularly shifted by each of shifts.
+
+    The scatter rows and counts are built once. The amplitude rows of all
+    shifts are gathered once, side by side, so that every phase band is
+    scatter-added once for all shifts (no loop over shifts); the work is
+    that of one comodulogram with n_perm x amp_n_bands amplitude bands.
+
+    Returns
+    -------
+    Tuple[torch.Tensor, torch.Tensor]
+        amp_sums with shape (..., n_perm, pha_n_bands, n_bins, amp_n_bands)
+        and counts with shape (..., 1, pha_n_bands, n_bins); with
+        pair_indices, (..., n_perm, n_pairs, n_bins) and (..., 1, n_pairs, n_bins)
+    """
+    *lead_shape, n_pha, seq_len = bin_indices.shape
+    accumulate_dtype = accumulate_dtype or amp.dtype
+    rows, amp_rows = _scatter_rows(bin_indices, amp, n_bins, accumulate_dtype)
+    n_samples = amp_rows.shape[0] // seq_len
+    n_amp = amp_rows.shape[-1]
+    n_perm = len(shifts)
+
+    # Amplitude rows of all shifts, gathered once as (n_samples * seq_len,
+    # n_perm * amp_n_bands) rows (amp rolled by k is amp[(t - k) % seq_len]),
+    # so that each phase band is scatter-added once for all shifts
+    i_time = torch.arange(seq_len, device=amp_rows.device)
+    i_shifted = (i_time.view(-1, 1) - shifts.to(amp_rows.device)) % seq_len
+    i_shifted = i_shifted + seq_len * torch.arange(
+        n_samples, device=amp_rows.device
+    ).view(-1, 1, 1)
+    amp_rows = amp_rows[i_shifted.view(-1, n_perm)].view(-1, n_perm * n_amp)
+
+    if pair_indices is None:
+        amp_sums = _dense_sums(rows, amp_rows, n_samples, n_bins)
+        amp_sums = amp_sums.reshape(n_samples, n_pha, n_bins, n_perm, n_amp)
+        amp_sums = amp_sums.permute(0, 3, 1, 2, 4).reshape(
+            *lead_shape, n_perm, n_pha, n_bins, n_amp
+        )
+    else:
+        pair_indices = np.asarray(pair_indices)
+        n_pairs = len(pair_indices)
+        # (i_pha, i_perm * amp_n_bands + i_amp) pairs, shift by shift
+        pair_offsets = np.stack(
+            [np.zeros(n_perm, dtype=int), np.arange(n_perm) * n_amp], axis=-1
+        )
+        pair_indices_shifted = (pair_indices + pair_offsets[:, None]).reshape(-1, 2)
+        amp_sums = _paired_sums(
+            rows, amp_rows, pair_indices_shifted, n_samples, n_bins
+        )
+        amp_sums = amp_sums.reshape(*lead_shape, n_perm, n_pairs, n_bins)
+
+    counts = phase_bin_counts(bin_indices, n_bins, dtype=accumulate_dtype)
+    if pair_indices is not None:
+        counts = counts[..., pair_indices[:, 0], :]
+    return amp_sums, counts.unsqueeze(-3)
+
+
+# Classes
+class FusedModulationIndex(nn.Module):
+    """
+    mngs.nn.ModulationIndex computed by comodulogram_sums.
+
+    Takes the same inputs, returns the same MI (up to the summation order)
+    and may replace the modulation_index submodule of mngs.nn.PAC, which is
+    also used for its surrogates. Sums are accumulated in float32 even with
+    fp16, so that long segments do not overflow.
+    """
+
+    def __init__(self, n_bins=18, fp16=False, amp_prob=False):
+        super().__init__()
+        self.n_bins = n_bins
+        self.fp16 = fp16
+        self.register_buffer(
+            "pha_bin_cutoffs", torch.linspace(-np.pi, np.pi, n_bins + 1)
+        )
+        self.amp_prob = amp_prob
+
+    @property
+    def pha_bin_centers(self):
+        return (
+            ((self.pha_bin_cutoffs[1:] + self.pha_bin_cutoffs[:-1]) / 2)
+            .detach()
+            .cpu()
+            .numpy()
+        )
+
+    def forward(self, pha, amp, epsilon=1e-9):
+        """
+        Parameters
+        ----------
+        pha : torch.Tensor
+            Phase with shape (batch_size, n_chs, pha_n_bands, n_segments, seq_len)
+        amp : torch.Tensor
+            Amplitude with shape (batch_size, n_chs, amp_n_bands, n_segments, seq_len)
+
+        Returns
+        -------
+        torch.Tensor
+            MI with shape (batch_size, n_chs, pha_n_bands, amp_n_bands), or
+            amplitude probabilities with shape
+            (batch_size, n_chs, pha_n_bands, amp_n_bands, n_segments, 1, n_bins)
+            when amp_prob
+        """
+        assert pha.ndim == amp.ndim == 5
+        dtype = torch.float16 if self.fp16 else torch.float32
+
+        # Digitised as mngs does, at the input precision
+        cutoffs = self.pha_bin_cutoffs.to(pha.device, dtype)
+        bin_indices = (
+            torch.bucketize(pha.to(dtype), cutoffs, right=False) - 1
+        ).clamp(0, self.n_bins - 1)
+
+        # (batch, chs, freqs, segments, time) -> (batch, chs, segments, freqs, time)
+        amp_sums, counts = comodulogram_sums(
+            bin_indices.transpose(2, 3),
+            amp.to(dtype).transpose(2, 3),
+            n_bins=self.n_bins,
+            accumulate_dtype=torch.float32,
+        )
+        # (batch, chs, segments, pha, bins, amp)
+        amp_means = amp_sums / (counts.unsqueeze(-1) + epsilon)
+        amp_probs = amp_means / (amp_means.sum(dim=-2, keepdim=True) + epsilon)
+
+        if self.amp_prob:
+            # Layout of mngs.nn.ModulationIndex
+            return amp_probs.permute(0, 1, 3, 5, 2, 4).unsqueeze(-2).to(dtype).cpu()
+
+        MI = (
+            math.log(self.n_bins + epsilon)
+            + (amp_probs * (amp_probs + epsilon).log()).sum(dim=-2)
+        ) / math.log(self.n_bins)
+
+        # Takes mean along the n_segments dimension
+        MI = MI.mean(dim=2).to(dtype)
+
+        if MI.isnan().any():
+            warnings.warn("NaN values detected in Modulation Index calculation.")
+
+        return MI
+
+
+# EOF
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 19:12:40 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/_PACAccuracy.py
+
+"""
+Functionality:
+    - Compares PAC values with a reference (e.g., the float64 calculation)
+    - Differences (RMS of absolute / relative differences, max absolute
+      difference) and correlations (Pearson, Spearman, Kendall), unrounded
+    - Checks the metrics against a tolerance such as
+      {"abs_diff_rms": 1e-3} or {"pearson_r": 0.999}
+Input:
+    - PAC values and reference PAC values with the same shape
+Output:
+    - Dictionaries of metrics
+Prerequisites:
+    - NumPy
+    - SciPy
+"""
+
+from typing import Dict
+
+import numpy as np
+import scipy.stats
+
+# Upper bounds
+DIFFERENCE_METRICS = ("abs_diff_rms", "rel_diff_percent", "max_abs_diff")
+# Lower bounds
+CORRELATION_METRICS = ("pearson_r", "spearman_rho", "kendall_tau")
+
+
+def pac_differences(pac: np.ndarray, pac_ref: np.ndarray) -> Dict[str, float]:
+    """RMS of absolute and relative differences (in %) and the max absolute difference."""
+    pac, pac_ref = _as_float64(pac), _as_float64(pac_ref)
+    abs_diff = np.abs(pac - pac_ref)
+    rel_diff = abs_diff / (np.abs(pac_ref) + np.finfo(float).eps)
+    return {
+        "abs_diff_rms": float(np.sqrt(np.mean(abs_diff**2))),
+        "rel_diff_percent": float(100 * np.sqrt(np.mean(rel_diff**2))),
+        "max_abs_diff": float(abs_diff.max()),
+    }
+
+
+def pac_correlations(pac: np.ndarray, pac_ref: np.ndarray) -> Dict[str, float]:
+    """Pearson, Spearman and Kendall correlations of the flattened PAC values."""
+    pac, pac_ref = _as_float64(pac).ravel(), _as_float64(pac_ref).ravel()
+    return {
+        "pearson_r": float(np.corrcoef(pac, pac_ref)[0, 1]),
+        "spearman_rho": float(scipy.stats.spearmanr(pac, pac_ref)[0]),
+        "kendall_tau": float(scipy.stats.kendalltau(pac, pac_ref)[0]),
+    }
+
+
+def check_tolerance(tolerance: Dict[str, float]) -> None:
+    unknown = set(tolerance) - set(DIFFERENCE_METRICS + CORRELATION_METRICS)
+    if unknown:
+        raise ValueError(
+            f"Unknown metrics in the tolerance: {sorted(unknown)} "
+            f"(choose from {DIFFERENCE_METRICS + CORRELATION_METRICS})"
+        )
+
+
+def meets_tolerance(metrics: Dict[str, float], tolerance: Dict[str, float]) -> bool:
+    """Whether differences are below and correlations above their bounds."""
+    for name, bound in tolerance.items():
+        value = metrics[name]
+        if np.isnan(value):
+            return False
+        if name in DIFFERENCE_METRICS and not value < bound:
+            return False
+        if name in CORRELATION_METRICS and not value > bound:
+            return False
+    return True
+
+
+def _as_float64(xx) -> np.ndarray:
+    if hasattr(xx, "detach"):
+        xx = xx.detach().cpu().numpy()
+    return np.asarray(xx, dtype=np.float64)
+
+
+# EOF
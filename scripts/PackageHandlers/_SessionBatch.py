@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 22:06:41 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/_SessionBatch.py
+
+"""
+Functionality:
+    - Implements SessionBatch, PAC of many recordings (e.g., subjects and
+      sessions) with varying lengths and sampling rates
+    - Groups recordings into buckets of equal (fs, seq_len), optionally after
+      padding seq_len up to a multiple of pad_multiple, and stacks each
+      bucket into one batch for the chunked path of calc_pac
+    - Keeps one handler per bucket across calls, so that handler (and
+      filter bank) construction is amortised over sessions
+Input:
+    - Recordings with shape (n_chs, n_segments, seq_len), as torch.Tensor or
+      np.ndarray, and their sampling rates
+Output:
+    - PAC values per recording, in the original order
+Prerequisites:
+    - PyTorch
+    - NumPy
+    - MNGS package
+"""
+
+import inspect
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple, Type, Union
+
+import mngs
+import numpy as np
+import torch
+import torch.nn.functional as F
+from scripts.PackageHandlers._BaseHandler import BaseHandler
+
+PAD_MODES = ("constant", "reflect")
+
+
+class SessionBatch:
+    def __init__(
+        self,
+        handler_cls: Type[BaseHandler],
+        pad_multiple: int = None,
+        pad_mode: str = "reflect",
+        batch_size: int = None,
+        **handler_kwargs,
+    ):
+        """
+        Parameters
+        ----------
+        handler_cls : Type[BaseHandler]
+            FFTHandler, MNGSHandler or TensorpacHandler
+        pad_multiple : int, optional
+            Pads every recording up to a multiple of pad_multiple samples, so
+            that nearby lengths share a bucket; by default, only recordings
+            of exactly equal length do. Padded samples change PAC slightly
+            (they are filtered and binned like the others).
+        pad_mode : str, optional
+            "reflect" (by default, continues the signal without an edge;
+            repeated for pads of seq_len or more) or "constant" (zeros)
+        batch_size : int, optional
+            Maximum number of recordings stacked per calc_pac call; by
+            default, a whole bucket. Within a call, chunk_size still bounds
+            the working set.
+        **handler_kwargs
+            Arguments of handler_cls; fs is the default sampling rate of
+            calc_pac, and ts defaults to a new mngs.gen.TimeStamper. Other
+            keys (e.g., batch_size, t_sec or seq_len of a PARAMS condition)
+            are ignored, as in init_model.
+
+        Example
+        -------
+        >>> batch = SessionBatch(FFTHandler, pad_multiple=1024, **params)
+        >>> xpacs = batch.calc_pac(recordings, fs=512)  # one PAC per recording
+        """
+        if pad_mode not in PAD_MODES:
+            raise ValueError(
+                f"Unknown pad_mode: {pad_mode!r} (choose from {list(PAD_MODES)})"
+            )
+        self.handler_cls = handler_cls
+        self.pad_multiple = pad_multiple
+        self.pad_mode = pad_mode
+        self.batch_size = batch_size
+        handler_kwargs.setdefault("ts", mngs.gen.TimeStamper())
+        # seq_len is set per bucket
+        arg_names = set(inspect.signature(handler_cls).parameters) - {"seq_len"}
+        self.handler_kwargs = {
+            key: value for key, value in handler_kwargs.items() if key in arg_names
+        }
+        # One handler per (fs, bucket_len), kept across calc_pac calls
+        self.handlers: Dict[Tuple[float, int], BaseHandler] = {}
+
+    def calc_pac(
+        self,
+        recordings: Sequence[Union[torch.Tensor, np.ndarray]],
+        fs: Union[float, Sequence[float]] = None,
+    ) -> List[Union[torch.Tensor, np.ndarray]]:
+        """
+        PAC of every recording, bucket by bucket.
+
+        Parameters
+        ----------
+        recordings : Sequence[torch.Tensor or np.ndarray]
+            Recordings with shape (n_chs, n_segments, seq_len); n_chs,
+            n_segments and seq_len may differ between recordings
+        fs : float or Sequence[float], optional
+            Sampling rate, common or per recording; by default, that of
+            handler_kwargs
+
+        Returns
+        -------
+        List[torch.Tensor or np.ndarray]
+            calc_pac result of each recording without the batch dimension
+            (e.g., (n_chs, n_segments, pha_n_bands, amp_n_bands)), in the given
+            order
+        """
+        fs = self.handler_kwargs.get("fs") if fs is None else fs
+        if fs is None:
+            raise ValueError("fs is required, either here or as a handler argument")
+        fs_list = list(fs) if np.ndim(fs) else [fs] * len(recordings)
+        if len(fs_list) != len(recordings):
+            raise ValueError(
+                f"Got {len(fs_list)} sampling rates for {len(recordings)} recordings"
+            )
+
+        xpacs = [None] * len(recordings)
+        for (fs_bucket, bucket_len), indices in self.buckets(
+            recordings, fs_list
+        ).items():
+            handler = self.get_handler(fs_bucket, bucket_len)
+            for batch_indices in self._batches(recordings, indices):
+                xx = self._stack(
+                    [recordings[ii] for ii in batch_indices], bucket_len
+                )
+                xpac = handler.calc_pac(xx)
+                for ii, xpac_ii in zip(batch_indices, xpac):
+                    xpacs[ii] = xpac_ii
+        return xpacs
+
+    def buckets(
+        self,
+        recordings: Sequence[Union[torch.Tensor, np.ndarray]],
+        fs_list: Sequence[float],
+    ) -> Dict[Tuple[float, int], List[int]]:
+        """Indices of the recordings per (fs, bucket_len), in order of appearance."""
+        buckets = defaultdict(list)
+        for ii, (xx, fs) in enumerate(zip(recordings, fs_list)):
+            if xx.ndim != 3:
+                raise ValueError(
+                    f"Recording {ii} has shape {tuple(xx.shape)}; "
+                    "expected (n_chs, n_segments, seq_len)"
+                )
+            buckets[(fs, self.bucket_len(xx.shape[-1]))].append(ii)
+        return dict(buckets)
+
+    def bucket_len(self, seq_len: int) -> int:
+        if not self.pad_multiple:
+            return seq_len
+        return -(-seq_len // self.pad_multiple) * self.pad_multiple
+
+    def get_handler(self, fs: float, seq_len: int) -> BaseHandler:
+        """Handler for (fs, seq_len), built on first use."""
+        key = (fs, seq_len)
+        if key not in self.handlers:
+            kwargs = {**self.handler_kwargs, "fs": fs}
+            self.handlers[key] = self.handler_cls(seq_len=seq_len, **kwargs)
+        return self.handlers[key]
+
+    def _batches(self, recordings, indices: List[int]) -> List[List[int]]:
+        """Splits a bucket into stackable batches (equal n_chs and n_segments)."""
+        groups = defaultdict(list)
+        for ii in indices:
+            groups[tuple(recordings[ii].shape[:-1])].append(ii)
+        step = self.batch_size or len(indices)
+        return [
+            group[i_start : i_start + step]
+            for group in groups.values()
+            for i_start in range(0, len(group), step)
+        ]
+
+    def _stack(self, recordings, bucket_len: int):
+        """
+        Recordings padded to bucket_len, stacked along a new batch dimension;
+        all are converted to the type (and dtype and device) of the first.
+        """
+        first = recordings[0]
+        padded = []
+        for xx in recordings:
+            if torch.is_tensor(first) and not torch.is_tensor(xx):
+                xx = torch.from_numpy(np.asarray(xx)).to(first.device, first.dtype)
+            elif not torch.is_tensor(first) and torch.is_tensor(xx):
+                xx = xx.detach().cpu().numpy().astype(first.dtype, copy=False)
+            n_pad = bucket_len - xx.shape[-1]
+            if n_pad and torch.is_tensor(xx):
+                xx = self._pad_tensor(xx, n_pad)
+            elif n_pad:
+                # np.pad reflects repeatedly when n_pad >= seq_len
+                mode = self.pad_mode if xx.shape[-1] > 1 else "constant"
+                xx = np.pad(xx, [(0, 0)] * (xx.ndim - 1) + [(0, n_pad)], mode=mode)
+            padded.append(xx)
+        if torch.is_tensor(first):
+            return torch.stack(padded)
+        return np.stack(padded)
+
+    def _pad_tensor(self, xx: torch.Tensor, n_pad: int) -> torch.Tensor:
+        """Pads the last dimension of xx by n_pad samples as np.pad would."""
+        lead_shape = xx.shape[:-1]
+        # Reflection needs a (batch, channel, time) layout
+        xx = xx.reshape(-1, 1, xx.shape[-1])
+        if self.pad_mode == "constant" or xx.shape[-1] == 1:
+            xx = F.pad(xx, (0, n_pad))
+        else:
+            # F.pad reflects less than seq_len samples at a time
+            while n_pad:
+                n_step = min(n_pad, xx.shape[-1] - 1)
+                xx = F.pad(xx, (0, n_step), mode="reflect")
+                n_pad -= n_step
+        return xx.reshape(*lead_shape, -1)
+
+
+# EOF
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 16:32:55 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/_StageTimer.py
+
+"""
+Functionality:
+    - Implements StageTimer, opt-in named timers for the stages of calc_pac
+      (e.g., filtering, analytic signal, phase binning, MI, surrogates)
+    - Nested stages are recorded as "outer.inner"
+    - When disabled, stage() returns a shared no-op context manager
+Input:
+    - Stage names
+Output:
+    - Accumulated seconds per stage
+Prerequisites:
+    - None
+"""
+
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional
+
+_NULL_CONTEXT = nullcontext()
+
+
+class StageTimer:
+    def __init__(self, enabled: bool = False, sync: Optional[Callable] = None):
+        """
+        Parameters
+        ----------
+        enabled : bool, optional
+            Whether to record the stages, by default False
+        sync : Callable, optional
+            Called at stage boundaries (e.g., torch.cuda.synchronize)
+        """
+        self.enabled = enabled
+        self.sync = sync
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals_ns = defaultdict(int)
+
+    def stage(self, name: str):
+        """Context manager timing a stage; a no-op when disabled."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Stage(self, name)
+
+    def start(self, name: str) -> None:
+        """Starts a stage, e.g., from a forward pre-hook."""
+        stack = self._stack
+        if self.sync is not None:
+            self.sync()
+        stack.append((name, time.perf_counter_ns()))
+
+    def stop(self) -> None:
+        """Stops the innermost stage, e.g., from a forward hook."""
+        stack = self._stack
+        if self.sync is not None:
+            self.sync()
+        t_end = time.perf_counter_ns()
+        full_name = ".".join(nn for nn, _ in stack)
+        _, t_start = stack.pop()
+        with self._lock:
+            self._totals_ns[full_name] += t_end - t_start
+
+    @property
+    def totals_sec(self) -> Dict[str, float]:
+        """Seconds per stage, summed over calls (and threads)."""
+        with self._lock:
+            return {name: tt * 1e-9 for name, tt in self._totals_ns.items()}
+
+    def to_dict(self, n_calls: int = 1) -> Dict[str, float]:
+        """Mean seconds per calc_pac call, e.g., for stats.csv."""
+        return {
+            f"stage_{name}_sec": total_sec / max(n_calls, 1)
+            for name, total_sec in self.totals_sec.items()
+        }
+
+    @property
+    def _stack(self) -> list:
+        # Per thread, as TensorpacHandler may calculate in a thread pool
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+
+class _Stage:
+    __slots__ = ("timer", "name")
+
+    def __init__(self, timer: StageTimer, name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.timer.start(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.stop()
+        return False
+
+
+# EOF
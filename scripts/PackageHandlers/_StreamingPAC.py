@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 12:20:51 (ywatanabe)"
+# File: ./torchPAC/scripts/PackageHandlers/_StreamingPAC.py
+
+"""
+Functionality:
+    - Implements StreamingPAC, an online PAC estimator for continuous recordings
+    - Filters incoming sample blocks by overlap-save with analytic FIR kernels
+    - Keeps phase-binned amplitude histograms per hop and updates the sliding
+      window incrementally (newest hop added, oldest hop subtracted)
+Input:
+    - Sample blocks of arbitrary length with shape (..., n_samples)
+Output:
+    - One PAC matrix (..., pha_n_bands, amp_n_bands) per window hop
+Prerequisites:
+    - PyTorch
+    - NumPy
+    - SciPy
+"""
+
+import math
+from collections import deque
+from typing import Iterable, Iterator, List
+
+import numpy as np
+import torch
+from scipy.fft import next_fast_len
+from scripts.PackageHandlers._FFTPAC import (
+    design_fir_kernel_bank,
+    modulation_index_from_hist,
+    phase_binned_amplitude,
+)
+
+
+class StreamingPAC:
+    def __init__(
+        self,
+        fs: float,
+        window_len: int,
+        hop_len: int,
+        bands_pha: np.ndarray,
+        bands_amp: np.ndarray,
+        n_bins: int = 18,
+        n_taps: int = None,
+        device: str = "cpu",
+    ):
+        """
+        Parameters
+        ----------
+        fs : float
+            Sampling frequency in Hz
+        window_len : int
+            Number of samples per PAC window; must be a multiple of hop_len
+        hop_len : int
+            Number of samples between consecutive PAC outputs
+        bands_pha : np.ndarray
+            Phase band edges in Hz with shape (pha_n_bands, 2)
+        bands_amp : np.ndarray
+            Amplitude band edges in Hz with shape (amp_n_bands, 2)
+        n_bins : int, optional
+            Number of phase bins, by default 18
+        n_taps : int, optional
+            FIR kernel length, see design_fir_kernel_bank
+        device : str, optional
+            Device for the computation, by default "cpu"
+
+        Example
+        -------
+        >>> stream = handler.stream(window_len=2 * fs, hop_len=fs // 4)
+        >>> for pac in stream.iter_pac(blocks):
+        ...     print(pac.shape)  # (n_chs, pha_n_bands, amp_n_bands)
+        """
+        if window_len % hop_len != 0:
+            raise ValueError("window_len should be a multiple of hop_len.")
+
+        self.fs = fs
+        self.window_len = window_len
+        self.hop_len = hop_len
+        self.n_bins = n_bins
+        self.device = device
+        self.n_pha = len(bands_pha)
+
+        kernels = design_fir_kernel_bank(
+            np.vstack([bands_pha, bands_amp]), fs, n_taps=n_taps
+        )
+        self.n_taps = kernels.shape[-1]
+        self.n_fft = next_fast_len(self.n_taps - 1 + hop_len, real=True)
+
+        # Positive-frequency half of the analytic kernels for rFFT inputs
+        kernels_f = torch.fft.fft(torch.from_numpy(kernels), n=self.n_fft)
+        self.kernels_f = kernels_f[:, : self.n_fft // 2 + 1].to(device)
+
+        # The first outputs depend on the zero-initialised filter state
+        self.n_warmup_hops = math.ceil((self.n_taps - 1) / hop_len)
+        self.n_window_hops = window_len // hop_len
+
+        self.reset()
+
+    @property
+    def latency_sec(self) -> float:
+        """Worst-case delay between a sample arriving and its first PAC output."""
+        return (self.hop_len + (self.n_taps - 1) / 2) / self.fs
+
+    def reset(self) -> None:
+        self._history = None
+        self._pending = None
+        self._n_hops = 0
+        self._partials = deque()
+        self._amp_sums = None
+        self._counts = None
+
+    def push(self, block) -> List[torch.Tensor]:
+        """
+        Feeds a block of samples and returns the PAC of every completed window.
+
+        Parameters
+        ----------
+        block : array-like
+            Samples with shape (..., n_samples); leading dimensions (e.g., n_chs)
+            must stay the same across blocks
+
+        Returns
+        -------
+        List[torch.Tensor]
+            PAC values with shape (..., pha_n_bands, amp_n_bands), one per hop
+        """
+        block = torch.as_tensor(block, device=self.device)
+        if self._pending is None:
+            self._pending = block
+            self._history = block.new_zeros((*block.shape[:-1], self.n_taps - 1))
+        else:
+            self._pending = torch.cat([self._pending, block], dim=-1)
+
+        pacs = []
+        while self._pending.shape[-1] >= self.hop_len:
+            hop = self._pending[..., : self.hop_len]
+            self._pending = self._pending[..., self.hop_len :]
+            pac = self._process_hop(hop)
+            if pac is not None:
+                pacs.append(pac)
+        return pacs
+
+    def iter_pac(self, blocks: Iterable) -> Iterator[torch.Tensor]:
+        """Yields PAC values while consuming an iterable of sample blocks."""
+        for block in blocks:
+            yield from self.push(block)
+
+    def _process_hop(self, hop: torch.Tensor):
+        # Overlap-save: the last n_taps - 1 samples are the filter state
+        segment = torch.cat([self._history, hop], dim=-1)
+        self._history = segment[..., -(self.n_taps - 1) :]
+
+        dtype = segment.dtype
+        X = torch.fft.rfft(segment.float(), n=self.n_fft)
+        z = torch.fft.ifft(X.unsqueeze(-2) * self.kernels_f, n=self.n_fft)
+        z = z[..., self.n_taps - 1 : self.n_taps - 1 + self.hop_len]
+
+        self._n_hops += 1
+        if self._n_hops <= self.n_warmup_hops:
+            return None
+
+        pha = z[..., : self.n_pha, :].angle()
+        amp = z[..., self.n_pha :, :].abs().double()
+        amp_sums, counts = phase_binned_amplitude(pha, amp, n_bins=self.n_bins)
+
+        # Incremental sliding-window update of the histograms
+        self._partials.append((amp_sums, counts))
+        if self._amp_sums is None:
+            self._amp_sums, self._counts = amp_sums.clone(), counts.clone()
+        else:
+            self._amp_sums += amp_sums
+            self._counts += counts
+        if len(self._partials) > self.n_window_hops:
+            old_amp_sums, old_counts = self._partials.popleft()
+            self._amp_sums -= old_amp_sums
+            self._counts -= old_counts
+
+        if len(self._partials) < self.n_window_hops:
+            return None
+
+        pac = modulation_index_from_hist(self._amp_sums, self._counts)
+        return pac.to(dtype if dtype.is_floating_point else torch.float32)
+
+
+# EOF
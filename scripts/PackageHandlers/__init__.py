@@ -4,5 +4,9 @@
 # Author: Yusuke Watanabe (ywata1989@gmail.com)
 
 from ._BaseHandler import BaseHandler
+from ._FilterBankCache import FilterBankCache, filter_bank_cache
+from ._SessionBatch import SessionBatch
+from ._StreamingPAC import StreamingPAC
+from .FFTHandler import FFTHandler
 from .MNGSHandler import MNGSHandler
 from .TensorpacHandler import TensorpacHandler
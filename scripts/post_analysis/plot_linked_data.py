@@ -6,6 +6,8 @@
 """
 1. Functionality:
    - Links performance measurements with statistical data and visualizes relationships
+   - Nearest samples by a sorted as-of join; mean / max / p95 of each usage
+     column over the calculation window of each condition
 2. Input:
    - Statistical data from multiple files
    - Processor usage data (CPU, RAM, GPU, VRAM)
@@ -17,16 +19,28 @@
 """
 
 """Imports"""
+import os
 import sys
 
 import mngs
+import numpy as np
 import pandas as pd
+from scripts.utils.results_store import has_stats
+from scripts.utils.ring_buffer_logger import read_ring
+from scripts.utils.results_store import load_stats as load_store_stats
 
 CONFIG = mngs.io.load_configs()
 
 """Functions & Classes"""
 def load_stats() -> pd.DataFrame:
     """Loads and preprocesses statistical data from multiple files."""
+    # Sweeps saved with ResultsStore are loaded in one bulk read
+    if has_stats(CONFIG.PATH.RESULTS.STORE):
+        df = load_store_stats(CONFIG.PATH.RESULTS.STORE)
+        df = df.drop(columns=["condition_id", "handler"])
+        df = df.set_index("time")
+        return df
+
     PATHS_STATS = mngs.io.glob(CONFIG.PATH.RESULTS.STATS)
     df = pd.concat([mngs.io.load(path) for path in PATHS_STATS])
     df = df.drop(columns=["package"])
@@ -35,9 +49,13 @@ def load_stats() -> pd.DataFrame:
     return df
 
 def load_processor_usages() -> pd.DataFrame:
-    """Loads processor usage data from CSV file."""
+    """Loads processor usage data from CSV file (or an unexported ring buffer)."""
+    if CONFIG.PATH.RESULTS.PROCESSOR_USAGE.endswith(".ring"):
+        return read_ring(CONFIG.PATH.RESULTS.PROCESSOR_USAGE)
     return mngs.io.load(CONFIG.PATH.RESULTS.PROCESSOR_USAGE)
 
+USAGE_COLUMNS = ["CPU [%]", "RAM [GiB]", "GPU [%]", "VRAM [GiB]"]
+
 def match_nearest_timestamps(df_p: pd.DataFrame, df_s: pd.DataFrame) -> pd.DataFrame:
     """Matches performance data with nearest statistical timestamps.
 
@@ -53,10 +71,83 @@ def match_nearest_timestamps(df_p: pd.DataFrame, df_s: pd.DataFrame) -> pd.DataF
     pd.DataFrame
         Performance data resampled to statistical timestamps
     """
-    df_p_times = pd.to_datetime(df_p["Timestamp"])
-    df_s_times = pd.to_datetime(df_s.index)
-    indices = [abs(df_p_times - t).argmin() for t in df_s_times]
-    return df_p.iloc[indices].set_index(df_s.index)
+    # Sorted as-of join: O((N + M) log M) instead of one scan per stats row
+    df_p = _sort_by_timestamp(df_p)
+    keys = pd.DataFrame(
+        {"Timestamp": pd.to_datetime(df_s.index), "_order": np.arange(len(df_s))}
+    ).sort_values("Timestamp", kind="stable")
+    df = pd.merge_asof(keys, df_p, on="Timestamp", direction="nearest")
+    df = df.sort_values("_order").drop(columns=["_order", "Timestamp"])
+    return df.set_index(df_s.index)
+
+
+def aggregate_intervals(
+    df_p: pd.DataFrame,
+    df_s: pd.DataFrame,
+    columns=USAGE_COLUMNS,
+    percentile: float = 95,
+) -> pd.DataFrame:
+    """Aggregates performance data over each condition's calculation window.
+
+    Parameters
+    ----------
+    df_p : pd.DataFrame
+        Performance data with Timestamp column
+    df_s : pd.DataFrame
+        Statistical data with calc_start_time and calc_end_time columns
+    columns : list, optional
+        Performance columns to aggregate
+    percentile : float, optional
+        Upper percentile reported next to the mean and the max, by default 95
+
+    Returns
+    -------
+    pd.DataFrame
+        "<column> mean", "<column> max" and "<column> p95" per stats row;
+        NaN for windows without samples
+    """
+    df_p = _sort_by_timestamp(df_p)
+    times = df_p["Timestamp"].to_numpy()
+    starts = pd.to_datetime(df_s["calc_start_time"]).to_numpy()
+    ends = pd.to_datetime(df_s["calc_end_time"]).to_numpy()
+
+    # Window bounds by binary search; windows may overlap (parallel sweeps)
+    i_starts = np.searchsorted(times, starts, side="left")
+    i_ends = np.searchsorted(times, ends, side="right")
+
+    n_samples = i_ends - i_starts
+    has_samples = n_samples > 0
+
+    out = {}
+    for col in [col for col in columns if col in df_p]:
+        values = df_p[col].to_numpy(dtype=float)
+
+        # Means from a cumulative sum
+        cumsum = np.concatenate([[0.0], np.cumsum(values)])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = (cumsum[i_ends] - cumsum[i_starts]) / n_samples
+
+        # Max and percentile from each sorted window (np.percentile per
+        # window costs more than the sort itself)
+        maxs = np.full(len(df_s), np.nan)
+        upper = np.full(len(df_s), np.nan)
+        for ii in np.flatnonzero(has_samples):
+            window = np.sort(values[i_starts[ii] : i_ends[ii]])
+            maxs[ii] = window[-1]
+            upper[ii] = _percentile_of_sorted(window, percentile)
+
+        out[f"{col} mean"] = np.where(has_samples, means, np.nan)
+        out[f"{col} max"] = maxs
+        out[f"{col} p{percentile:g}"] = upper
+    return pd.DataFrame(out, index=df_s.index)
+
+
+def _percentile_of_sorted(window: np.ndarray, percentile: float) -> float:
+    """Linear-interpolation percentile (as np.percentile) of a sorted array."""
+    pos = percentile / 100 * (len(window) - 1)
+    i_low = int(pos)
+    i_high = min(i_low + 1, len(window) - 1)
+    return window[i_low] + (pos - i_low) * (window[i_high] - window[i_low])
 
 
 def link(df_p: pd.DataFrame, df_s: pd.DataFrame) -> pd.DataFrame:
@@ -72,12 +163,24 @@ def link(df_p: pd.DataFrame, df_s: pd.DataFrame) -> pd.DataFrame:
     Returns
     -------
     pd.DataFrame
-        Combined dataframe with matched timestamps
+        Combined dataframe with matched timestamps and, when the calculation
+        windows are recorded, interval aggregates
     """
-    df = match_nearest_timestamps(df_p, df_s)
-    df = pd.concat([df, df_s], axis=1)
+    # Parses and sorts the (possibly day-long) usage log only once
+    df_p = _sort_by_timestamp(df_p)
+    dfs = [match_nearest_timestamps(df_p, df_s)]
+    if {"calc_start_time", "calc_end_time"} <= set(df_s.columns):
+        dfs.append(aggregate_intervals(df_p, df_s))
+    df = pd.concat([*dfs, df_s], axis=1)
     return df
 
+def _sort_by_timestamp(df_p: pd.DataFrame) -> pd.DataFrame:
+    if not pd.api.types.is_datetime64_any_dtype(df_p["Timestamp"]):
+        df_p = df_p.assign(Timestamp=pd.to_datetime(df_p["Timestamp"]))
+    if not df_p["Timestamp"].is_monotonic_increasing:
+        df_p = df_p.sort_values("Timestamp", kind="stable")
+    return df_p
+
 # def visualize_performance_metrics(df: pd.DataFrame, save_dir: str = "./jpg") -> None:
 #     """Creates performance comparison plots between packages."""
 #     param_groups = {
@@ -147,7 +250,14 @@ def process_var(df, col_var):
 
     _df = mngs.pd.slice(df, base_params_left)
 
-    y_vars = ['CPU [%]', 'RAM [GiB]', 'GPU [%]', 'VRAM [GiB]', 'init_time_mean_sec', 'calc_time_mean_sec']
+    y_vars = [
+        'CPU [%]', 'RAM [GiB]', 'GPU [%]', 'VRAM [GiB]',
+        'CPU [%] p95', 'RAM [GiB] max', 'GPU [%] p95', 'VRAM [GiB] max',
+        'peak_rss_mib', 'cuda_max_allocated_mib', 'tracemalloc_peak_mib',
+        'init_time_mean_sec', 'calc_time_mean_sec',
+    ]
+    # Skips columns absent from this sweep (e.g., without the usage log)
+    y_vars = [y_var for y_var in y_vars if y_var in _df and _df[y_var].notna().any()]
     for y_var in y_vars:
         fig, ax = mngs.plt.subplots()
         ax.sns_barplot(
@@ -155,8 +265,8 @@ def process_var(df, col_var):
             x=col_var,
             y=y_var,
             hue="package",
-            hue_order=["tensorpac", "mngs"],
-            hue_colors={"mngs": CC["blue"], "tensorpac": CC["red"]},
+            hue_order=["tensorpac", "mngs", "fft"],
+            hue_colors={"mngs": CC["blue"], "tensorpac": CC["red"], "fft": CC["green"]},
         )
         mngs.io.save(fig, f"./jpg/{y_var}/{col_var}.jpg")
 
@@ -164,10 +274,14 @@ def main():
 
     # Loading
     df_s = load_stats()
-    df_p = load_processor_usages()
 
-    # Linking calculation time and resource usage
-    df = link(df_p, df_s)
+    # Peak memory is in stats already; the system-wide usage log is optional
+    if os.path.exists(CONFIG.PATH.RESULTS.PROCESSOR_USAGE):
+        df_p = load_processor_usages()
+        # Linking calculation time and resource usage
+        df = link(df_p, df_s)
+    else:
+        df = df_s
 
     # Plotting
     params_baseline = CONFIG.PARAMS.BASELINE
@@ -6,17 +6,40 @@
 """This script does XYZ."""
 
 import sys
+import time
 from typing import Tuple
 
 import matplotlib.pyplot as plt
 import mngs
 import numpy as np
-import scipy
+import pandas as pd
 import tensorpac
+import torch
 from numpy.typing import NDArray
+from scripts.PackageHandlers._DtypePolicy import PRESETS
+from scripts.PackageHandlers._ErrorBudget import calibrate
+from scripts.PackageHandlers._FFTPAC import FFTPAC
+from scripts.PackageHandlers._FrequencyGrid import make_grids
+from scripts.PackageHandlers._PACAccuracy import pac_correlations, pac_differences
 
 
 # Functions
+def calc_bands(params: dict, fs: float) -> Tuple[NDArray, NDArray]:
+    """Phase and amplitude band edges of the handlers for params."""
+    grid_pha, grid_amp = make_grids(
+        fs,
+        params.get("pha_min_hz", 2),
+        params.get("pha_max_hz", 20),
+        params["pha_n_bands"],
+        params.get("amp_min_hz", 80),
+        params.get("amp_max_hz", 160),
+        params["amp_n_bands"],
+        pha_grid=params.get("pha_grid"),
+        amp_grid=params.get("amp_grid"),
+    )
+    return grid_pha.edges, grid_amp.edges
+
+
 def calc_pac_with_tensorpac(
     xx: NDArray,
     fs: int,
@@ -199,13 +222,11 @@ def compute_pac_differences(
         - abs_diff_rms: RMS of absolute differences
         - rel_diff_percent: RMS of relative differences in percentage
     """
-    abs_diff = np.abs(pac_mngs - pac_tp)
-    rel_diff = abs_diff / (np.abs(pac_tp) + np.finfo(float).eps)
-
+    differences = pac_differences(pac_mngs, pac_tp)
     return {
-        "abs_diff_rms": float(f"{np.sqrt(np.mean(abs_diff**2)):.3f}"),
+        "abs_diff_rms": float(f"{differences['abs_diff_rms']:.3f}"),
         "rel_diff_percent": float(
-            f"{100 * np.sqrt(np.mean(rel_diff**2)):.1f}"
+            f"{differences['rel_diff_percent']:.1f}"
         ),  # in %
     }
 
@@ -230,19 +251,8 @@ def compute_pac_correlations(
         - spearman_rho: Spearman rank correlation
         - kendall_tau: Kendall's tau correlation
     """
-    # Flatten arrays
-    mngs_flat = pac_mngs.flatten()
-    tp_flat = pac_tp.flatten()
-
-    return {
-        "pearson_r": float(f"{np.corrcoef(mngs_flat, tp_flat)[0,1]:.3f}"),
-        "spearman_rho": float(
-            f"{scipy.stats.spearmanr(mngs_flat, tp_flat)[0]:.3f}"
-        ),
-        "kendall_tau": float(
-            f"{scipy.stats.kendalltau(mngs_flat, tp_flat)[0]:.3f}"
-        ),
-    }
+    correlations = pac_correlations(pac_mngs, pac_tp)
+    return {key: float(f"{value:.3f}") for key, value in correlations.items()}
 
 
 def compare_pac_mngs_and_pac_tensorpac() -> None:
@@ -354,17 +364,167 @@ def compare_pac_mngs_and_pac_tensorpac() -> None:
     mngs.io.save(fig, "pac_value_comparision.jpg")
 
 
+def compare_dtype_policies(n_perm=None) -> pd.DataFrame:
+    """Reports the accuracy of each dtype policy of the FFT handler.
+
+    PAC values of every preset in PRESETS (see
+    scripts/PackageHandlers/_DtypePolicy.py) are compared with the float64
+    reference on the demo signal.
+
+    Example
+    -------
+    >>> df = compare_dtype_policies()
+    # Saves dtype_policy_accuracy.csv
+
+    Parameters
+    ----------
+    n_perm : int, optional
+        Number of surrogates (z-scored PAC), by default None (raw MI)
+
+    Returns
+    -------
+    pd.DataFrame
+        Differences, correlations and calculation time per policy
+    """
+    params = CONFIG.PARAMS.BASELINE
+    xx, tt, fs = mngs.dsp.demo_sig(
+        "pac",
+        batch_size=params["batch_size"],
+        n_chs=params["n_chs"],
+        n_segments=params["n_segments"],
+        t_sec=params["t_sec"],
+        fs=params["fs"],
+    )
+    xx = torch.tensor(xx, dtype=torch.float32)
+    xx = xx.reshape(-1, *xx.shape[-2:])  # (batch_size * n_chs, n_segments, seq_len)
+    bands_pha, bands_amp = calc_bands(params, fs)
+
+    def calc_pac(name):
+        model = FFTPAC(
+            xx.shape[-1],
+            fs,
+            # Same bands as the handlers (see scripts/utils/init_model.py)
+            bands_pha=bands_pha,
+            bands_amp=bands_amp,
+            n_perm=n_perm,
+            dtype_policy=PRESETS[name],
+        )
+        _xx = xx.half() if name == "fp16" else xx
+        torch.manual_seed(42)
+        with torch.no_grad():
+            model(_xx)  # warmup
+            torch.manual_seed(42)
+            start = time.perf_counter()
+            pac = model(_xx)
+            calc_time_sec = time.perf_counter() - start
+        return pac.double().numpy(), calc_time_sec
+
+    pac_ref, _ = calc_pac("fp64")
+
+    rows = []
+    for name in PRESETS:
+        pac, calc_time_sec = calc_pac(name)
+        rows.append(
+            {
+                "dtype_policy": name,
+                **compute_pac_differences(pac, pac_ref),
+                "max_abs_diff": float(np.abs(pac - pac_ref).max()),
+                **compute_pac_correlations(pac, pac_ref),
+                "calc_time_sec": calc_time_sec,
+            }
+        )
+    df = pd.DataFrame(rows)
+    print(df.to_string(index=False))
+    mngs.io.save(df, "dtype_policy_accuracy.csv")
+    return df
+
+
+def report_error_budget(error_budget: dict, n_perm=None) -> pd.DataFrame:
+    """Reports the FFT configurations validated for an error budget.
+
+    Example
+    -------
+    >>> df = report_error_budget({"pearson_r": 0.999})
+    # Saves error_budget_report.csv
+
+    Parameters
+    ----------
+    error_budget : dict
+        Upper bounds of differences and lower bounds of correlations against
+        the float64 reference (see scripts/PackageHandlers/_PACAccuracy.py)
+    n_perm : int, optional
+        Number of surrogates of the reference, by default None
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per candidate, with metrics, time and whether it meets the budget
+    """
+    params = CONFIG.PARAMS.BASELINE
+    xx, tt, fs = mngs.dsp.demo_sig(
+        "pac",
+        batch_size=1,
+        n_chs=params["n_chs"],
+        n_segments=params["n_segments"],
+        t_sec=params["t_sec"],
+        fs=params["fs"],
+    )
+    xx = torch.tensor(xx, dtype=torch.float32)[0]  # (n_chs, n_segments, seq_len)
+    bands_pha, bands_amp = calc_bands(params, fs)
+
+    def build_model(**config):
+        return FFTPAC(
+            xx.shape[-1],
+            fs,
+            # Same bands as the handlers (see scripts/utils/init_model.py)
+            bands_pha=bands_pha,
+            bands_amp=bands_amp,
+            n_perm=config["n_perm"],
+            n_bins=config["n_bins"],
+            dtype_policy=PRESETS[config["dtype_policy"]],
+            pad_sigmas=config["pad_sigmas"],
+        )
+
+    config, df = calibrate(build_model, xx, n_perm, error_budget)
+    print(df.sort_values("calc_time_sec").to_string(index=False))
+    print(f"\nChosen for {error_budget}: {config}")
+    mngs.io.save(df, "error_budget_report.csv")
+    return df
+
+
 main = compare_pac_mngs_and_pac_tensorpac
 
 if __name__ == "__main__":
-    import torch
+    import argparse
+    import json
+
     from scripts.utils.prepare_signal import prepare_signal
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--dtype_policies",
+        action="store_true",
+        default=False,
+        help="Report the accuracy of the FFT dtype policies against float64.",
+    )
+    parser.add_argument(
+        "--error_budget",
+        type=json.loads,
+        default=None,
+        help='Report the FFT configurations meeting, e.g., \'{"pearson_r": 0.999}\'.',
+    )
+    args = parser.parse_args()
+
     CONFIG, sys.stdout, sys.stderr, plt, CC = mngs.gen.start(
         sys, plt, agg=True, verbose=False
     )
 
-    main()
+    if args.dtype_policies:
+        compare_dtype_policies()
+    elif args.error_budget is not None:
+        report_error_budget(args.error_budget)
+    else:
+        main()
 
     mngs.gen.close(CONFIG, notify=False)
 
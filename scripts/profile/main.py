@@ -15,21 +15,25 @@ Prerequisites:
     * Custom Handlers (MNGSHandler, TensorpacHandler)
 """
 
+import argparse
 import os
 from typing import Any, Dict
 
 import mngs
-from scripts.utils.define_parameter_space import define_parameter_space
+from scripts.PackageHandlers import filter_bank_cache
 from scripts.utils.init_model import init_model
+from scripts.utils.plan_sweep import count_grid, plan_grid, plan_sweep
 from scripts.utils.perform_pac_calculation import perform_pac_calculation
 from scripts.utils.prepare_signal import prepare_signal
+from scripts.utils.results_store import ResultsStore
+from scripts.utils.schedule_sweep import schedule_sweep
 from scripts.utils.save_results import save_results
 
 CONFIG = mngs.io.load_configs()
 
 
 def run_condition(
-    CONFIG, params: Dict[str, Any], condition_count: int
+    CONFIG, params: Dict[str, Any], condition_count: int, store: ResultsStore = None
 ) -> None:
     """Executes PAC calculation for given parameters.
 
@@ -37,59 +41,93 @@ def run_condition(
     ----------
     params : Dict[str, Any]
         Dictionary containing calculation parameters
+    store : ResultsStore, optional
+        Sweep-wide store; without it, results are saved per condition directory
 
     Returns
     -------
     None
     """
 
+    # Filter banks are reused across conditions sharing (fs, seq_len, bands)
+    filter_bank_cache.configure(cache_dir=CONFIG.PATH.FILTER_BANK_CACHE)
+
     # Time stamper
     params["ts"] = mngs.gen.TimeStamper()
 
     # Sequence length
     params["seq_len"] = int(params["t_sec"] * params["fs"])
 
-    # Update SDIR
+    # Update SDIR; profiles of a resumed sweep go next to its results
     CONFIG = CONFIG.copy()
     CONFIG.SDIR = os.path.join(
-        CONFIG.SDIR, f"condition_{condition_count:04d}/"
+        store.sdir if store is not None else CONFIG.SDIR,
+        f"condition_{condition_count:04d}/",
     )
 
     # Model
     model = init_model(params)
-    if model is None:
-        return
-
-    # Signal
-    signal = prepare_signal(params)
-    if signal is None:
-        return
+    try:
+        # Signal
+        signal = prepare_signal(params)
 
-    # Main
-    xpac = perform_pac_calculation(model, signal, params)
+        # Main
+        xpac = perform_pac_calculation(model, signal, params, sdir=CONFIG.SDIR)
 
-    # Saving
-    save_results(model, xpac, params, CONFIG)
+        # Saving
+        save_results(
+            model, xpac, params, CONFIG, store=store, condition_id=condition_count
+        )
+    finally:
+        # Cleanup; e.g., releases the tensorpac worker pool for the next condition
+        model.close()
+        del model
 
-    # Cleanup
-    del model
 
+def main(CONFIG, resume: str = None, grid: bool = False) -> None:
+    """Main function to iterate through parameter spaces and run PAC calculations.
 
-def main(CONFIG) -> None:
-    """Main function to iterate through parameter spaces and run PAC calculations."""
+    Parameters
+    ----------
+    resume : str, optional
+        Directory of an interrupted sweep; its finished conditions are skipped
+        and new results are appended there
+    grid : bool, optional
+        Runs the full PARAMS.ALL grid instead of one-at-a-time variations
+    """
 
-    PARAM_NAMES = CONFIG.PARAMS.VARIATIONS.keys()
-    condition_count = 0
-    for param_name in PARAM_NAMES:
-        params_list = define_parameter_space(param_name)
-        for params in params_list:
-            for package in CONFIG.PACKAGES:
-                try:
-                    params["package"] = package
-                    run_condition(CONFIG, params, condition_count)
-                    condition_count += 1
-                except Exception as e:
-                    print(e)
+    # All conditions are appended to results.parquet (as part files until
+    # compact()) and xpac.h5 in SDIR
+    store = ResultsStore(resume or CONFIG.SDIR)
+
+    # Unique conditions without results, identified by their parameter hash;
+    # the full grid is planned lazily
+    n_done = len(store.condition_hashes)
+    if grid:
+        plan = plan_grid(CONFIG.PARAMS.ALL, done_hashes=store.condition_hashes)
+        print(f"Up to {count_grid(CONFIG.PARAMS.ALL):,} conditions ({n_done} done)")
+    else:
+        plan = plan_sweep(
+            CONFIG.PARAMS.VARIATIONS.keys(),
+            CONFIG.PACKAGES,
+            done_hashes=store.condition_hashes,
+        )
+        print(f"{len(plan)} conditions to run ({n_done} done)")
+
+    # Parallel workers; failures are logged to failed_conditions.log
+    n_failed = schedule_sweep(
+        plan,
+        run_condition,
+        CONFIG,
+        store,
+        condition_id_start=store.next_condition_id,
+        n_workers=CONFIG.SCHEDULER.N_WORKERS,
+        n_cores_per_worker=CONFIG.SCHEDULER.N_CORES_PER_WORKER,
+        exclusive=CONFIG.SCHEDULER.EXCLUSIVE,
+    )
+    n_succeeded = len(store.condition_hashes) - n_done
+    print(f"{n_succeeded} conditions succeeded, {n_failed} failed")
+    store.compact()
 
     mngs.sh(f"cp ./tmp/processor_usages.csv {CONFIG.SDIR}")
     return 0
@@ -120,6 +158,21 @@ if __name__ == "__main__":
 
     import matplotlib.pyplot as plt
 
+    # Arguments
+    parser = argparse.ArgumentParser(description="PAC calculation benchmark")
+    parser.add_argument(
+        "--resume",
+        type=str,
+        default=None,
+        help="Directory of an interrupted sweep to continue (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--grid",
+        action="store_true",
+        help="Runs the full PARAMS.ALL grid (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
     # Configurations
     CONFIG, sys.stdout, sys.stderr, plt, CC = mngs.gen.start(
         sys,
@@ -132,7 +185,7 @@ if __name__ == "__main__":
     # Main
     # -----------------------------------
 
-    exit_status = main(CONFIG)
+    exit_status = main(CONFIG, resume=args.resume, grid=args.grid)
 
     # -----------------------------------
     # Cleanup mngs format
@@ -6,10 +6,14 @@
 """
 Functionality:
     * Records system processes at specified intervals.
+    * By default into a fixed-size binary ring buffer (see
+      scripts/utils/ring_buffer_logger.py); --csv uses the former mngs CSV logger
+    * Exports a ring to CSV / Parquet and reports the logger's own CPU overhead
 Input:
     * Interval in seconds and reset flag.
 Output:
-    * Process records (output format not specified in the given code).
+    * Ring file (CONFIG.PATH.PROCESSOR_USAGE_RING) or CSV
+      (CONFIG.PATH.PROCESSOR_USAGE)
 Prerequisites:
     * mngs package
     * matplotlib
@@ -21,9 +25,14 @@ import sys
 
 import matplotlib.pyplot as plt
 import mngs
+from scripts.utils.ring_buffer_logger import (
+    RingBufferLogger,
+    export_ring,
+    read_overhead,
+)
 
 """Functions & Classes"""
-def main(interval_s, reset):
+def main(interval_s, reset, use_csv=False, capacity=24 * 3600 * 4, export=None):
     """
     Records system processes at specified intervals.
 
@@ -33,19 +42,38 @@ def main(interval_s, reset):
         Interval in seconds between recordings.
     reset : bool
         Flag to reset previous recordings.
+    use_csv : bool
+        Whether to log with the former mngs CSV logger.
+    capacity : int
+        Number of samples kept in the ring buffer.
+    export : str, optional
+        Exports the ring to this CSV / Parquet path instead of recording.
 
     Returns
     -------
     None
     """
-    mngs.resource.log_processor_usages(
-        path=CONFIG.PATH.PROCESSOR_USAGE,
-        limit_min=60 * 24,
-        interval_s=interval_s,
-        init=args.init,
-        verbose=False,
-        background=False,
+    if export is not None:
+        export_ring(CONFIG.PATH.PROCESSOR_USAGE_RING, export)
+        print(read_overhead(CONFIG.PATH.PROCESSOR_USAGE_RING))
+        return
+
+    if use_csv:
+        mngs.resource.log_processor_usages(
+            path=CONFIG.PATH.PROCESSOR_USAGE,
+            limit_min=60 * 24,
+            interval_s=interval_s,
+            init=reset,
+            verbose=False,
+            background=False,
+        )
+        return
+
+    logger = RingBufferLogger(
+        CONFIG.PATH.PROCESSOR_USAGE_RING, capacity=capacity, init=reset
     )
+    logger.run(interval_s=interval_s, limit_s=60 * 60 * 24)
+    print(logger.overhead)
 
 
 if __name__ == "__main__":
@@ -66,12 +94,30 @@ if __name__ == "__main__":
         default=False,
         help="Reset flag to clear previous recordings.",
     )
+    parser.add_argument(
+        "--csv",
+        action="store_true",
+        default=False,
+        help="Log with the former mngs CSV logger instead of the ring buffer.",
+    )
+    parser.add_argument(
+        "--capacity",
+        type=int,
+        default=24 * 3600 * 4,
+        help="Number of samples kept in the ring buffer.",
+    )
+    parser.add_argument(
+        "--export",
+        type=str,
+        default=None,
+        help="Export the ring buffer to this .csv / .parquet path and exit.",
+    )
     args = parser.parse_args()
 
     CONFIG, sys.stdout, sys.stderr, plt, CC = mngs.gen.start(
         sys, plt, verbose=False
     )
-    main(args.interval_s, args.init)
+    main(args.interval_s, args.init, args.csv, args.capacity, args.export)
     mngs.gen.close(CONFIG, verbose=False, notify=False)
 
 # EOF
@@ -25,18 +25,21 @@ run_experiment() {
     _initialize
 
     # Start logging CPU / GPU usages
-    ./scripts/record_processor_usages.py --interval_s 0.33 --init &
+    ./scripts/profile/record_processor_usages.py --interval_s 0.33 --init &
 
     # PAC calculation with stats recording
-    ./scripts/main.py
+    ./scripts/profile/main.py
 
     end=$(date +"%Y%m%d_%H%M%S")
 
     # Close
     _kill_py
+    # The logger flushes its last batch on SIGTERM
+    sleep 1
 
-    # 
-    cp -v /tmp/processor_usages.csv ./data/processor_usages-"$start"-"$end".csv
+    # Export the ring buffer of the usages
+    ./scripts/profile/record_processor_usages.py \
+        --export ./data/processor_usages-"$start"-"$end".csv
     # # Plot the metrics
     # ./scripts/plot_parallel.py &&
 
@@ -49,6 +52,7 @@ _initialize() {
     _kill_py
     rm -f /tmp/mngs/processor_usages.csv
     rm -f /tmp/processor_usages.csv    
+    rm -f /tmp/processor_usages.ring
     # rm -rf \
     #    ./scripts/main/FINISHED* \
     #    ./scripts/main/RUNNING/ \
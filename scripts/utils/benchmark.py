@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 15:38:12 (ywatanabe)"
+# File: ./torchPAC/scripts/utils/benchmark.py
+
+"""
+Functionality:
+    * Times a function with warmup iterations and a monotonic clock (perf_counter_ns)
+    * Repeats until the bootstrap confidence interval of the median reaches a
+      relative-precision target, or until an iteration / time cap
+    * Summarises the timings as median, IQR, p95, p99, mean and std
+Input:
+    * A function without arguments (e.g., one PAC calculation)
+Output:
+    * The last return value and a BenchmarkResult
+Prerequisites:
+    * numpy
+"""
+
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class BenchmarkResult:
+    times_sec: np.ndarray
+    n_warmup: int
+    start_time: datetime
+    end_time: datetime
+    median_sec: float
+    iqr_sec: float
+    p95_sec: float
+    p99_sec: float
+    mean_sec: float
+    std_sec: float
+    median_ci_low_sec: float
+    median_ci_high_sec: float
+    rel_precision: float
+    converged: bool
+
+    @classmethod
+    def from_times(
+        cls,
+        times_sec: np.ndarray,
+        n_warmup: int,
+        start_time: datetime,
+        end_time: datetime,
+        rel_precision_target: Optional[float] = None,
+        ci: float = 0.95,
+        n_bootstrap: int = 1000,
+    ) -> "BenchmarkResult":
+        times_sec = np.asarray(times_sec, dtype=float)
+        q25, median, q75, p95, p99 = np.percentile(times_sec, [25, 50, 75, 95, 99])
+        ci_low, ci_high = bootstrap_ci(times_sec, ci=ci, n_bootstrap=n_bootstrap)
+        rel_precision = _rel_precision(median, ci_low, ci_high)
+        return cls(
+            times_sec=times_sec,
+            n_warmup=n_warmup,
+            start_time=start_time,
+            end_time=end_time,
+            median_sec=median,
+            iqr_sec=q75 - q25,
+            p95_sec=p95,
+            p99_sec=p99,
+            mean_sec=times_sec.mean(),
+            std_sec=times_sec.std(),
+            median_ci_low_sec=ci_low,
+            median_ci_high_sec=ci_high,
+            rel_precision=rel_precision,
+            converged=(
+                rel_precision_target is not None
+                and rel_precision <= rel_precision_target
+            ),
+        )
+
+    @property
+    def n_calc(self) -> int:
+        return len(self.times_sec)
+
+    @property
+    def middle_time(self) -> datetime:
+        return self.start_time + (self.end_time - self.start_time) / 2
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Scalar summary, e.g., for stats.csv (without the raw timings)."""
+        dic = asdict(self)
+        del dic["times_sec"], dic["start_time"], dic["end_time"]
+        dic["n_calc"] = self.n_calc
+        return dic
+
+
+def bootstrap_ci(
+    times_sec: np.ndarray,
+    ci: float = 0.95,
+    n_bootstrap: int = 1000,
+    seed: int = 42,
+) -> Tuple[float, float]:
+    """Percentile bootstrap confidence interval of the median."""
+    if len(times_sec) < 2:
+        return float("nan"), float("nan")
+    rng = np.random.default_rng(seed)
+    indices = rng.integers(0, len(times_sec), (n_bootstrap, len(times_sec)))
+    medians = np.median(times_sec[indices], axis=-1)
+    alpha = (1 - ci) / 2
+    ci_low, ci_high = np.quantile(medians, [alpha, 1 - alpha])
+    return float(ci_low), float(ci_high)
+
+
+def benchmark(
+    fn: Callable[[], Any],
+    n_warmup: int = 3,
+    n_min: int = 10,
+    n_max: int = 1000,
+    rel_precision: Optional[float] = 0.05,
+    max_time_sec: Optional[float] = 60.0,
+    sync: Optional[Callable[[], None]] = None,
+    after_warmup: Optional[Callable[[], None]] = None,
+    ci: float = 0.95,
+    n_bootstrap: int = 1000,
+) -> Tuple[Any, BenchmarkResult]:
+    """Times fn after warmup until the median is precise enough.
+
+    Parameters
+    ----------
+    fn : Callable[[], Any]
+        Function to time
+    n_warmup : int, optional
+        Untimed iterations absorbing first-call costs, by default 3
+    n_min : int, optional
+        Minimum number of timed iterations, by default 10
+    n_max : int, optional
+        Maximum number of timed iterations, by default 1000
+    rel_precision : float, optional
+        Target half width of the median's CI relative to the median, by
+        default 0.05; None runs exactly n_min iterations
+    max_time_sec : float, optional
+        Cap on the total timed duration, by default 60.0
+    sync : Callable[[], None], optional
+        Called before reading the clock (e.g., torch.cuda.synchronize)
+    after_warmup : Callable[[], None], optional
+        Called once between warmup and timed iterations (e.g., to reset
+        other counters)
+    ci : float, optional
+        Confidence level of the bootstrap interval, by default 0.95
+
+    Returns
+    -------
+    Tuple[Any, BenchmarkResult]
+        The last return value of fn and the timing summary
+    """
+    sync = sync or (lambda: None)
+
+    for _ in range(n_warmup):
+        out = fn()
+    sync()
+    if after_warmup is not None:
+        after_warmup()
+
+    times_ns = []
+    start_time = datetime.now()
+    t_total_start = time.perf_counter_ns()
+    next_check = n_min
+    while True:
+        t_start = time.perf_counter_ns()
+        out = fn()
+        sync()
+        times_ns.append(time.perf_counter_ns() - t_start)
+
+        n_done = len(times_ns)
+        if n_done >= n_max:
+            break
+        elapsed_sec = (time.perf_counter_ns() - t_total_start) * 1e-9
+        if max_time_sec is not None and elapsed_sec >= max_time_sec:
+            break
+        if n_done < next_check:
+            continue
+        if rel_precision is None:
+            break
+        # Bootstraps only every ~10% more iterations to keep the overhead low
+        times_sec = np.array(times_ns) * 1e-9
+        ci_low, ci_high = bootstrap_ci(times_sec, ci=ci, n_bootstrap=n_bootstrap)
+        if _rel_precision(np.median(times_sec), ci_low, ci_high) <= rel_precision:
+            break
+        next_check = n_done + max(1, n_done // 10)
+
+    result = BenchmarkResult.from_times(
+        np.array(times_ns) * 1e-9,
+        n_warmup=n_warmup,
+        start_time=start_time,
+        end_time=datetime.now(),
+        rel_precision_target=rel_precision,
+        ci=ci,
+        n_bootstrap=n_bootstrap,
+    )
+    return out, result
+
+
+def _rel_precision(median: float, ci_low: float, ci_high: float) -> float:
+    if not median or np.isnan(ci_low):
+        return float("inf")
+    return (ci_high - ci_low) / 2 / median
+
+
+# EOF
@@ -1,29 +1,55 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: "2024-11-05 01:18:37 (ywatanabe)"
+# Time-stamp: "2026-10-18 20:52:10 (ywatanabe)"
 # File: ./torchPAC/scripts/utils/init_model.py
 
 from typing import Union
 
-from scripts.PackageHandlers import MNGSHandler, TensorpacHandler
+from scripts.PackageHandlers import FFTHandler, MNGSHandler, TensorpacHandler
 
-def init_model(params: dict) -> Union[MNGSHandler, TensorpacHandler]:
+def init_model(params: dict) -> Union[MNGSHandler, TensorpacHandler, FFTHandler]:
     params_h = params.copy()
-    params_h.update({
+    # Band ranges of the shared frequency grids unless set in PARAMS; the
+    # spacing or explicit edges are given by pha_grid and amp_grid
+    for key, value in {
         "pha_min_hz": 2,
         "pha_max_hz": 20,
         "amp_min_hz": 80,
-        "amp_max_hz": 160
-    })
+        "amp_max_hz": 160,
+    }.items():
+        params_h.setdefault(key, value)
     package = params_h["package"]
 
-    for key in ["batch_size", "n_chs", "n_segments", "t_sec", "package", "no_grad", "n_calc"]:
+    for key in [
+        "batch_size",
+        "n_chs",
+        "n_segments",
+        "t_sec",
+        "package",
+        "no_grad",
+        "n_calc",
+        "n_calc_max",
+        "n_warmup",
+        "rel_precision",
+        "max_calc_sec",
+        "signal_path",
+        "signal_shape",
+        "signal_dtype",
+        "condition_hash",
+        "n_copies",
+        "profile_trace",
+        "profile_top_n",
+        "trace_python_memory",
+    ]:
         params_h.pop(key, None)
 
+    # Only the requested handler is initialized; initializing all of them
+    # would mix their init times in the shared TimeStamper.
     return {
-        "mngs": MNGSHandler(**params_h),
-        "tensorpac": TensorpacHandler(**params_h)
-    }[package]
+        "mngs": MNGSHandler,
+        "tensorpac": TensorpacHandler,
+        "fft": FFTHandler,
+    }[package](**params_h)
 
 
 # EOF
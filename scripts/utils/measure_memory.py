@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 17:31:48 (ywatanabe)"
+# File: ./torchPAC/scripts/utils/measure_memory.py
+
+"""
+Functionality:
+    * Measures the peak memory of this process while a block runs
+    * Peak RSS: VmHWM reset via /proc/self/clear_refs (Linux); falls back to
+      the lifetime maximum of resource.getrusage elsewhere
+    * PyTorch CUDA caching-allocator peaks (allocated / reserved)
+    * Optionally, the tracemalloc peak (Python and NumPy allocations)
+Input:
+    * Device and whether to trace Python allocations
+Output:
+    * MemoryStats with columns for stats.csv
+Prerequisites:
+    * psutil
+    * PyTorch
+"""
+
+import resource
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+import psutil
+import torch
+
+MiB = 1024**2
+
+
+@dataclass
+class MemoryStats:
+    rss_start_mib: float
+    peak_rss_mib: float
+    peak_rss_increase_mib: float
+    peak_rss_scope: str
+    cuda_max_allocated_mib: Optional[float] = None
+    cuda_max_reserved_mib: Optional[float] = None
+    tracemalloc_peak_mib: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class MemoryMonitor:
+    """
+    Context manager measuring the peak memory of the enclosed block.
+
+    Example
+    -------
+    >>> with MemoryMonitor(device="cpu") as monitor:
+    ...     xpac = model.calc_pac(signal)
+    >>> monitor.stats.peak_rss_mib
+    """
+
+    def __init__(self, device: str = "cpu", trace_python: bool = False):
+        self.device = device
+        self.use_cuda = "cuda" in str(device) and torch.cuda.is_available()
+        self.trace_python = trace_python
+        self.stats = None
+        self._process = psutil.Process()
+        self._owns_tracemalloc = False
+
+    def __enter__(self) -> "MemoryMonitor":
+        # Resets the peak RSS (VmHWM) to the current RSS
+        self._scope = "condition" if _reset_peak_rss() else "process"
+        self._rss_start = self._process.memory_info().rss
+
+        if self.use_cuda:
+            torch.cuda.synchronize(self.device)
+            torch.cuda.reset_peak_memory_stats(self.device)
+
+        if self.trace_python:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        peak_rss = max(_read_peak_rss(), self._process.memory_info().rss)
+
+        cuda_max_allocated = cuda_max_reserved = None
+        if self.use_cuda:
+            torch.cuda.synchronize(self.device)
+            cuda_max_allocated = torch.cuda.max_memory_allocated(self.device) / MiB
+            cuda_max_reserved = torch.cuda.max_memory_reserved(self.device) / MiB
+
+        tracemalloc_peak = None
+        if self.trace_python:
+            tracemalloc_peak = tracemalloc.get_traced_memory()[1] / MiB
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+
+        self.stats = MemoryStats(
+            rss_start_mib=self._rss_start / MiB,
+            peak_rss_mib=peak_rss / MiB,
+            peak_rss_increase_mib=(peak_rss - self._rss_start) / MiB,
+            peak_rss_scope=self._scope,
+            cuda_max_allocated_mib=cuda_max_allocated,
+            cuda_max_reserved_mib=cuda_max_reserved,
+            tracemalloc_peak_mib=tracemalloc_peak,
+        )
+        return False
+
+
+def _reset_peak_rss() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _read_peak_rss() -> int:
+    """Peak RSS in bytes (VmHWM on Linux, lifetime ru_maxrss otherwise)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if psutil.MACOS else maxrss * 1024
+
+
+# EOF
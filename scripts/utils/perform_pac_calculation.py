@@ -1,24 +1,65 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: "2024-11-05 00:07:30 (ywatanabe)"
+# Time-stamp: "2026-10-18 15:44:20 (ywatanabe)"
 # File: ./torchPAC/scripts/utils/perform_pac_calculation.py
 
 import torch
+from scripts.utils.benchmark import benchmark
+from scripts.utils.measure_memory import MemoryMonitor
+from scripts.utils.profile_calculation import CalculationProfiler
 
 
-def perform_pac_calculation(model, signal, params):
+def perform_pac_calculation(model, signal, params, sdir=None):
+    # Optional torch.profiler + tracemalloc over the timed iterations
+    profiler = None
+    if params.get("profile_trace") and sdir is not None:
+        profiler = CalculationProfiler(
+            sdir, device=params["device"], top_n=params.get("profile_top_n", 20)
+        )
+
+    def after_warmup():
+        # Stage timings and profiles cover the timed iterations only
+        model.stage_timer.reset()
+        if profiler is not None:
+            profiler.start()
+
+    # Exceptions propagate, so that failed_conditions.log records the traceback
     try:
-        for _ in range(params["n_calc"]):
-            model.ts(model.calc_start_str)
+
+        def calc():
             if params["no_grad"]:
                 with torch.no_grad():
-                    xpac = model.calc_pac(signal)
-            else:
-                xpac = model.calc_pac(signal)
-            model.ts(model.calc_end_str)
+                    return model.calc_pac(signal)
+            return model.calc_pac(signal)
+
+        # Asynchronous CUDA kernels are waited for before reading the clock
+        sync = torch.cuda.synchronize if "cuda" in str(params["device"]) else None
+
+        # Peak memory of this condition, written to stats.csv by the handler
+        monitor = MemoryMonitor(
+            device=params["device"],
+            trace_python=params.get("trace_python_memory", False),
+        )
+        with monitor:
+            xpac, model.benchmark_result = benchmark(
+                calc,
+                n_warmup=params.get("n_warmup", 0),
+                n_min=params["n_calc"],
+                n_max=params.get("n_calc_max", params["n_calc"]),
+                rel_precision=params.get("rel_precision"),
+                max_time_sec=params.get("max_calc_sec"),
+                sync=sync,
+                after_warmup=after_warmup,
+            )
+            if profiler is not None:
+                profiler.stop()
+        model.memory_stats = monitor.stats
+        if profiler is not None:
+            profiler.save()
         return xpac
-    except Exception as exception:
-        print(f"Error in PAC calculation: {exception}")
+    finally:
+        if profiler is not None:
+            profiler.stop()
 
 
 # EOF
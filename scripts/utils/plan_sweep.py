@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 14:31:08 (ywatanabe)"
+# File: ./torchPAC/scripts/utils/plan_sweep.py
+
+"""
+Functionality:
+    * Plans the conditions of a parameter sweep
+    * Identifies each fully resolved condition by a hash of its parameters
+    * Drops duplicated conditions (e.g., baseline points repeated across
+      variations), meaningless combinations (options the package ignores,
+      fp16 inputs under a dtype policy) and conditions already found in the
+      results
+Input:
+    * Names of the parameters to vary and packages, or a full parameter grid
+    * Hashes of finished conditions
+Output:
+    * Parameter configurations to run, in sweep order (lazily for full grids,
+      which are too large to list)
+Prerequisites:
+    * mngs package
+"""
+
+import hashlib
+import itertools
+import json
+import math
+from typing import Any, Dict, Iterable, Iterator, List
+
+from scripts.utils.define_parameter_space import define_parameter_space
+
+HASH_KEY = "condition_hash"
+# Options deleted by each handler in __init__ (see scripts/PackageHandlers)
+IGNORED_OPTIONS = {
+    "mngs": (
+        "use_threads",
+        "use_processes",
+        "n_workers",
+        "dtype_policy",
+        "error_budget",
+        "band_pairs",
+        "multirate",
+    ),
+    "tensorpac": (
+        "in_place",
+        "trainable",
+        "dtype_policy",
+        "error_budget",
+        "fused_mi",
+        "band_pairs",
+        "multirate",
+    ),
+    "fft": (
+        "in_place",
+        "trainable",
+        "use_threads",
+        "use_processes",
+        "n_workers",
+        "fused_mi",
+    ),
+}
+
+
+def resolve_params(params: Dict[str, Any], package: str) -> Dict[str, Any]:
+    """Returns a copy of params with the package and derived values filled in."""
+    params = dict(params)
+    params["package"] = package
+    params["seq_len"] = int(params["t_sec"] * params["fs"])
+    params[HASH_KEY] = condition_hash(params)
+    return params
+
+
+def condition_hash(params: Dict[str, Any]) -> str:
+    """Hashes the parameters of a condition independently of the key order."""
+    params = {
+        key: value
+        for key, value in params.items()
+        if key not in ["ts", HASH_KEY]
+    }
+    serialized = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode()).hexdigest()[:16]
+
+
+def is_valid_condition(params: Dict[str, Any]) -> bool:
+    """Whether the parameters of a condition (with its package) measure something.
+
+    - Options a package ignores (IGNORED_OPTIONS; its handler deletes them)
+      must be at their defaults (false or null); otherwise, the condition
+      would rerun another one under a misleading label.
+    - A dtype_policy sets every stage dtype of the FFT pipeline, so fp16 would
+      only round its float32 input to half precision beforehand; fp16 with a
+      policy is excluded (dtype_policy: null keeps the all-half fp16 pipeline).
+    """
+    if any(params.get(key) for key in IGNORED_OPTIONS.get(params["package"], ())):
+        return False
+    return not (params.get("fp16") and params.get("dtype_policy"))
+
+
+def plan_sweep(
+    param_names: Iterable[str],
+    packages: Iterable[str],
+    done_hashes: Iterable[str] = (),
+) -> List[Dict[str, Any]]:
+    """Lists unique, valid, unfinished conditions varying one parameter at a time.
+
+    Parameters
+    ----------
+    param_names : Iterable[str]
+        Names of the parameters to vary (see define_parameter_space)
+    packages : Iterable[str]
+        Packages to run for every configuration
+    done_hashes : Iterable[str], optional
+        Hashes of conditions with saved results, which are skipped
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        Resolved parameter configurations, each with its condition_hash
+    """
+    seen = set(done_hashes)
+    packages = list(packages)
+
+    plan = []
+    for param_name in param_names:
+        for params in define_parameter_space(param_name):
+            for package in packages:
+                params_resolved = resolve_params(params, package)
+                if not is_valid_condition(params_resolved):
+                    continue
+                if params_resolved[HASH_KEY] in seen:
+                    continue
+                seen.add(params_resolved[HASH_KEY])
+                plan.append(params_resolved)
+    return plan
+
+
+def plan_grid(
+    params_space: Dict[str, List[Any]], done_hashes: Iterable[str] = ()
+) -> Iterator[Dict[str, Any]]:
+    """Yields unique, valid, unfinished conditions of a full grid (e.g., PARAMS.ALL).
+
+    The grid (about 1e11 conditions for PARAMS.ALL) is never listed: the
+    product of the values is walked lazily. Values are deduplicated per
+    parameter, so every combination is unique and only the finished hashes
+    have to be kept.
+    """
+    done_hashes = set(done_hashes)
+    params_space = _unique_values(params_space)
+    keys = list(params_space)
+    for values in itertools.product(*params_space.values()):
+        params = dict(zip(keys, values))
+        if not is_valid_condition(params):
+            continue
+        params_resolved = resolve_params(params, params["package"])
+        if params_resolved[HASH_KEY] not in done_hashes:
+            yield params_resolved
+
+
+def count_grid(params_space: Dict[str, List[Any]]) -> int:
+    """Upper bound of the number of conditions of plan_grid, including
+    finished and invalid ones (see is_valid_condition)."""
+    return math.prod(len(values) for values in _unique_values(params_space).values())
+
+
+def _unique_values(params_space: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+    """Values of every parameter without duplicates, in their order."""
+    unique = {}
+    for key, values in params_space.items():
+        serialized = {}
+        for value in values:
+            serialized.setdefault(json.dumps(value, sort_keys=True, default=str), value)
+        unique[key] = list(serialized.values())
+    return unique
+
+
+# EOF
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: "2024-11-06 00:14:48 (ywatanabe)"
+# Time-stamp: "2026-10-18 16:14:40 (ywatanabe)"
 # File: ./torchPAC/scripts/utils/prepare_signal.py
 
 from typing import Union
@@ -8,26 +8,64 @@ from typing import Union
 import mngs
 import numpy as np
 import torch
+from scripts.utils.zero_copy import to_numpy, to_torch
 
 
 def prepare_signal(params: dict) -> Union[np.ndarray, torch.Tensor]:
-    try:
-        signal, _, _ = mngs.dsp.demo_sig(
-            sig_type="tensorpac",
-            batch_size=params["batch_size"],
-            n_chs=params["n_chs"],
-            n_segments=params["n_segments"],
-            t_sec=params["t_sec"],
-            fs=params["fs"],
+    # Recordings on disk are memory-mapped and read chunk by chunk by the handlers
+    if params.get("signal_path"):
+        return _load_signal_mmap(params)
+
+    signal, _, _ = mngs.dsp.demo_sig(
+        sig_type="tensorpac",
+        batch_size=params["batch_size"],
+        n_chs=params["n_chs"],
+        n_segments=params["n_segments"],
+        t_sec=params["t_sec"],
+        fs=params["fs"],
+    )
+
+    # Shares the demo signal's memory when dtype and device already match;
+    # otherwise, casts and transfers in a single copy
+    if params["package"] == "tensorpac":
+        signal, n_copies = to_numpy(
+            signal, dtype=np.float16 if params["fp16"] else np.float32
+        )
+    elif params["package"] in ["mngs", "fft"]:
+        signal, n_copies = to_torch(
+            signal,
+            dtype=torch.float16 if params["fp16"] else torch.float32,
+            device=params["device"],
+        )
+    params["n_copies"] = params.get("n_copies", 0) + n_copies
+    return signal
+
+
+def _load_signal_mmap(params: dict) -> np.memmap:
+    """Memory-maps a .npy or raw (.dat) recording with shape (batch_size, n_chs, n_segments, seq_len)."""
+    path = params["signal_path"]
+    if path.endswith(".npy"):
+        signal = np.load(path, mmap_mode="r")
+    else:
+        shape = params.get("signal_shape") or (
+            params["batch_size"],
+            params["n_chs"],
+            params["n_segments"],
+            params["seq_len"],
+        )
+        signal = np.memmap(
+            path,
+            dtype=params.get("signal_dtype", "float32"),
+            mode="r",
+            shape=tuple(shape),
         )
 
-        if params["package"] == "tensorpac":
-            return np.array(signal, dtype=np.float16 if params["fp16"] else np.float32)
-        elif params["package"] == "mngs":
-            return torch.tensor(signal, dtype=torch.float16 if params["fp16"] else torch.float32).to(params["device"])
-    except Exception as exception:
-        print(exception)
-        return None
+    if signal.ndim != 4 or signal.shape[-1] != params["seq_len"]:
+        raise ValueError(
+            f"{path} should have the shape (batch_size, n_chs, n_segments, {params['seq_len']}). "
+            f"Received shape: {signal.shape}"
+        )
+    return signal
 
 
 # EOF
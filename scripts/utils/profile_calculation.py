@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 17:02:26 (ywatanabe)"
+# File: ./torchPAC/scripts/utils/profile_calculation.py
+
+"""
+Functionality:
+    * Profiles the timed PAC calculations of a condition with torch.profiler
+      (CPU, and CUDA when used) and tracemalloc (NumPy / tensorpac allocations)
+    * Saves a Chrome trace and top-N summaries into the condition directory
+Input:
+    * Condition directory, device and the number of top entries
+Output:
+    * trace.json: Chrome trace (chrome://tracing, Perfetto)
+    * profiler_top.txt: tracemalloc peak and operators sorted by self CPU
+      (CUDA) time
+    * allocations_diff_top.csv: top-N allocation sites by the memory they
+      gained over the timed loop (tracemalloc snapshots before and after;
+      tracemalloc records the peak size but not where it was allocated)
+Prerequisites:
+    * PyTorch
+    * pandas
+"""
+
+import os
+import tracemalloc
+
+import pandas as pd
+from torch.profiler import ProfilerActivity, profile
+
+TRACE_FNAME = "trace.json"
+PROFILER_TOP_FNAME = "profiler_top.txt"
+ALLOCATIONS_TOP_FNAME = "allocations_diff_top.csv"
+TRACEMALLOC_FILTERS = [
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+]
+
+
+class CalculationProfiler:
+    def __init__(self, sdir: str, device: str = "cpu", top_n: int = 20):
+        """
+        Parameters
+        ----------
+        sdir : str
+            Directory of the condition (where stats.csv is saved)
+        device : str, optional
+            Calculation device; CUDA activities are recorded for "cuda"
+        top_n : int, optional
+            Number of operators / allocation sites to summarise, by default 20
+        """
+        self.sdir = sdir
+        self.top_n = top_n
+        self.use_cuda = "cuda" in str(device)
+
+        activities = [ProfilerActivity.CPU]
+        if self.use_cuda:
+            activities.append(ProfilerActivity.CUDA)
+        self._profiler = profile(
+            activities=activities, record_shapes=True, profile_memory=True
+        )
+        self._snapshot_start = None
+        self._snapshot = None
+        self._is_running = False
+        self._owns_tracemalloc = False
+        self.tracemalloc_peak_kib = None
+
+    def start(self) -> None:
+        # tracemalloc runs inside the profiler not to trace its own setup
+        self._profiler.start()
+        # Leaves tracemalloc running when already started (e.g., by MemoryMonitor)
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start()
+        # Allocations before the loop (e.g., the signal) are subtracted
+        self._snapshot_start = tracemalloc.take_snapshot().filter_traces(
+            TRACEMALLOC_FILTERS
+        )
+        self._is_running = True
+
+    def stop(self) -> None:
+        if not self._is_running:
+            return
+        self._snapshot = tracemalloc.take_snapshot().filter_traces(
+            TRACEMALLOC_FILTERS
+        )
+        self.tracemalloc_peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        self._profiler.stop()
+        self._is_running = False
+
+    def save(self) -> None:
+        os.makedirs(self.sdir, exist_ok=True)
+        self._profiler.export_chrome_trace(os.path.join(self.sdir, TRACE_FNAME))
+
+        sort_by = "self_cuda_time_total" if self.use_cuda else "self_cpu_time_total"
+        table = self._profiler.key_averages().table(
+            sort_by=sort_by, row_limit=self.top_n
+        )
+        with open(os.path.join(self.sdir, PROFILER_TOP_FNAME), "w") as f:
+            f.write(f"tracemalloc peak: {self.tracemalloc_peak_kib:,.1f} KiB\n\n")
+            f.write(table)
+
+        self.top_allocations().to_csv(
+            os.path.join(self.sdir, ALLOCATIONS_TOP_FNAME), index=False
+        )
+
+    def top_allocations(self) -> pd.DataFrame:
+        """
+        Top-N allocation sites by the memory they gained over the timed loop
+        (end minus start snapshot, by traceback), i.e., what the loop left
+        allocated rather than the sites of the tracemalloc peak.
+        """
+        stats = self._snapshot.compare_to(self._snapshot_start, "traceback")
+        return pd.DataFrame(
+            [
+                {
+                    "file": stat.traceback[0].filename,
+                    "line": stat.traceback[0].lineno,
+                    "size_diff_kib": stat.size_diff / 1024,
+                    "count_diff": stat.count_diff,
+                    "size_kib": stat.size / 1024,
+                    "count": stat.count,
+                }
+                for stat in stats[: self.top_n]
+            ],
+            columns=[
+                "file",
+                "line",
+                "size_diff_kib",
+                "count_diff",
+                "size_kib",
+                "count",
+            ],
+        )
+
+
+# EOF
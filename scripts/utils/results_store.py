@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 14:02:45 (ywatanabe)"
+# File: ./torchPAC/scripts/utils/results_store.py
+
+import glob
+import json
+import os
+from typing import Dict, Iterable, Optional
+
+import h5py
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+STATS_FNAME = "results.parquet"
+PARTS_DNAME = "results.parts"
+XPAC_FNAME = "xpac.h5"
+
+
+class ResultsStore:
+    """
+    Stores a whole sweep in two files under sdir.
+
+    - results.parquet: one row per condition (stats + parameters), indexed by
+      condition_id
+    - xpac.h5: one chunked dataset per condition, /xpac/condition_XXXX
+
+    During a sweep, each condition is written as its own part file
+    (results.parts/condition_XXXX.parquet), so that appending does not
+    rewrite the table; compact() merges the parts into results.parquet at
+    the end. load_stats reads both, e.g., of an interrupted sweep.
+
+    Parameter columns mixing types (e.g., chunk_size 2 and "auto", n_perm
+    None and 8) are stored as JSON strings and decoded by load_stats.
+    """
+
+    def __init__(self, sdir: str):
+        self.sdir = sdir
+        self.stats_path = os.path.join(sdir, STATS_FNAME)
+        self.parts_dir = os.path.join(sdir, PARTS_DNAME)
+        self.xpac_path = os.path.join(sdir, XPAC_FNAME)
+        self._condition_ids = set()
+        self._condition_hashes = set()
+        if has_stats(sdir):
+            self._index(load_stats(sdir))
+
+    def append(
+        self, condition_id: int, df: pd.DataFrame, xpac: Optional[np.ndarray] = None
+    ) -> None:
+        """Appends the stats rows of a condition and its PAC array."""
+        df = df.reset_index()
+        df.insert(0, "condition_id", condition_id)
+        os.makedirs(self.parts_dir, exist_ok=True)
+        _write_table(
+            df, os.path.join(self.parts_dir, f"condition_{condition_id:04d}.parquet")
+        )
+        self._index(df)
+
+        if xpac is not None:
+            os.makedirs(self.sdir, exist_ok=True)
+            with h5py.File(self.xpac_path, "a") as h5:
+                key = _xpac_key(condition_id)
+                if key in h5:
+                    del h5[key]
+                h5.create_dataset(key, data=xpac, chunks=True)
+
+    def compact(self) -> None:
+        """Merges the part files into results.parquet, once per sweep."""
+        part_paths = sorted(glob.glob(os.path.join(self.parts_dir, "*.parquet")))
+        if not part_paths:
+            return
+        _write_table(load_stats(self.sdir), self.stats_path)
+        for path in part_paths:
+            os.remove(path)
+        os.rmdir(self.parts_dir)
+
+    @property
+    def condition_ids(self) -> list:
+        return sorted(self._condition_ids)
+
+    @property
+    def condition_hashes(self) -> set:
+        """Hashes of the finished conditions (see plan_sweep)."""
+        return set(self._condition_hashes)
+
+    @property
+    def next_condition_id(self) -> int:
+        return max(self._condition_ids, default=-1) + 1
+
+    def _index(self, df: pd.DataFrame) -> None:
+        self._condition_ids.update(int(ii) for ii in df["condition_id"].unique())
+        if "condition_hash" in df:
+            self._condition_hashes.update(df["condition_hash"].dropna())
+
+
+class ResultsBuffer:
+    """Collects ResultsStore.append calls, e.g., in a worker process."""
+
+    def __init__(self):
+        self.records = []
+
+    def append(
+        self, condition_id: int, df: pd.DataFrame, xpac: Optional[np.ndarray] = None
+    ) -> None:
+        self.records.append((condition_id, df, xpac))
+
+
+def has_stats(sdir: str) -> bool:
+    """Whether sdir holds results.parquet or part files of a sweep."""
+    return bool(_stats_paths(sdir))
+
+
+def load_stats(sdir: str) -> pd.DataFrame:
+    """
+    Reads the stats and parameters of all conditions, i.e., results.parquet
+    and the part files not compacted yet.
+    """
+    tables = [_read_table(path) for path in _stats_paths(sdir)]
+    if len(tables) == 1:
+        return tables[0][0]
+    # Columns decoded from JSON in any file stay objects (e.g., None and 8
+    # are not merged into NaN and 8.0)
+    json_columns = set().union(*(columns for _, columns in tables))
+    dfs = [
+        df.astype({column: object for column in json_columns if column in df})
+        for df, _ in tables
+    ]
+    return pd.concat(dfs, ignore_index=True)
+
+
+def load_xpac(
+    sdir: str, condition_ids: Optional[Iterable[int]] = None
+) -> Dict[int, np.ndarray]:
+    """Reads PAC arrays by condition id (all conditions by default)."""
+    with h5py.File(os.path.join(sdir, XPAC_FNAME), "r") as h5:
+        if condition_ids is None:
+            condition_ids = [int(key.split("_")[-1]) for key in h5["xpac"]]
+        return {
+            condition_id: h5[_xpac_key(condition_id)][()]
+            for condition_id in condition_ids
+        }
+
+
+def _xpac_key(condition_id: int) -> str:
+    return f"xpac/condition_{condition_id:04d}"
+
+
+def _stats_paths(sdir: str) -> list:
+    paths = sorted(glob.glob(os.path.join(sdir, PARTS_DNAME, "*.parquet")))
+    stats_path = os.path.join(sdir, STATS_FNAME)
+    return ([stats_path] if os.path.exists(stats_path) else []) + paths
+
+
+def _write_table(df: pd.DataFrame, path: str) -> None:
+    df, json_columns = _encode(df)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            b"json_columns": json.dumps(json_columns).encode(),
+        }
+    )
+    # Written atomically not to leave a corrupt file behind when a condition
+    # crashes the process
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _read_table(path: str):
+    """DataFrame of a stats file and its JSON-decoded columns."""
+    table = pq.read_table(path)
+    json_columns = json.loads(
+        (table.schema.metadata or {}).get(b"json_columns", b"[]")
+    )
+    df = table.to_pandas()
+    for column in json_columns:
+        # As objects, not to let pandas infer NaN and 8.0 from None and 8
+        df[column] = pd.Series(
+            [None if vv is None else json.loads(vv) for vv in df[column]],
+            index=df.index,
+            dtype=object,
+        )
+    return df, json_columns
+
+
+def _encode(df: pd.DataFrame):
+    """JSON-encodes object columns that are not plain strings."""
+    df = df.copy()
+    json_columns = []
+    for column in df.columns:
+        if df[column].dtype != object:
+            continue
+        values = df[column].tolist()
+        if all(isinstance(vv, str) for vv in values):
+            continue
+        if all(isinstance(vv, pd.Timestamp) for vv in values):
+            continue
+        df[column] = [json.dumps(_to_builtin(vv)) for vv in values]
+        json_columns.append(column)
+    return df, json_columns
+
+
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(vv) for vv in value]
+    return value
+
+
+# EOF
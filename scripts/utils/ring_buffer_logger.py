@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 18:04:37 (ywatanabe)"
+# File: ./torchPAC/scripts/utils/ring_buffer_logger.py
+
+"""
+Functionality:
+    * Samples CPU / RAM / GPU / VRAM usage into a fixed-size binary ring buffer
+      (NumPy records in a memory-mapped file), so that day-long recordings
+      neither grow on disk nor cost CSV formatting per sample
+    * Writes samples in batches and keeps the ring consistent on SIGTERM
+    * Measures its own CPU time, so that its overhead can be reported
+    * Exports the ring to CSV / Parquet on demand
+Input:
+    * Ring file path, capacity, sampling interval
+Output:
+    * Ring file: 64-byte header + capacity records
+    * DataFrame with the columns of the former CSV log
+      (Timestamp, CPU [%], RAM [GiB], GPU [%], VRAM [GiB])
+Prerequisites:
+    * psutil
+    * numpy, pandas
+    * pynvml (optional; GPU columns are NaN without it)
+"""
+
+import os
+import signal
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import psutil
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+MAGIC = b"PACRING1"
+HEADER_BYTES = 64
+GiB = 1024**3
+
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("capacity", "<u8"),
+        ("n_written", "<u8"),
+        ("logger_cpu_sec", "<f8"),
+        ("logger_wall_sec", "<f8"),
+        ("padding", "V24"),
+    ]
+)
+RECORD_DTYPE = np.dtype(
+    [
+        ("timestamp", "<f8"),
+        ("cpu_percent", "<f4"),
+        ("ram_gib", "<f4"),
+        ("gpu_percent", "<f4"),
+        ("vram_gib", "<f4"),
+    ]
+)
+COLUMNS = {
+    "cpu_percent": "CPU [%]",
+    "ram_gib": "RAM [GiB]",
+    "gpu_percent": "GPU [%]",
+    "vram_gib": "VRAM [GiB]",
+}
+
+
+class RingBufferLogger:
+    def __init__(
+        self,
+        path: str,
+        capacity: int = 24 * 3600 * 4,
+        flush_every: int = 64,
+        init: bool = False,
+    ):
+        """
+        Parameters
+        ----------
+        path : str
+            Ring file; reopened (and appended to) when it exists
+        capacity : int, optional
+            Number of records kept, by default one day at 4 Hz (24-byte records, ~7.9 MiB)
+        flush_every : int, optional
+            Number of samples written to the ring at once, by default 64
+        init : bool, optional
+            Whether to discard an existing ring, by default False
+        """
+        self.path = path
+        self.flush_every = flush_every
+
+        if init or not os.path.exists(path):
+            _create_ring(path, capacity)
+        self._header = np.memmap(path, dtype=HEADER_DTYPE, mode="r+", shape=(1,))
+        if self._header["magic"][0] != MAGIC:
+            raise ValueError(f"{path} is not a processor-usage ring file")
+        self.capacity = int(self._header["capacity"][0])
+        self._records = np.memmap(
+            path,
+            dtype=RECORD_DTYPE,
+            mode="r+",
+            offset=HEADER_BYTES,
+            shape=(self.capacity,),
+        )
+
+        self._batch = np.zeros(flush_every, dtype=RECORD_DTYPE)
+        self._n_batch = 0
+        self._gpu_handles = _init_gpus()
+
+        # Primes psutil.cpu_percent (the first call always returns 0.0)
+        psutil.cpu_percent(interval=None)
+        self._cpu_start = time.process_time()
+        self._wall_start = time.perf_counter()
+
+    def sample(self) -> None:
+        """Appends one sample of the current usages to the batch."""
+        record = self._batch[self._n_batch]
+        record["timestamp"] = time.time()
+        record["cpu_percent"] = psutil.cpu_percent(interval=None)
+        record["ram_gib"] = psutil.virtual_memory().used / GiB
+        record["gpu_percent"], record["vram_gib"] = _sample_gpus(self._gpu_handles)
+        self._n_batch += 1
+        if self._n_batch == self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Copies the batch into the ring (wrapping around) and updates the header."""
+        n_written = int(self._header["n_written"][0])
+        i_start = n_written % self.capacity
+        batch = self._batch[: self._n_batch]
+        n_first = min(len(batch), self.capacity - i_start)
+        self._records[i_start : i_start + n_first] = batch[:n_first]
+        self._records[: len(batch) - n_first] = batch[n_first:]
+
+        # Counters last, so that readers never see records not written yet
+        self._header["n_written"] = n_written + len(batch)
+        self._header["logger_cpu_sec"] += time.process_time() - self._cpu_start
+        self._header["logger_wall_sec"] += time.perf_counter() - self._wall_start
+        self._cpu_start = time.process_time()
+        self._wall_start = time.perf_counter()
+        self._n_batch = 0
+
+    def run(self, interval_s: float = 0.33, limit_s: Optional[float] = None) -> None:
+        """Samples every interval_s until limit_s, SIGTERM or KeyboardInterrupt."""
+        previous_handler = signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+        t_end = None if limit_s is None else time.monotonic() + limit_s
+        next_time = time.monotonic()
+        try:
+            while t_end is None or next_time < t_end:
+                self.sample()
+                # Fixed schedule, so that the sampling cost does not add up
+                next_time += interval_s
+                time.sleep(max(0.0, next_time - time.monotonic()))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+            signal.signal(signal.SIGTERM, previous_handler)
+
+    def close(self) -> None:
+        if self._n_batch:
+            self.flush()
+        self._records.flush()
+        self._header.flush()
+
+    @property
+    def overhead(self) -> dict:
+        return read_overhead(self.path)
+
+
+def read_ring(path: str) -> pd.DataFrame:
+    """Returns the records of a ring file from the oldest to the newest."""
+    header = np.memmap(path, dtype=HEADER_DTYPE, mode="r", shape=(1,))
+    capacity = int(header["capacity"][0])
+    n_written = int(header["n_written"][0])
+    records = np.memmap(
+        path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_BYTES, shape=(capacity,)
+    )
+    if n_written <= capacity:
+        records = np.array(records[:n_written])
+    else:
+        i_oldest = n_written % capacity
+        records = np.concatenate([records[i_oldest:], records[:i_oldest]])
+
+    # Naive local time, as datetime.now() in stats.csv
+    local_tz = datetime.now().astimezone().tzinfo
+    timestamps = pd.to_datetime(records["timestamp"], unit="s", utc=True)
+    df = pd.DataFrame(
+        {"Timestamp": timestamps.tz_convert(local_tz).tz_localize(None)}
+    )
+    for name, column in COLUMNS.items():
+        df[column] = records[name].astype(float)
+    return df
+
+
+def read_overhead(path: str) -> dict:
+    """CPU time of the logger relative to its run time (and per sample)."""
+    header = np.memmap(path, dtype=HEADER_DTYPE, mode="r", shape=(1,))
+    cpu_sec = float(header["logger_cpu_sec"][0])
+    wall_sec = float(header["logger_wall_sec"][0])
+    n_written = int(header["n_written"][0])
+    return {
+        "n_samples": n_written,
+        "logger_cpu_sec": cpu_sec,
+        "logger_wall_sec": wall_sec,
+        "logger_cpu_percent": 100 * cpu_sec / wall_sec if wall_sec else float("nan"),
+        "logger_cpu_sec_per_sample": cpu_sec / n_written if n_written else float("nan"),
+    }
+
+
+def export_ring(path: str, spath: str) -> pd.DataFrame:
+    """Exports a ring file to CSV or Parquet (by the extension of spath)."""
+    df = read_ring(path)
+    if spath.endswith(".parquet"):
+        df.to_parquet(spath, index=False)
+    else:
+        df.to_csv(spath, index=False)
+    return df
+
+
+def _create_ring(path: str, capacity: int) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header["magic"] = MAGIC
+    header["capacity"] = capacity
+    with open(path, "wb") as f:
+        f.write(header.tobytes())
+        f.truncate(HEADER_BYTES + capacity * RECORD_DTYPE.itemsize)
+
+
+def _init_gpus() -> list:
+    if pynvml is None:
+        return []
+    try:
+        pynvml.nvmlInit()
+        return [
+            pynvml.nvmlDeviceGetHandleByIndex(ii)
+            for ii in range(pynvml.nvmlDeviceGetCount())
+        ]
+    except pynvml.NVMLError:
+        return []
+
+
+def _sample_gpus(handles: list):
+    """Mean utilisation [%] and total used memory [GiB] over the GPUs."""
+    if not handles:
+        return np.nan, np.nan
+    utils = [pynvml.nvmlDeviceGetUtilizationRates(hh).gpu for hh in handles]
+    used = [pynvml.nvmlDeviceGetMemoryInfo(hh).used for hh in handles]
+    return np.mean(utils), sum(used) / GiB
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+# EOF
@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: "2024-11-05 10:48:40 (ywatanabe)"
+# Time-stamp: "2026-10-18 14:05:31 (ywatanabe)"
 # File: ./torchPAC/scripts/utils/save_results.py
 
 from typing import Any, Dict
 
 import mngs
 import pandas as pd
-import torch
+from scripts.utils.zero_copy import to_numpy
 
 
 def dict_to_df(params: Dict[str, Any]) -> pd.DataFrame:
@@ -18,20 +18,33 @@ def dict_to_series(params: Dict[str, Any]) -> pd.Series:
     """Convert parameters dictionary to Series with proper values."""
     return pd.Series(params.values(), index=params.keys())
 
-def save_results(model, xpac, params, CONFIG):
+def save_results(model, xpac, params, CONFIG, store=None, condition_id=None):
+    """
+    Saves the PAC values and the stats + parameters of a condition.
+
+    With a ResultsStore, the condition is appended to the sweep-wide
+    results.parquet and xpac.h5; otherwise, xpac.npy and stats.csv are written
+    into CONFIG["SDIR"].
+    """
+    stats = model.stats.iloc[0]
+    summary = (
+        f"{stats['calc_time_mean_sec']} +/- {stats['calc_time_std_sec']} sec "
+        f"(n = {stats['calc_time_nn']:,})"
+    )
+    if "calc_time_median_sec" in stats:
+        summary += (
+            f"; median {stats['calc_time_median_sec']} sec "
+            f"[{stats['calc_time_median_ci_low_sec']}, "
+            f"{stats['calc_time_median_ci_high_sec']}]"
+        )
     mngs.str.printc(
-        f"{params['package']}\n"
-        f"{model.stats['calc_time_mean_sec'].iloc[0]} +/- {model.stats['calc_time_std_sec'].iloc[0]} sec "
-        f"(n = {model.stats['calc_time_nn'].iloc[0]:,})",
+        f"{params['package']}\n{summary}",
         c="green" if params["package"] == "mngs" else "magenta",
     )
 
-    # Convert CUDA tensor to numpy
-    if torch.is_tensor(xpac):
-        if xpac.is_cuda:
-            xpac = xpac.detach().cpu()
-        xpac = xpac.numpy()
-    mngs.io.save(xpac, CONFIG["SDIR"] + "xpac.npy")
+    # Convert tensor to numpy (copies only from CUDA)
+    xpac, n_copies = to_numpy(xpac)
+    params["n_copies"] = params.get("n_copies", 0) + n_copies
 
     # Time
     df_time = model.stats
@@ -50,6 +63,16 @@ def save_results(model, xpac, params, CONFIG):
     df_combined = df_combined.set_index("time")
 
     # Saving
+    if store is not None:
+        # Parquet does not allow the duplicated "package" column
+        df_combined.columns = [
+            "handler" if (ii == 0 and cc == "package") else cc
+            for ii, cc in enumerate(df_combined.columns)
+        ]
+        store.append(condition_id, df_combined, xpac)
+        return
+
+    mngs.io.save(xpac, CONFIG["SDIR"] + "xpac.npy")
     mngs.io.save(df_combined, CONFIG["SDIR"] + "stats.csv")
 
 # EOF
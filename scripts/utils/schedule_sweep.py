@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 15:04:37 (ywatanabe)"
+# File: ./torchPAC/scripts/utils/schedule_sweep.py
+
+"""
+Functionality:
+    * Runs the conditions of a sweep in a pool of worker processes
+    * Pins every worker to its own CPU cores and limits its BLAS/OpenMP/torch threads
+    * Runs conditions tagged as exclusive alone, after the parallel ones
+    * Logs failed and crashed conditions with their parameters and tracebacks
+Input:
+    * Planned conditions (see plan_sweep) and a function running one condition
+Output:
+    * Results appended to the ResultsStore in the parent process
+    * failed_conditions.log in the store directory
+Prerequisites:
+    * threadpoolctl
+    * PyTorch
+"""
+
+import logging
+import multiprocessing as mp
+import os
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from scripts.utils.results_store import ResultsBuffer, ResultsStore
+
+LOG_FNAME = "failed_conditions.log"
+
+
+def is_exclusive(
+    params: Dict[str, Any], exclusive: Optional[Dict[str, list]]
+) -> bool:
+    """Whether any parameter takes one of the values tagged as exclusive."""
+    return any(
+        params.get(param_name) in values
+        for param_name, values in (exclusive or {}).items()
+    )
+
+
+def schedule_sweep(
+    plan: Iterable[Dict[str, Any]],
+    run_fn: Callable,
+    CONFIG,
+    store: ResultsStore,
+    condition_id_start: int = 0,
+    n_workers: Optional[int] = None,
+    n_cores_per_worker: int = 1,
+    exclusive: Optional[Dict[str, list]] = None,
+) -> int:
+    """Runs all planned conditions and returns the number of failed ones.
+
+    Parameters
+    ----------
+    plan : Iterable[Dict[str, Any]]
+        Resolved parameter configurations; consumed lazily (e.g., plan_grid),
+        except for the exclusive ones, which are kept until the others finish
+    run_fn : Callable
+        run_fn(CONFIG, params, condition_id, store=...) runs one condition;
+        it must be importable by the workers (i.e., defined at module level)
+    store : ResultsStore
+        Store receiving the results; only the parent process writes to it
+    condition_id_start : int, optional
+        Condition id of plan[0]; ids follow the plan order
+    n_workers : int, optional
+        Number of parallel workers, by default n_cpus // n_cores_per_worker
+    n_cores_per_worker : int, optional
+        CPU cores (and threads) per parallel worker, by default 1
+    exclusive : Dict[str, list], optional
+        Parameter values whose conditions run alone with all cores
+
+    Returns
+    -------
+    int
+        Number of failed conditions
+    """
+    logger = _get_logger(os.path.join(store.sdir, LOG_FNAME))
+
+    cpus = sorted(os.sched_getaffinity(0))
+    if n_workers is None:
+        n_workers = max(1, len(cpus) // n_cores_per_worker)
+    core_sets = [
+        cpus[i_worker * n_cores_per_worker : (i_worker + 1) * n_cores_per_worker]
+        or cpus
+        for i_worker in range(n_workers)
+    ]
+
+    tasks_exclusive = []
+
+    def iter_shared():
+        for i_condition, params in enumerate(plan):
+            task = (condition_id_start + i_condition, params)
+            if is_exclusive(params, exclusive):
+                tasks_exclusive.append(task)
+            else:
+                yield task
+
+    n_failed = _run_tasks(iter_shared(), run_fn, CONFIG, store, core_sets, logger)
+    # One at a time with all cores, so that the timings are not contaminated
+    n_failed += _run_tasks(tasks_exclusive, run_fn, CONFIG, store, [cpus], logger)
+    return n_failed
+
+
+def _run_tasks(tasks, run_fn, CONFIG, store, core_sets, logger) -> int:
+    n_failed = 0
+    # Pulled one at a time, so that lazy plans are never listed
+    tasks = iter(tasks)
+    task = next(tasks, None)
+    while task is not None:
+        pool = _create_pool(core_sets)
+        in_flight = {}
+        try:
+            # Keeps at most one condition per worker in flight, so that a
+            # crashing worker takes down as few conditions as possible
+            while task is not None or in_flight:
+                while task is not None and len(in_flight) < len(core_sets):
+                    condition_id, params = task
+                    task = next(tasks, None)
+                    future = pool.submit(
+                        _run_condition, run_fn, CONFIG, params, condition_id
+                    )
+                    in_flight[future] = (condition_id, params)
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    condition_id, params = in_flight[future]
+                    records, error = future.result()
+                    del in_flight[future]
+                    if error is not None:
+                        n_failed += 1
+                        _log_failure(logger, condition_id, params, error)
+                        continue
+                    for record in records:
+                        store.append(*record)
+
+        except BrokenProcessPool:
+            # A worker died (e.g., segfault, OOM kill). With a single condition
+            # in flight, it is the culprit; otherwise, the suspects are rerun
+            # one by one so that only the crashing condition fails.
+            pool.shutdown(wait=True, cancel_futures=True)
+            suspects = list(in_flight.values())
+            if len(suspects) == 1:
+                condition_id, params = suspects[0]
+                n_failed += 1
+                _log_failure(logger, condition_id, params, "Worker process crashed")
+            else:
+                n_failed += _run_tasks(
+                    suspects, run_fn, CONFIG, store, core_sets[:1], logger
+                )
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    return n_failed
+
+
+def _create_pool(core_sets) -> ProcessPoolExecutor:
+    # spawn: CUDA and thread pools are not safe to fork
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    for cores in core_sets:
+        queue.put(cores)
+    return ProcessPoolExecutor(
+        max_workers=len(core_sets),
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(queue,),
+    )
+
+
+def _init_worker(queue) -> None:
+    """Pins the worker to its cores and limits its threads accordingly."""
+    cores = queue.get()
+    os.sched_setaffinity(0, cores)
+
+    n_threads = str(len(cores))
+    for key in [
+        "OMP_NUM_THREADS",
+        "OPENBLAS_NUM_THREADS",
+        "MKL_NUM_THREADS",
+        "NUMEXPR_NUM_THREADS",
+    ]:
+        os.environ[key] = n_threads
+
+    import torch
+    from threadpoolctl import threadpool_limits
+
+    torch.set_num_threads(len(cores))
+    globals()["_THREADPOOL_LIMITS"] = threadpool_limits(limits=len(cores))
+
+
+def _run_condition(run_fn, CONFIG, params, condition_id):
+    """Runs one condition in a worker and returns its results or traceback."""
+    buffer = ResultsBuffer()
+    try:
+        run_fn(CONFIG, params, condition_id, store=buffer)
+        return buffer.records, None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def _log_failure(logger, condition_id, params, error) -> None:
+    params = {key: value for key, value in params.items() if key != "ts"}
+    logger.error(f"condition_{condition_id:04d} failed\n{params}\n{error}")
+
+
+def _get_logger(lpath: str) -> logging.Logger:
+    logger = logging.getLogger(f"{__name__}.{lpath}")
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(lpath) or ".", exist_ok=True)
+        handler = logging.FileHandler(lpath)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+    return logger
+
+
+# EOF
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: "2026-10-18 16:10:03 (ywatanabe)"
+# File: ./torchPAC/scripts/utils/zero_copy.py
+
+"""
+Functionality:
+    * Converts between NumPy arrays and torch tensors without copying when the
+      dtype and the device already match
+    * Casts and transfers in a single copy otherwise
+    * Counts the copies made, so that they can be reported per condition
+Input:
+    * NumPy arrays or torch tensors
+Output:
+    * The converted array / tensor and the number of copies made (0 or 1)
+Prerequisites:
+    * numpy
+    * PyTorch
+"""
+
+from typing import Tuple, Union
+
+import numpy as np
+import torch
+
+
+def to_numpy(
+    xx: Union[np.ndarray, torch.Tensor], dtype=None
+) -> Tuple[np.ndarray, int]:
+    """Returns xx as a NumPy array, sharing its memory when possible."""
+    if torch.is_tensor(xx):
+        xx = xx.detach()
+        if xx.device.type != "cpu":
+            # The device-to-host transfer is the only copy; the cast is done
+            # on the device beforehand
+            if dtype is not None:
+                xx = xx.to(dtype=_torch_dtype(dtype))
+            return xx.cpu().numpy(), 1
+        out = xx.numpy()
+    else:
+        out = xx
+
+    out_cast = np.asarray(out, dtype=dtype)
+    return out_cast, int(not np.shares_memory(out_cast, out))
+
+
+def to_torch(
+    xx: Union[np.ndarray, torch.Tensor], dtype=None, device="cpu"
+) -> Tuple[torch.Tensor, int]:
+    """Returns xx as a tensor on device, sharing its memory when possible."""
+    if isinstance(xx, np.ndarray):
+        if not xx.flags.writeable:
+            # Tensors cannot share read-only memory (e.g., memory maps)
+            return torch.tensor(xx, dtype=dtype, device=device), 1
+        xx = torch.from_numpy(xx)
+
+    # A single .to() casts and transfers at once
+    out = xx.to(device=device, dtype=dtype)
+    return out, int(out.data_ptr() != xx.data_ptr())
+
+
+def _torch_dtype(dtype) -> torch.dtype:
+    if isinstance(dtype, torch.dtype):
+        return dtype
+    return torch.from_numpy(np.empty(0, dtype=dtype)).dtype
+
+
+# EOF